@@ -0,0 +1,228 @@
+"""Benchmark suite of the encoding, solving, decoding and prediction steps
+
+Sweeps the size of the dataset, the number of criteria and the number of classes,
+stores the timings in a json baseline and flags the regressions against a previous baseline.
+
+Example:
+    python benchmark.py --save bench_baseline.json
+    python benchmark.py --compare bench_baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from itertools import product
+from time import perf_counter
+
+import numpy as np
+
+from tools.generator import Generator
+from tools.csvReader import csvReader
+from tools.clause_cache import ClauseCache
+from tools.utils import clauses_to_dimacs, write_dimacs_file, exec_gophersat
+from ncs import NcsSatModel
+from single_peak_sat import SinglePeakModel
+from single_peak_maxsat import MaxSatSinglePeakModel
+
+# Name, class and options of the benchmarked SAT/MaxSAT models
+# (the relaxed MaxSAT encoding is compared to the direct translation, see README)
+MODELS = [
+    ("ncs", NcsSatModel, {}),
+    ("ncs_relaxed", NcsSatModel, {"encoding": "relaxed"}),
+    ("single_peak", SinglePeakModel, {}),
+    ("maxsat", MaxSatSinglePeakModel, {}),
+    ("maxsat_relaxed", MaxSatSinglePeakModel, {"encoding": "relaxed"}),
+]
+
+
+def timeit(func, repeat: int = 3):
+    """Runs func repeat times and keeps the best wall time
+
+    Args:
+        func (callable): function without argument to time
+        repeat (int, optional): number of runs. Defaults to 3.
+
+    Returns:
+        tuple: (best time in seconds, result of the last run)
+    """
+    best, res = float("inf"), None
+    for _ in range(repeat):
+        begin = perf_counter()
+        res = func()
+        best = min(best, perf_counter() - begin)
+    return best, res
+
+
+def write_csv(gen: Generator, filename: str) -> None:
+    """Writes the train set of a generator in the csvReader format"""
+    with open(filename, "w", encoding="utf8") as csv:
+        csv.write("generated;;\n;;\n")
+        csv.write(f"{gen.num_criteria};{gen.num_classes};{len(gen.grades)}\n")
+        for u, (grades, label) in enumerate(zip(gen.grades, gen.admission)):
+            csv.write(";".join([str(u)] + [str(g) for g in grades] + [str(int(label))]) + "\n")
+
+
+def bench_case(size: int, num_criteria: int, num_classes: int, gopherpath: str,
+               repeat: int = 3, mrsort: bool = True, noise_percent: float = None) -> dict:
+    """Times every step of the trainings on one generated dataset
+
+    Args:
+        size (int): size of the dataset
+        num_criteria (int): number of criteria
+        num_classes (int): number of classes
+        gopherpath (str): path to gophersat, the solver steps are skipped if not found
+        repeat (int, optional): number of runs of each step. Defaults to 3.
+        mrsort (bool, optional): times MR-Sort model build and solve. Defaults to True.
+        noise_percent (float, optional): share of noisy labels in the train set. Defaults to None.
+
+    Returns:
+        dict: best time of each step (in seconds)
+    """
+    timings = {}
+    timings["generator"], gen = timeit(
+        lambda: Generator(size, num_classes=num_classes, num_criteria=num_criteria,
+                          noisy=noise_percent is not None, noise_percent=noise_percent), repeat)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, "data.csv")
+        write_csv(gen, csv_file)
+        timings["csv_reader"], _ = timeit(lambda: csvReader(csv_file), repeat)
+
+        for name, model_class, options in MODELS:
+            timings[f"{name}/init"], model = timeit(lambda: model_class(gen), repeat)
+            model.clause_cache = None  # Every step is timed without the cache (see encode_cached)
+            for option, value in options.items():
+                setattr(model, option, value)
+            model.set_gophersat_path(gopherpath)
+            weighted = model_class is MaxSatSinglePeakModel or options.get("encoding") == "relaxed"
+            model.workingfile = os.path.join(tmp_dir, f"workingfile_{name}" + (".wcnf" if weighted else ".cnf"))
+
+            clauses = []
+            for family in ("2a", "2b", "2c", "2d", "2e"):
+                timings[f"{name}/clauses_{family}"], family_clauses = timeit(
+                    getattr(model, f"clauses_{family}"), repeat)
+                clauses += family_clauses
+            numvar = len(model.variables["frontier_var"]) + len(model.variables["coalition_var"])
+            timings[f"{name}/dimacs"], _ = timeit(lambda: clauses_to_dimacs(clauses, numvar), repeat)
+            timings[f"{name}/encode"], dimacs = timeit(model.encode, repeat)
+            model.clause_cache = ClauseCache()
+            model.encode()  # Fills the cache, only the clauses 2d/2e are rebuilt afterwards
+            timings[f"{name}/encode_cached"], _ = timeit(model.encode, repeat)
+            model.clause_cache = None
+            timings[f"{name}/write"], _ = timeit(
+                lambda: write_dimacs_file(dimacs, model.workingfile), repeat)
+
+            if gopherpath is None or not os.path.exists(gopherpath):
+                continue
+            timings[f"{name}/gophersat"], res = timeit(
+                lambda: exec_gophersat(model.workingfile, gopherpath, weighted=weighted), repeat)
+            timings[f"{name}/decode"], _ = timeit(lambda: model.decode(res), repeat)
+            timings[f"{name}/predict"], _ = timeit(model.predict, repeat)
+
+        if gopherpath is not None and os.path.exists(gopherpath):
+            # Full encoding against the lazy (counterexample-guided) training
+            model = NcsSatModel(gen)
+            model.clause_cache = None
+            model.set_gophersat_path(gopherpath)
+            model.workingfile = os.path.join(tmp_dir, "workingfile_lazy.cnf")
+            timings["ncs/train"], _ = timeit(model.train, repeat)
+            timings["ncs_lazy/train"], _ = timeit(model.train_lazy, repeat)
+
+    if mrsort:
+        # Imported here as gurobipy needs a licence that not every machine running the benchmark has
+        from mrsort import MRSort
+
+        def build():
+            mrs = MRSort(gen)
+            mrs.set_constraint()
+            return mrs
+
+        timings["mrsort/build"], mrs = timeit(build, 1)
+        timings["mrsort/solve"], _ = timeit(mrs.solve, 1)
+        timings["mrsort/predict"], _ = timeit(mrs.test, repeat)
+
+    return timings
+
+
+def run_benchmarks(sizes: list, criteria: list, classes: list, gopherpath: str,
+                   repeat: int = 3, mrsort: bool = True, seed: int = 0, noise_percent: float = None) -> dict:
+    """Sweeps the dataset dimensions and times every step
+
+    Returns:
+        dict: "<step>/n=<size>/m=<criteria>/p=<classes>[/noise=<percent>]" -> best time (in seconds)
+    """
+    results = {}
+    suffix = "" if noise_percent is None else f"/noise={noise_percent}"
+    for size, num_criteria, num_classes in product(sizes, criteria, classes):
+        # Generator draws from both the random module (lmbda) and numpy: same dataset on every run
+        random.seed(seed)
+        np.random.seed(seed)
+        timings = bench_case(size, num_criteria, num_classes, gopherpath, repeat, mrsort, noise_percent)
+        for step, duration in timings.items():
+            results[f"{step}/n={size}/m={num_criteria}/p={num_classes}{suffix}"] = duration
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25, min_time: float = 1e-3) -> list:
+    """Lists the steps slower than the baseline
+
+    Args:
+        results (dict): timings of the current run
+        baseline (dict): reference timings
+        tolerance (float, optional): accepted relative slowdown. Defaults to 0.25.
+        min_time (float, optional): timings below are too noisy to be compared (in seconds).
+            Defaults to 1e-3.
+
+    Returns:
+        list: (step, baseline time, current time) of each regression
+    """
+    regressions = []
+    for step, duration in results.items():
+        reference = baseline.get(step)
+        if reference is None or max(reference, duration) < min_time:
+            continue
+        if duration > reference * (1 + tolerance):
+            regressions.append((step, reference, duration))
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--sizes", help="Sizes of the datasets.", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("-ncr", "--num_criteria", help="Numbers of criteria.", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("-ncl", "--num_classes", help="Numbers of classes.", type=int, nargs="+", default=[2, 3])
+    parser.add_argument("-r", "--repeat", help="Runs of each step (best time is kept).", type=int, default=3)
+    parser.add_argument("-g", "--gopher-path", help="Path to gophersat solver.", type=str, default="./gophersat.exe")
+    parser.add_argument("--no-mrsort", help="Skips MR-Sort (needs gurobipy)", action="store_true")
+    parser.add_argument("-npct", "--noise_percent", help="Benchmarks on noisy data (share of noisy labels)", type=float, default=None)
+    parser.add_argument("--save", help="Path of the json file to store the results to", default=None)
+    parser.add_argument("--compare", help="Path of the json baseline to compare the results with", default=None)
+    parser.add_argument("-t", "--tolerance", help="Accepted relative slowdown against the baseline", type=float, default=0.25)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    results = run_benchmarks(args.sizes, args.num_criteria, args.num_classes, args.gopher_path,
+                             repeat=args.repeat, mrsort=not args.no_mrsort, noise_percent=args.noise_percent)
+
+    for step, duration in sorted(results.items()):
+        print(f"{step:<60} {duration * 1000:>10.2f} ms")
+
+    if args.save is not None:
+        with open(args.save, "w", encoding="utf8") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.tolerance)
+        print("---------------------------------------- REGRESSIONS ----------------------------------------")
+        for step, reference, duration in regressions:
+            print(f"{step:<60} {reference * 1000:>10.2f} ms -> {duration * 1000:>10.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print("None")
@@ -0,0 +1,34 @@
+import numpy as np
+from tools.generator import Generator
+from tools.csvReader import csvReader
+from tools.parseArg import parseArguments
+from tools.cross_validation import cross_validate, summarize
+
+if __name__=='__main__':
+    args = parseArguments()
+    if args.file is None:
+        gen = Generator(args.size, args.num_classes, args.num_criteria, args.lmbda, noisy=args.noisy, noise_percent= args.noise_percent, possible_frontiers=args.possible_frontier or 'monotonous')
+        gen.display()
+    else:
+        rd = csvReader(args.file)
+        gen = rd.to_generator()
+        gen.display_imported()
+    # Every student is in a test fold once (the train/test split of the generator is not used)
+    grades = np.vstack([gen.grades, gen.grades_test])
+    labels = np.concatenate([gen.admission, gen.admission_test])
+    options = {"preprocessing": args.preprocess}
+
+    for learner in args.learners or ["ncs"]:
+        results = cross_validate(grades, labels, learner, folds=args.folds, gopherpath=args.gopher_path,
+                                 jobs=args.jobs, num_classes=gen.num_classes,
+                                 options=options if learner != "mrsort" else None)
+        print(f"------------------------------------ {learner.upper()} ({args.folds} FOLDS) ------------------------------------")
+        print(f"{'Fold':<10} {'Test accuracy':<20} {'Train accuracy':<20} {'Fit time':<20} {'Clauses':<20} {'CNF bytes':<20}")
+        for result in results:
+            if "error" in result:
+                print(f"{result['fold']:<10} {result['error']}")
+                continue
+            print(f"{result['fold']:<10} {round(result['accuracy'], 4):<20} {round(result['train_accuracy'], 4):<20} "
+                  f"{str(round(result['fit_time'], 3)) + 's':<20} {result['num_clauses']:<20} {result['cnf_bytes']:<20}")
+        for label, value in summarize(results).items():
+            print(f"{label:<30} {round(value, 4) if isinstance(value, float) else value}")
@@ -0,0 +1,29 @@
+from tools.generator import Generator
+from tools.csvReader import csvReader
+from tools.parseArg import parseArguments
+from tools.ensemble import compare_sharding
+
+if __name__=='__main__':
+    args = parseArguments()
+    if args.file is None:
+        gen = Generator(args.size, args.num_classes, args.num_criteria, args.lmbda, noisy=args.noisy, noise_percent= args.noise_percent, possible_frontiers=args.possible_frontier or 'monotonous')
+        gen.display()
+    else:
+        rd = csvReader(args.file)
+        gen = rd.to_generator()
+        gen.display_imported()
+
+    for learner in args.learners or ["ncs"]:
+        # Single model on every student of the train set, then the ensembles
+        rows = compare_sharding(gen.grades, gen.admission, gen.grades_test, gen.admission_test, learner,
+                                shard_counts=args.shards, shard_sizes=args.shard_size or [None],
+                                num_classes=gen.num_classes, gopherpath=args.gopher_path, vote=args.vote,
+                                sampling=args.sampling, jobs=args.jobs, options={"preprocessing": args.preprocess})
+        print(f"------------------------------------ {learner.upper()} ENSEMBLE ------------------------------------")
+        print(f"{'Shards':<10} {'Shard size':<12} {'Trained':<10} {'Train accuracy':<16} {'Test accuracy':<16} {'Wall time':<12} {'Max clauses':<12}")
+        for row in rows:
+            if "error" in row:
+                print(f"{row['shards']:<10} {row['shard_size']:<12} {row['error']}")
+                continue
+            print(f"{row['shards']:<10} {row['shard_size']:<12} {row['trained']:<10} {round(row['train_accuracy'], 4):<16} "
+                  f"{round(row['test_accuracy'], 4):<16} {str(round(row['wall_time'], 3)) + 's':<12} {row['max_clauses']:<12}")
@@ -3,20 +3,30 @@ from tools.generator import Generator
 from tools.csvReader import csvReader
 from mrsort import MRSort
 from tools.parseArg import parseArguments
+from tools import clause_cache, metrics
 from tools.utils import print_comparison
 from ncs import NcsSatModel
 import pandas as pd
+import tempfile
 from tools.utils import accuracy
+from tools.pipeline import run_pipeline
+from tools.portfolio import train_learner
+from tools.cost_model import dataset_features
 from itertools import product
 
 if __name__=='__main__':
     args = parseArguments()
+    stop_metrics = metrics.from_arguments(args)
+    clause_cache.DEFAULT_CACHE.directory = args.clause_cache
     df = pd.DataFrame()
+    pipelined = []  # (generator, model, perf) trained at the end in pipelined mode
     for iter, size, noise, num_classes, num_criteria in product(range(5), range(25, 101, 25), range(0,16,5), range(2,5), range(3,7)):
         noisy = (noise > 0)
         gen = Generator(
             size, num_classes=num_classes, num_criteria=num_criteria, noisy=noisy, noise_percent=noise/100
         )
+        # Features of the train set (fitted on by the cost model of tools.cost_model)
+        features = dataset_features(gen.grades, gen.admission, num_classes)
 
         # MR_Sort
         mr_perf = {}
@@ -34,26 +44,58 @@ if __name__=='__main__':
         mr_perf["time"] = mr_sort_end - mr_sort_begin
         mr_perf["accuracy_on_train"] = accuracy(res, gen.admission)
         mr_perf["accuracy_on_test"] = accuracy(mrs.test(), gen.admission_test)
+        mr_perf["feasible"] = float(mrs.params is not None)
+        mr_perf.update(features)
         df = df.append(mr_perf, ignore_index=True)
 
+        # Other learners of the portfolio (compared by the cost model of the auto mode)
+        for learner in args.learners or []:
+            if learner in ("mrsort", "ncs"):
+                continue
+            with tempfile.TemporaryDirectory() as working_dir:
+                result = train_learner(learner, gen, args.gopher_path, working_dir)
+            perf = {"name": learner, "size": size, "noise": noise/100, "num_classes": num_classes,
+                    "num_criteria": num_criteria, "time": result["time"], "feasible": float("error" not in result)}
+            if "error" not in result:
+                perf["accuracy_on_train"] = result["accuracy"]
+                perf["accuracy_on_test"] = accuracy(result["test_pred"], gen.admission_test)
+            perf.update(features)
+            df = df.append(perf, ignore_index=True)
+
         # NCS
         ncs_perf = {}
+        ncs_perf["name"] = "NCS"
+        ncs_perf["size"] = size
+        ncs_perf["noise"] = noise/100
+        ncs_perf["num_classes"] = num_classes
+        ncs_perf["num_criteria"] = num_criteria
+        ncs_perf.update(features)
         ncs_begin = time()
 
         u_ncs = NcsSatModel(generator=gen)
         u_ncs.set_gophersat_path(args.gopher_path)
+        if args.pipeline:
+            pipelined.append((gen, u_ncs, ncs_perf, time() - ncs_begin))
+            continue
         train_labels = u_ncs.train()
         ncs_end = time()
         test_labels = u_ncs.predict()
 
-        ncs_perf["name"] = "NCS"
-        ncs_perf["size"] = size
-        ncs_perf["noise"] = noise/100
-        ncs_perf["num_classes"] = num_classes
-        ncs_perf["num_criteria"] = num_criteria
         ncs_perf["time"] = ncs_end - ncs_begin
         ncs_perf["accuracy_on_train"] = accuracy(train_labels, gen.admission)
         ncs_perf["accuracy_on_test"] = accuracy(test_labels, gen.admission_test)
+        ncs_perf["feasible"] = float(u_ncs.stats.solver_status in ("SATISFIABLE", "OPTIMUM FOUND"))
         df = df.append(ncs_perf, ignore_index=True)
+
+    if pipelined:
+        all_train_labels = run_pipeline([u_ncs for _, u_ncs, _, _ in pipelined])
+        for (gen, u_ncs, ncs_perf, init_time), train_labels in zip(pipelined, all_train_labels):
+            # Time spent on this problem in each stage (stages overlap between problems)
+            ncs_perf["time"] = init_time + sum(u_ncs.pipeline_times.values())
+            ncs_perf["accuracy_on_train"] = accuracy(train_labels, gen.admission)
+            ncs_perf["accuracy_on_test"] = accuracy(u_ncs.predict(), gen.admission_test)
+            ncs_perf["feasible"] = float(u_ncs.stats.solver_status in ("SATISFIABLE", "OPTIMUM FOUND"))
+            df = df.append(ncs_perf, ignore_index=True)
     df_mean = df.groupby(['name', 'size', 'noise', 'num_classes', 'num_criteria']).mean()
     df_mean.to_csv('results.csv')
+    stop_metrics()
@@ -3,12 +3,22 @@ from tools.generator import Generator
 from tools.csvReader import csvReader
 from mrsort import MRSort
 from tools.parseArg import parseArguments
-from tools.utils import print_comparison
+from tools.planner import Budget
+from tools.result_cache import ResultCache
+from tools.quantize import Quantizer
+from tools.cost_model import CostModel, run_auto
+from tools import clause_cache, metrics
+from tools.model_io import save_model
+from tools.utils import print_comparison, print_auto
 from ncs import NcsSatModel
+from ncs_local_search import LocalSearchNcsModel
 import pandas as pd
 
 if __name__=='__main__':
     args = parseArguments()
+    stop_metrics = metrics.from_arguments(args)
+    clause_cache.DEFAULT_CACHE.directory = args.clause_cache
+    result_cache = ResultCache.from_arguments(args)
     if args.file is None:
         gen = Generator(args.size, args.num_classes, args.num_criteria, args.lmbda, noisy=args.noisy, noise_percent= args.noise_percent)
         gen.display()
@@ -18,11 +28,18 @@ if __name__=='__main__':
         gen.display_imported()
     # gen = Generator(size=1000, num_classes=4, lmbda=0.5, weights=[0.2, 0.4, 0.25, 0.15], frontier=[12, 13, 10, 11])
 
+    if args.auto:  # Learner selected by the cost model (tools.cost_model) instead of the default ones
+        record = run_auto(gen, CostModel.from_arguments(args), args.gopher_path, args.learners, log_file=args.auto_log)
+        print_auto(record, train_classes=gen.admission, test_classes=gen.admission_test)
+        stop_metrics()
+        raise SystemExit
+
     # MR_Sort
     mr_perf = {}
     mr_sort_begin = time()
     # print('\nMR-SORT')
     mrs = MRSort(gen)
+    mrs.result_cache = result_cache
     mrs.set_constraint()
     res = mrs.solve()
     mr_sort_end = time()
@@ -30,6 +47,7 @@ if __name__=='__main__':
     mr_perf["time"] = mr_sort_end - mr_sort_begin
     mr_perf["train_pred"] = res
     mr_perf["test_pred"] = mrs.test()
+    mr_perf["stats"] = mrs.stats
 
     # NCS
     ncs_perf = {}
@@ -37,14 +55,33 @@ if __name__=='__main__':
 
     ncs_begin = time()
 
-    u_ncs = NcsSatModel(generator=gen)
+    u_ncs = NcsSatModel(generator=gen) if args.local_search is None else LocalSearchNcsModel(generator=gen)
     u_ncs.set_gophersat_path(args.gopher_path)
-    train_labels = u_ncs.train()
+    u_ncs.budget = Budget.from_arguments(args)
+    u_ncs.on_budget_exceeded = args.on_budget
+    u_ncs.result_cache = result_cache
+    if args.quantize is not None:
+        u_ncs.set_quantization(Quantizer(args.quantize, args.quantize_param))
+    if args.prune_criteria is not None:
+        pruned = u_ncs.prune_criteria(heuristic=args.prune_criteria == "heuristic", threshold=args.prune_threshold)
+        print(f"Pruned criteria: {pruned}")
+    u_ncs.preprocessing = args.preprocess
+    u_ncs.on_inconsistent = args.on_inconsistent
+    if args.relaxed:
+        u_ncs.encoding = "relaxed"
+    if args.local_search == "bound":
+        train_labels = u_ncs.train_exact()
+    else:
+        train_labels = u_ncs.train_lazy() if args.lazy and args.local_search is None else u_ncs.train()
     ncs_end = time()
     test_labels = u_ncs.predict()
 
     ncs_perf["time"] = ncs_end - ncs_begin
     ncs_perf["train_pred"] = train_labels
     ncs_perf["test_pred"] = test_labels
+    ncs_perf["stats"] = u_ncs.stats
 
-    print_comparison(mr_perf=mr_perf, ncs_perf=ncs_perf, train_classes=gen.admission, test_classes=gen.admission_test)
\ No newline at end of file
+    if args.save_model is not None:
+        save_model(u_ncs, args.save_model)
+    print_comparison(mr_perf=mr_perf, ncs_perf=ncs_perf, train_classes=gen.admission, test_classes=gen.admission_test)
+    stop_metrics()
@@ -2,22 +2,47 @@ from gurobipy import *
 import numpy as np
 from numpy.core.fromnumeric import shape
 from itertools import product
+from time import perf_counter
+from tools import metrics
+from tools.dataset import Dataset
+from tools.result_cache import CACHED_STATUSES, json_compatible, training_key
+from tools.stats import TrainStats
 
 np.set_printoptions(precision=2)
 
 class MRSort:
-    def __init__(self, generator):
+    def __init__(self, generator=None):
         """
         Initialize the MR-Sort solver.
 
         Args:
             generator: Generator object, generating samples used to train the model
+                (or tools.dataset.Dataset). Defaults to None (given later by fit).
         """
+        self.stats = TrainStats()
+        self.objective = None
+        self.params = None  # Weights, frontier, lambda and alpha found by the solver
+        # Opt-in cache of the trained models (tools.result_cache.ResultCache)
+        self.result_cache = None
+        self.gen = None
+        if generator is not None:
+            self.set_dataset(generator)
+
+    def set_dataset(self, generator):
+        """
+        Set the samples used to train the model and create the Gurobi variables.
+
+        Args:
+            generator: Generator object (or tools.dataset.Dataset)
+        """
+        begin = perf_counter()
+        self.stats = TrainStats()
         self.gen = generator
         self.nb_split = generator.num_classes - 1
         self.grades, self.admission = generator.grades, generator.admission
         self.model = Model("MR-sort")
         self.objective = None
+        self.params = None
 
         # Constants
         self.nb_ech = len(self.admission)
@@ -34,6 +59,39 @@ class MRSort:
 
         self.c = self.model.addMVar(shape=(self.nb_ech, self.nb_notes, self.nb_split), lb=0, ub=1)
         self.d = self.model.addMVar(shape=(self.nb_ech, self.nb_notes, self.nb_split), vtype=GRB.BINARY)
+        self.stats.families["variables"] = {"variables": None, "time": perf_counter() - begin}
+
+    def fit(self, grades, labels, num_classes=None):
+        """
+        Train the model on samples given directly, without Generator.
+
+        Args:
+            grades: np.array of the grades of the samples
+            labels: np.array of the categories of the samples
+            num_classes: number of categories. Defaults to None (highest label + 1).
+
+        return:
+            - MRSort: the trained model (params is None if no optimum was found)
+        """
+        self.set_dataset(Dataset(grades, labels, num_classes))
+        self.set_constraint()
+        self.solve()
+        return self
+
+    def predict(self, grades=None):
+        """
+        Assign samples to categories (see classify).
+
+        Args:
+            grades: np.array of the grades of the samples. Defaults to None (test set of the generator).
+
+        return:
+            - np.array: category of each sample
+        """
+        begin = perf_counter()
+        res = self.classify(self.gen.grades_test if grades is None else np.asarray(grades, dtype=float))
+        metrics.record_prediction("MRSort", len(res), perf_counter() - begin)
+        return res
 
     def solve(self):
         """
@@ -42,35 +100,76 @@ class MRSort:
         return:
             - np.array: category found by the solver for each sample
         """
+        if self.result_cache is not None:
+            result = self.result_cache.get(self.cache_key())
+            if result is not None:  # Same training set: no solver call
+                self.params = {name: np.array(value) for name, value in result["params"].items()}
+                self.stats.solver_status = result["solver_status"]
+                return self.classify(self.grades)
+
         if self.objective == None:
             return (None, 0)
 
         self.model.update()
+        self.stats.num_variables = self.model.NumVars
+        self.stats.num_clauses = self.model.NumConstrs
+        if "constraints" in self.stats.families:
+            self.stats.families["variables"]["variables"] = self.model.NumVars
+            self.stats.families["constraints"]["clauses"] = self.model.NumConstrs
         self.model.setObjective(self.objective, GRB.MAXIMIZE)
         self.model.params.outputflag = 0 # (mode mute)
+        begin = perf_counter()
         self.model.optimize()
+        self.stats.solver_time = perf_counter() - begin
+        self.stats.solver_status = "OPTIMAL" if self.model.status == GRB.OPTIMAL else f"STATUS {self.model.status}"
+        metrics.record_solve("MRSort", self.stats.solver_status, self.stats.solver_time,
+                             success=self.model.status == GRB.OPTIMAL,
+                             timeout=self.model.status == GRB.TIME_LIMIT)
 
         if self.model.status != GRB.OPTIMAL:
+            self.stats.record_memory()
             return (None, 0)
-        res = np.zeros((self.nb_ech))
-        for i in range(self.nb_split):
-            res += ((self.grades > self.b.X[:,i])*self.w.X).sum(axis=1) > self.lmbda.X
+        begin = perf_counter()
+        self.params = {"weights": self.w.X, "frontier": self.b.X, "lmbda": self.lmbda.X, "alpha": self.alpha.X}
+        res = self.classify(self.grades)
+        self.stats.decode_time = perf_counter() - begin
+        self.stats.record_memory()
+        metrics.record_train("MRSort", self.stats.total_time)
+        if self.result_cache is not None and self.stats.solver_status in CACHED_STATUSES:
+            self.result_cache.put(self.cache_key(),
+                                  json_compatible({"params": self.params, "solver_status": self.stats.solver_status}))
         return res
 
-    def test(self):
-        res = np.zeros((len(self.gen.grades_test)))
+    def cache_key(self) -> str:
+        """Key of the training in the result cache (see tools.result_cache.training_key)"""
+        return training_key("MRSort", self.grades, self.admission, {"num_classes": self.nb_split + 1})
+
+    def classify(self, grades):
+        """
+        Assign samples to categories with the parameters found by the solver.
+
+        Args:
+            grades: np.array of the grades of the samples
+
+        return:
+            - np.array: category of each sample
+        """
+        res = np.zeros((len(grades)))
         for i in range(self.nb_split):
-            res += ((self.gen.grades_test > self.b.X[:,i])*self.w.X).sum(axis=1) > self.lmbda.X
+            res += ((grades > self.params["frontier"][:,i])*self.params["weights"]).sum(axis=1) > self.params["lmbda"]
         return res
 
+    def test(self):
+        return self.predict()
+
     def print_params(self):
         """
         Print the parameters found by the MR-Sort solver.
         """
         print(f"Parametres trouves par MR-Sort:\n",
-            f"- alpha: {self.alpha.X}\n",
-            f"- lambda: {self.lmbda.X}\n",
-            f"- weights: {self.w.X}\n",
+            f"- alpha: {self.params['alpha']}\n",
+            f"- lambda: {self.params['lmbda']}\n",
+            f"- weights: {self.params['weights']}\n",
         )
 
 
@@ -78,6 +177,7 @@ class MRSort:
         """
         Set the constraints for the MR-Sort solver.
         """
+        begin = perf_counter()
         epsilon = 1e-9
         M = 1e2 # superieur a l'ecart max, 20
 
@@ -114,5 +214,6 @@ class MRSort:
         self.model.addConstr(quicksum(self.w[k] for k in range(self.nb_notes)) == 1)
 
         self.objective = self.alpha
+        self.stats.families["constraints"] = {"clauses": None, "time": perf_counter() - begin}
 
 
@@ -0,0 +1,221 @@
+"""This module learns an U-NCS model by local search (no solver), for the instances too large for SAT/MaxSAT"""
+
+from time import perf_counter
+import numpy as np
+from tools import metrics
+from tools.generator import Generator
+from tools.planner import EncodingBudgetExceeded
+from tools.pruning import full_width
+from tools.stats import TrainStats
+from tools.utils import grade_ranks
+from ncs import NcsSatModel
+
+
+class LocalSearchNcsModel(NcsSatModel):
+    """Non Compensatory Sorting model learned by local search on the frontiers and the sufficient coalition
+
+    The frontier h of a criterion is a threshold on the ranks of its values (values_support):
+    an alternative reaches it if its rank is at least the threshold. An alternative is at least
+    in class h if it reaches the frontier h on every criterion of the sufficient coalition
+    (the model of predict). Each move sets one threshold to its best value, the other ones being
+    fixed, or adds/removes one criterion of the coalition. The number of well classified alternatives
+    of every candidate threshold is computed at once (cumulated counts over the ranks) and only the
+    alternatives whose rank is between the old and new thresholds are updated.
+
+    The result (frontier, suff_coal) is the one of the SAT model, so that predict, dump_result, etc.
+    are unchanged. train_exact uses it as a bound and fallback of the exact SAT/MaxSAT training.
+    """
+
+    def __init__(self, generator: Generator = None) -> None:
+        """
+        Args:
+            generator (Generator, optional): students of the train set (or tools.dataset.Dataset).
+                Defaults to None (given later by fit).
+        """
+        super().__init__(generator)
+        self.max_sweeps = 50  # Sweeps over every threshold and criterion per restart
+        self.restarts = 4  # Random restarts after the first search (from the single criterion thresholds)
+        self.time_limit = None  # Time of the whole search (in seconds), None for no limit
+        self.seed = 0
+
+    def initial_thresholds(self, ranks: np.ndarray, labels: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Thresholds classifying best the alternatives on each criterion alone, the alternatives
+        above and below the frontier weighing as much in total (balanced: otherwise the threshold of a
+        rare class is above every value, the other criteria of the coalition being ignored)
+        (nested: the frontier of a class is above the one of the class below)
+
+        Returns:
+            np.ndarray: threshold (rank) of each frontier (rows) and criterion (columns)
+        """
+        thresholds = np.zeros((self.num_classes - 1, self.num_criteria), dtype=int)
+        for h in range(1, self.num_classes):
+            above = (labels >= h) * weights
+            below = (labels < h) * weights
+            above, below = above / max(above.sum(), 1), below / max(below.sum(), 1)
+            for i, values in enumerate(self.values_support):
+                # Well classified when the ranks at least t are above h and the other ones below
+                above_count = np.bincount(ranks[:, i], weights=above, minlength=len(values) + 1)
+                below_count = np.bincount(ranks[:, i], weights=below, minlength=len(values) + 1)
+                score = np.cumsum(above_count[::-1])[::-1] + np.concatenate([[0], np.cumsum(below_count)[:-1]])
+                thresholds[h - 1, i] = int(np.argmax(score))
+        return np.maximum.accumulate(thresholds, axis=0)
+
+    def search(self, thresholds: np.ndarray, coalition: np.ndarray, ranks: np.ndarray, labels: np.ndarray,
+               weights: np.ndarray, deadline: float) -> tuple:
+        """Local search from a model until no move improves it
+
+        Args:
+            thresholds (np.ndarray): initial thresholds (see initial_thresholds), modified in place
+            coalition (np.ndarray): initial criteria of the coalition (boolean mask), modified in place
+            ranks (np.ndarray): ranks of the grades of the alternatives (see grade_ranks)
+            labels (np.ndarray): labels of the alternatives
+            weights (np.ndarray): 1 for the alternatives to classify, 0 for the other ones
+            deadline (float): perf_counter value at which the search stops
+
+        Returns:
+            tuple: (thresholds, coalition, number of well classified alternatives (weighted))
+        """
+        num_frontiers = self.num_classes - 1
+        num_values = np.array([len(values) for values in self.values_support])
+        # Criteria of the coalition not reached by each alternative, for each frontier
+        below = ranks[None, :, :] < thresholds[:, None, :]
+        failed = (below & coalition).sum(axis=2)
+        pred = (failed == 0).sum(axis=0)
+        correct = float(((pred == labels) * weights).sum())
+
+        for _ in range(self.max_sweeps):
+            improved = False
+            for h in range(num_frontiers):
+                for i in np.flatnonzero(coalition):
+                    if perf_counter() > deadline:
+                        return thresholds, coalition, correct
+                    current = thresholds[h, i]
+                    # Alternatives reaching the frontier h on the other criteria: only they depend on the threshold
+                    sensitive = failed[h] - (ranks[:, i] < current) == 0
+                    base = pred[sensitive] - (failed[h, sensitive] == 0)  # Class without the frontier h
+                    rank = ranks[sensitive, i]
+                    reach = np.bincount(rank, weights=(base + 1 == labels[sensitive]) * weights[sensitive],
+                                        minlength=num_values[i] + 1)
+                    stay = np.bincount(rank, weights=(base == labels[sensitive]) * weights[sensitive],
+                                       minlength=num_values[i] + 1)
+                    # Well classified for each threshold t: ranks at least t reach the frontier
+                    score = np.cumsum(reach[::-1])[::-1] + np.concatenate([[0], np.cumsum(stay)[:-1]])
+                    low = thresholds[h - 1, i] if h > 0 else 0
+                    high = thresholds[h + 1, i] if h < num_frontiers - 1 else num_values[i]
+                    best = low + int(np.argmax(score[low:high + 1]))
+                    if score[best] <= score[current]:
+                        continue
+                    # Incremental update: only the ranks between both thresholds change
+                    moved = (ranks[:, i] >= min(best, current)) & (ranks[:, i] < max(best, current))
+                    failed[h, moved] += 1 if best > current else -1
+                    below[h, moved, i] = best > current
+                    thresholds[h, i] = best
+                    new_pred = (failed[:, moved] == 0).sum(axis=0)
+                    correct += float((((new_pred == labels[moved]).astype(float) - (pred[moved] == labels[moved]))
+                                      * weights[moved]).sum())
+                    pred[moved] = new_pred
+                    improved = True
+
+            # Adds or removes the criterion improving the most (the coalition is never empty)
+            toggled = np.where(coalition, -1, 1)
+            candidates = failed[:, :, None] + below * toggled  # Frontiers x alternatives x criteria
+            scores = ((((candidates == 0).sum(axis=0) == labels[:, None]) * weights[:, None]).sum(axis=0))
+            if coalition.sum() == 1:
+                scores[coalition] = -1
+            i = int(np.argmax(scores))
+            if scores[i] > correct:
+                coalition[i] = not coalition[i]
+                failed = candidates[:, :, i]
+                pred = (failed == 0).sum(axis=0)
+                correct = float(scores[i])
+                improved = True
+            if not improved:
+                break
+        return thresholds, coalition, correct
+
+    def train(self) -> list:
+        """Learns the frontiers and the sufficient coalition by local search (from the thresholds
+        of each criterion alone, then from random restarts), keeping the best model found
+
+        Returns:
+            list: labels (classes) predicted on the train_set
+        """
+        begin = perf_counter()
+        self.stats = TrainStats()
+        deadline = begin + self.time_limit if self.time_limit is not None else np.inf
+        rng = np.random.default_rng(self.seed)
+        ranks = grade_ranks(self.train_set, self.values_support)
+        labels = np.asarray(self.labels, dtype=int)
+        weights = (labels < self.num_classes).astype(float)  # Out of range labels are not classified
+        initial = self.initial_thresholds(ranks, labels, weights)
+
+        best = None
+        for restart in range(self.restarts + 1):
+            if restart == 0:
+                thresholds, coalition = initial.copy(), np.ones(self.num_criteria, dtype=bool)
+            else:  # Thresholds moved by up to a tenth of the values, random coalition
+                num_values = np.array([len(values) for values in self.values_support])
+                shift = rng.integers(-(num_values // 10) - 1, num_values // 10 + 2, size=initial.shape)
+                thresholds = np.maximum.accumulate(np.clip(initial + shift, 0, num_values), axis=0)
+                coalition = rng.random(self.num_criteria) < 0.5
+                coalition[rng.integers(self.num_criteria)] = True
+            result = self.search(thresholds, coalition, ranks, labels, weights, deadline)
+            if best is None or result[2] > best[2]:
+                best = result
+            if best[2] == weights.sum() or perf_counter() > deadline:
+                break
+        self.stats.solver_time = perf_counter() - begin
+        self.stats.solver_status = "LOCAL SEARCH"
+        return self.apply_thresholds(*best[:2], ranks)
+
+    def apply_thresholds(self, thresholds: np.ndarray, coalition: np.ndarray, ranks: np.ndarray) -> list:
+        """Sets frontier and suff_coal (on every criterion) from thresholds on the ranks
+
+        Returns:
+            list: labels (classes) predicted on the train_set
+        """
+        begin = perf_counter()
+        for h in range(1, self.num_classes):
+            # A threshold above every value is never reached
+            front = [float(values[t]) if t < len(values) else np.inf
+                     for values, t in zip(self.values_support, thresholds[h - 1])]
+            self.frontier[h] = full_width(front, self.criteria, self.gen.num_criteria, 0)
+        self.suff_coal = tuple(self.criteria[i] for i in np.flatnonzero(coalition))
+        pred = ((ranks[None, :, coalition] >= thresholds[:, None, coalition]).all(axis=2)).sum(axis=0)
+        labels = np.asarray(self.labels)
+        self.misclassified = np.flatnonzero((pred != labels) & (labels < self.num_classes)).tolist()
+        self.stats.decode_time = perf_counter() - begin
+        self.stats.record_memory()
+        metrics.record_train(type(self).__name__, self.stats.total_time)
+        return pred.tolist()
+
+    def train_exact(self) -> list:
+        """Trains the exact SAT/MaxSAT model (see NcsSatModel.train), bounded by the local search:
+            - the solver is not called if the local search misclassifies no alternative, or no more than
+              the lower bound of the consistency check (tools.consistency), as it is then optimal
+            - the local search model is kept if the encoding exceeds the budget (tools.planner),
+              if the solver finds no solution or if its model misclassifies more alternatives
+
+        Returns:
+            list: labels (classes) predicted on the train_set
+        """
+        heuristic_pred = self.train()
+        heuristic = (dict(self.frontier), self.suff_coal, self.misclassified, self.stats)
+        encoded = int((np.asarray(self.labels) < self.num_classes).sum())
+        errors = len(self.misclassified)
+        if errors == 0:
+            return heuristic_pred
+        if self.on_inconsistent == "relaxed" and errors <= self.check_consistency()["lower_bound"]:
+            return heuristic_pred
+        try:
+            exact_pred = NcsSatModel.train(self)
+        except EncodingBudgetExceeded as error:
+            print(f"Local search model kept: {error}")
+            exact_pred = None
+        if exact_pred is not None and self.stats.solver_status in ("SATISFIABLE", "OPTIMUM FOUND"):
+            exact_correct = sum(exact_pred[u] == self.labels[u] for u in range(len(self.labels))
+                                if self.labels[u] < self.num_classes)
+            if exact_correct >= encoded - errors:
+                return exact_pred
+        self.frontier, self.suff_coal, self.misclassified, self.stats = heuristic
+        return heuristic_pred
@@ -0,0 +1,29 @@
+from tools.generator import Generator
+from tools.csvReader import csvReader
+from tools.parseArg import parseArguments
+from tools.portfolio import run_portfolio
+from tools.utils import print_peak
+
+if __name__=='__main__':
+    args = parseArguments()
+    if args.file is None:
+        gen = Generator(args.size, args.num_classes, args.num_criteria, args.lmbda, noisy=args.noisy, noise_percent= args.noise_percent, possible_frontiers=args.possible_frontier or 'monotonous')
+        gen.display()
+    else:
+        rd = csvReader(args.file)
+        gen = rd.to_generator()
+        gen.display_imported()
+
+    # Races the learners (MR-Sort, U-NCS SAT, single peak SAT and MaxSAT, compact encodings)
+    best, results = run_portfolio(gen, learners=args.learners, gopherpath=args.gopher_path,
+                                  min_accuracy=args.min_accuracy, deadline=args.deadline)
+
+    print("----------------------------------------- PORTFOLIO -----------------------------------------")
+    for result in results:
+        status = result["error"] if "error" in result else f"train accuracy {result['accuracy']}"
+        print(f"{result['name']:<30} {str(round(result.get('time', 0), 3)) + 's':<30} {status:<30}")
+    if best is None:
+        print("No learner found a result in time")
+    else:
+        print(f"Selected learner: {best['name']}")
+        print_peak(best, train_classes=gen.admission, test_classes=gen.admission_test)
@@ -0,0 +1,13 @@
+from tools.parseArg import parseArguments
+from tools.model_io import score_file
+
+if __name__=='__main__':
+    args = parseArguments()
+    if args.model is None or args.file is None:
+        raise SystemExit("Expected a saved model (--model) and an applicants file (-f)")
+    report = score_file(args.model, args.file, args.output, chunk_size=args.chunk_size, jobs=args.jobs or 1)
+    print(f"{'Applicants scored':<30} {report['rows']} ({report['chunks']} chunks of at most {args.chunk_size})")
+    print(f"{'Model loading time':<30} {round(report['load_time'], 3)}s")
+    print(f"{'Scoring time':<30} {round(report['time'], 3)}s")
+    print(f"{'Throughput':<30} {round(report['rows_per_second'])} rows/s")
+    print(f"{'Labels written to':<30} {args.output}")
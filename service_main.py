@@ -0,0 +1,28 @@
+import numpy as np
+from tools.parseArg import parseArguments
+from tools.model_io import load_model, read_chunks
+from tools.scoring_service import serve, benchmark
+
+if __name__=='__main__':
+    args = parseArguments()
+    if args.model is None:
+        raise SystemExit("Expected a saved model (--model)")
+    if args.benchmark is None:
+        print(f"Scoring service of {args.model} on {args.socket or f'http://127.0.0.1:{args.port}'}")
+        serve(args.model, port=args.port, socket_path=args.socket, max_batch=args.max_batch,
+              max_wait=args.max_wait, watch_interval=args.watch)
+        raise SystemExit
+
+    # Applicants of the file, or random grades (uniform between 0 and 20, as the generator)
+    if args.file is not None:
+        grades = next(read_chunks(args.file, args.size))[1]
+    else:
+        grades = np.random.uniform(0, 20, (args.size, load_model(args.model).num_criteria))
+    results = benchmark(args.model, grades, max_batches=sorted({1, args.max_batch}), requests=args.benchmark,
+                        clients=args.clients, max_wait=args.max_wait, socket_path=args.socket, port=args.port)
+    print(f"------------------------------------ SCORING SERVICE ({args.clients} CLIENTS) ------------------------------------")
+    print(f"{'Max batch':<12} {'Requests':<10} {'Errors':<8} {'Throughput':<16} {'p50 latency':<14} {'p99 latency':<14} {'Mean batch':<12}")
+    for result in results:
+        print(f"{result['max_batch']:<12} {result['requests']:<10} {result['errors']:<8} "
+              f"{str(round(result['throughput'])) + ' req/s':<16} {str(round(result['p50'] * 1000, 2)) + 'ms':<14} "
+              f"{str(round(result['p99'] * 1000, 2)) + 'ms':<14} {round(result['mean_batch'], 2):<12}")
@@ -2,14 +2,22 @@ from time import time
 from tools.generator import Generator
 from tools.csvReader import csvReader
 from tools.parseArg import parseArguments
+from tools.planner import Budget
+from tools.result_cache import ResultCache
+from tools.quantize import Quantizer
+from tools.cost_model import CostModel, run_auto
+from tools import clause_cache, metrics
+from tools.model_io import save_model
 from single_peak_sat import SinglePeakModel
 from single_peak_maxsat import MaxSatSinglePeakModel
-from tools.utils import print_peak
+from tools.utils import print_peak, print_auto
 
 MAXSAT = True
 
 if __name__=='__main__':
     args = parseArguments()
+    stop_metrics = metrics.from_arguments(args)
+    clause_cache.DEFAULT_CACHE.directory = args.clause_cache
     if args.file is None:
         gen = Generator(args.size, args.num_classes, args.num_criteria, args.lmbda, noisy=args.noisy, noise_percent= args.noise_percent, possible_frontiers=args.possible_frontier)
         gen.display()
@@ -19,6 +27,12 @@ if __name__=='__main__':
         gen.display_imported()
     # gen = Generator(size=1000, num_classes=4, lmbda=0.5, weights=[0.2, 0.4, 0.25, 0.15], frontier=[12, 13, 10, 11])
 
+    if args.auto:  # Learner selected by the cost model (tools.cost_model) instead of the default ones
+        record = run_auto(gen, CostModel.from_arguments(args), args.gopher_path, args.learners, log_file=args.auto_log)
+        print_auto(record, train_classes=gen.admission, test_classes=gen.admission_test)
+        stop_metrics()
+        raise SystemExit
+
     # Single Peak Model
     spm_perf = {}
 
@@ -26,10 +40,27 @@ if __name__=='__main__':
 
     if MAXSAT:
         u_spm = MaxSatSinglePeakModel(generator=gen)
+        # Anytime mode: best solution found by the deadline or below the cost threshold
+        u_spm.deadline = args.deadline
+        u_spm.cost_threshold = args.cost_threshold
+        if args.relaxed:
+            u_spm.encoding = "relaxed"
     else:
         u_spm = SinglePeakModel(generator=gen)
     
     u_spm.set_gophersat_path(args.gopher_path)
+    u_spm.budget = Budget.from_arguments(args)
+    u_spm.on_budget_exceeded = args.on_budget
+    u_spm.result_cache = ResultCache.from_arguments(args)
+    u_spm.preprocessing = args.preprocess
+    if args.quantize is not None:
+        u_spm.set_quantization(Quantizer(args.quantize, args.quantize_param))
+    if args.shapes is not None:
+        shapes = u_spm.set_shapes(None if args.shapes == ["infer"] else args.shapes)
+        print(f"Criteria shapes: {shapes}")
+    if args.prune_criteria is not None:
+        pruned = u_spm.prune_criteria(heuristic=args.prune_criteria == "heuristic", threshold=args.prune_threshold)
+        print(f"Pruned criteria: {pruned}")
     train_labels = u_spm.train()
     ncs_end = time()
     test_labels = u_spm.predict()
@@ -37,4 +68,10 @@ if __name__=='__main__':
     spm_perf["time"] = ncs_end - spm_begin
     spm_perf["train_pred"] = train_labels
     spm_perf["test_pred"] = test_labels
-    print_peak(spm_perf, train_classes=gen.admission, test_classes=gen.admission_test)    
\ No newline at end of file
+    spm_perf["stats"] = u_spm.stats
+    if args.save_model is not None:
+        save_model(u_spm, args.save_model)
+    print_peak(spm_perf, train_classes=gen.admission, test_classes=gen.admission_test)
+    if MAXSAT and u_spm.cost_trajectory:
+        print(f"{'Cost trajectory':<30} {[(round(t, 3), cost) for t, cost in u_spm.cost_trajectory]}")
+    stop_metrics()
@@ -1,6 +1,19 @@
 """This module solves an U-NCS problem with a SAT Solver (gophersat)"""
 
+from time import perf_counter
+import numpy as np
+from tools import metrics
 from tools.generator import Generator
+from tools.dataset import Dataset
+from tools.incremental import update_model
+from tools.clause_cache import DEFAULT_CACHE, STRUCTURAL_FAMILIES, fingerprint, structural_key
+from tools.shapes import (SHAPES, approves, frontier_mismatches, infer_shapes, ladder_size, scale_clauses,
+                          scale_frontier)
+from tools.pruning import find_prunable, full_width
+from tools.preprocess import preprocess_model, reconstruct
+from tools.planner import EncodingPlan, check_budget, plan_encoding, restore_budget_fallback
+from tools.result_cache import CACHED_STATUSES, json_compatible, model_key
+from tools.stats import TrainStats
 from tools.utils import possible_values_per_crit, subsets, clauses_to_dimacs, write_dimacs_file, exec_gophersat
 
 
@@ -8,32 +21,123 @@ class SinglePeakModel:
     """Non Compensatory Sorting model solved with (gophersat) SAT solver
     (cf. Belahcène et al 2018)"""
 
-    def __init__(self, generator: Generator) -> None:
+    def __init__(self, generator: Generator = None) -> None:
+        """
+        Args:
+            generator (Generator, optional): students of the train set (or tools.dataset.Dataset).
+                Defaults to None (given later by fit).
+        """
+        # Optional quantization of the grades (tools.quantize.Quantizer), see set_quantization
+        self.quantizer = None
+        # Shape of each criterion (tools.shapes), see set_shapes (kept by set_dataset if the number
+        # of criteria is the same)
+        self.shapes = None
 
+        self.gopherpath = None
+        self.stats = TrainStats()
+        # Maximum size of the encoding (tools.planner.Budget), checked before building it
+        self.budget = None
+        self.on_budget_exceeded = "raise"  # or "compact" or "quantize"
+        self.budget_fallback = {}  # Options changed by check_budget for the last training (restored by the next one)
+        # Cache of the structural clauses 2a-2c (tools.clause_cache), None to always build them
+        self.clause_cache = DEFAULT_CACHE
+        # Opt-in cache of the trained models (tools.result_cache.ResultCache)
+        self.result_cache = None
+        # Compact encoding: duplicated clauses 2d/2e are not generated
+        self.compact = False
+        # Simplifies the hard clauses before writing them (tools.preprocess)
+        self.preprocessing = False
+        self.fixed = {}  # Variables fixed by the preprocessing (restored by decode)
+        self.workingfile = "workingfile.cnf"
+
+        self.gen = None
+        if generator is not None:
+            self.set_dataset(generator)
+
+    def set_dataset(self, generator: Generator) -> None:
+        """Sets the students of the train set (the pruned criteria and the last solution are reset)
+
+        Args:
+            generator (Generator): students of the train set (or tools.dataset.Dataset)
+        """
+        restore_budget_fallback(self)
         # Generator attributes
         self.gen = generator
-        self.train_set = self.gen.grades
         self.labels = self.gen.admission
+        self.num_classes = self.gen.num_classes
+        # Criteria of the encoding, the others are pruned (see prune_criteria)
+        self.criteria = list(range(self.gen.num_criteria))
+        self.pruned = {}  # Pruned criterion -> reason
+        if self.shapes is None or len(self.shapes) != self.gen.num_criteria:
+            self.shapes = ["peak"] * self.gen.num_criteria
 
         # Reformatting variables
+        self.structure = None  # Fingerprint of values_support and of the dimensions (computed once)
+        self.select_grades()
+
+        # Results to be shared to predict (on every criterion)
+        self.frontier = {i: [0]*self.gen.num_criteria for i in range(1, self.num_classes)}
+        self.suff_coal = ()
+        # Clauses of the last encoding by family (extended in place by update)
+        self.clause_store = None
+        self.assignment = None  # Last model found by the solver (variable index -> value)
+
+    def fit(self, grades: np.ndarray, labels: np.ndarray, num_classes: int = None,
+            values_support: list = None) -> "SinglePeakModel":
+        """Trains the model on students given directly, without Generator (see train)
+
+        Args:
+            grades (np.ndarray): grades of the train set (one column per criterion)
+            labels (np.ndarray): labels (classes) of the train set
+            num_classes (int, optional): number of classes. Defaults to None (highest label + 1).
+            values_support (list, optional): sorted values of each criterion in the train set,
+                when computed beforehand (see tools.cross_validation). Defaults to None.
+
+        Returns:
+            SinglePeakModel: the trained model
+        """
+        self.set_dataset(Dataset(grades, labels, num_classes, values_support=values_support))
+        self.train()
+        return self
+
+    def set_gophersat_path(self, gopherpath):
+        self.gopherpath = gopherpath
+
+    def train_grades(self) -> np.ndarray:
+        """Grades of the students on every criterion, quantized if set (see set_quantization)"""
+        grades = np.asarray(self.gen.grades)
+        return grades if self.quantizer is None else self.quantizer.fit_transform(grades)
+
+    def select_grades(self) -> None:
+        """Sets the train_set on the criteria of the encoding and indexes its variables"""
+        self.train_set = self.train_grades()[:, self.criteria]
+        self.num_criteria = len(self.criteria)
         self.coalitions = [
-            tuple(el) for el in subsets(list(range(self.gen.num_criteria)))
+            tuple(el) for el in subsets(list(range(self.num_criteria)))
         ]
+        self.index_variables()
+
+    def index_variables(self) -> None:
+        """Indexes the variables of the encoding from the values of the train_set"""
         # Tuple format is accepted as a key to the encoder dictionnary
-        self.values_support = possible_values_per_crit(self.train_set)
+        shared = getattr(self.gen, "values_support", None)
+        if shared is not None and self.quantizer is None:  # Computed beforehand (see tools.cross_validation)
+            self.values_support = [list(shared[i]) for i in self.criteria]
+        else:
+            self.values_support = possible_values_per_crit(self.train_set)
         # Set of the possible values in the train_set for each criterion
         self.alternatives_per_class = [[
             u for u in range(len(self.train_set)) if self.labels[u] == h
-        ] for h in range(self.gen.num_classes)]
+        ] for h in range(self.num_classes)]
 
         # Generating triplet (i, h, k) and coalition set B as mentioned in
         # Section 3.4,Definition 4 (SAT encoding for U-NCS)
         self.variables = {
             "frontier_var":
-            list({(i, h, k)
-                  for i in range(self.gen.num_criteria)
-                  for h in range(1, self.gen.num_classes)
-                  for k in self.values_support[i]}),
+            sorted({(i, h, k)
+                    for i in range(self.num_criteria)
+                    for h in range(1, self.num_classes)
+                    for k in self.values_support[i]}),  # Sorted: same numbering for the same values
             "coalition_var":
             self.coalitions,
         }
@@ -58,37 +162,135 @@ class SinglePeakModel:
         self.i2v.update(self.front_i2v)
         self.i2v.update(self.coal_i2v)
 
-        # Results to be shared to predict
-        self.frontier = {i: [0]*self.gen.num_criteria for i in range(1, self.gen.num_classes)}
-        self.suff_coal = ()
+        # Encodes the ladder variables d_{i, h, k} of the single peaked (or valley) criteria,
+        # for the values between the extreme ones (see tools.shapes.scale_clauses)
+        self.ladder_v2i = {}
+        for i in range(self.num_criteria):
+            if ladder_size(self.shapes[self.criteria[i]], len(self.values_support[i])) == 0:
+                continue
+            for h in range(1, self.num_classes):
+                for k in self.values_support[i][1:-1]:
+                    self.ladder_v2i[(i, h, k)] = len(self.i2v) + len(self.ladder_v2i) + 1
+        # Indexes are starting right above where coalition indexing stops
+        self.i2v.update({i: ("d",) + v for v, i in self.ladder_v2i.items()})
+
+    def set_quantization(self, quantizer) -> None:
+        """Maps the grades onto a bounded grid before encoding (test grades are mapped on predict),
+        so that the number of frontier variables no longer grows with the number of students
+
+        Args:
+            quantizer (Quantizer): quantization fitted on the train grades, None for the exact grades
+        """
+        self.quantizer = quantizer
+        if self.gen is None:  # Applied by fit
+            return
+        self.select_grades()
+        self.structure = None
+        self.clause_store = None
+        self.assignment = None
+
+    def prune_criteria(self, heuristic: bool = False, threshold: float = 0.1) -> dict:
+        """Leaves out of the encoding the criteria which cannot help (constant ones) or, if heuristic,
+        which are not likely to (see tools.pruning): each one halves the number of coalitions.
+        Frontiers and sufficient coalition are restored on every criterion by decode.
+
+        Args:
+            heuristic (bool, optional): also prunes duplicated and uninformative criteria. Defaults to False.
+            threshold (float, optional): correlation with the labels under which a criterion
+                is uninformative. Defaults to 0.1.
 
-        self.gopherpath = None
+        Returns:
+            dict: pruned criterion -> reason
+        """
+        alternatives = sorted(u for alternatives in self.alternatives_per_class for u in alternatives)
+        self.pruned = find_prunable(self.train_grades()[alternatives], np.asarray(self.labels)[alternatives],
+                                    heuristic, threshold, peak=True)
+        self.criteria = [i for i in range(self.gen.num_criteria) if i not in self.pruned]
+        self.select_grades()
+        self.structure = None
+        self.clause_store = None
+        self.assignment = None
+        return self.pruned
+
+    def set_shapes(self, shapes: list = None) -> list:
+        """Sets the shape of each criterion (see tools.shapes): monotone criteria get
+        the clauses 2a of U-NCS (2 literals), a tighter problem than the single peak ones
+
+        Args:
+            shapes (list, optional): "monotone", "peak" or "valley" for each criterion.
+                Defaults to None (inferred from the train set, see tools.shapes.infer_shapes).
+
+        Raises:
+            ValueError: unknown shape or not one shape per criterion
 
-    def set_gophersat_path(self, gopherpath):
-        self.gopherpath = gopherpath
+        Returns:
+            list: shape of each criterion
+        """
+        if shapes is None:
+            alternatives = sorted(u for alternatives in self.alternatives_per_class for u in alternatives)
+            shapes = infer_shapes(self.train_grades()[alternatives], np.asarray(self.labels)[alternatives])
+        if len(shapes) != self.gen.num_criteria or any(shape not in SHAPES for shape in shapes):
+            raise ValueError(f"Expected one shape of {SHAPES} per criterion, got {shapes}")
+        self.shapes = list(shapes)
+        self.index_variables()  # Ladder variables of the single peaked (or valley) criteria
+        self.structure = None
+        self.clause_store = None
+        self.assignment = None
+        return self.shapes
+
+    def plan(self, compact: bool = None) -> EncodingPlan:
+        """Computes the size of the encoding without building it (see tools.planner)
+
+        Args:
+            compact (bool, optional): plan of the compact encoding. Defaults to self.compact.
+
+        Returns:
+            EncodingPlan: number of variables, clauses and literals, estimated bytes
+        """
+        compact = self.compact if compact is None else compact
+        return plan_encoding(self.values_support, self.num_classes, self.alternatives_per_class,
+                             peak=True, weighted=False, compact=compact, train_set=self.train_set,
+                             shapes=[self.shapes[i] for i in self.criteria])
+
+    def family_builder(self, family: str):
+        """Method building a clause family, going through the cache for the structural ones
+
+        Args:
+            family (str): name of the family (eg. "2a")
+
+        Returns:
+            callable: builder of the clauses
+        """
+        builder = getattr(self, f"clauses_{family}")
+        if self.clause_cache is None or family not in STRUCTURAL_FAMILIES:
+            return builder
+        if self.structure is None:
+            self.structure = fingerprint(self.values_support, self.num_classes, peak=True,
+                                         shapes=[self.shapes[i] for i in self.criteria])
+        key = structural_key(family, self.structure)
+        return lambda: self.clause_cache.get_or_build(key, builder)
 
     def clauses_2a(self) -> list:
         """Computes ascending scales clauses (named 2a in Definition 4)
-        For all criteria i, classes h and adjacent pairs of value k<k'<k":
+        For all criteria i, classes h and values k<k'<k":
         x_{i, h, k} and x_{i, h, k"} => x_{i, h, k'}
+        (enforced through the ladder d_{i, h, k}: x_{i, h, k-1} and not x_{i, h, k} => d_{i, h, k} => d_{i, h, k+1}
+        and d_{i, h, k} => not x_{i, h, k+1};
+        x_{i, h, k} => x_{i, h, k'} for adjacent values of monotone criteria,
+        x_{i, h, k'} => x_{i, h, k} or x_{i, h, k"} for single valley ones, see tools.shapes)
 
         Returns:
             list: clauses according to the formula
         """
         clauses_2a = []
-        # Only for adjacent values of k
-        for i in range(self.gen.num_criteria):
+        # Depending on the shape of the criterion (see tools.shapes.scale_clauses)
+        for i in range(self.num_criteria):
             crit_values = self.values_support[
                 i]  # Values are unique and already sorted
-            for h in range(1, self.gen.num_classes):
-                for ik in range(len(crit_values) - 2):
-                    ikp = ik + 1
-                    iks = ik + 2
-                    clauses_2a.append([
-                        self.front_v2i[(i, h, crit_values[ikp])],
-                        -self.front_v2i[(i, h, crit_values[ik])],
-                        -self.front_v2i[(i, h, crit_values[iks])]
-                    ])
+            shape = self.shapes[self.criteria[i]]
+            for h in range(1, self.num_classes):
+                ladder = [self.ladder_v2i[(i, h, k)] for k in crit_values[1:-1]] if shape != "monotone" else []
+                clauses_2a += scale_clauses(shape, [self.front_v2i[(i, h, k)] for k in crit_values], ladder)
 
         return clauses_2a
 
@@ -105,8 +307,8 @@ class SinglePeakModel:
         # 3b Hierarchy of profiles
         clauses_2b = []
         # Only for adjacent values
-        for i in range(self.gen.num_criteria):
-            for h in range(1, self.gen.num_classes - 1):
+        for i in range(self.num_criteria):
+            for h in range(1, self.num_classes - 1):
                 for k in set(self.values_support[i]):
                     clauses_2b.append([
                         self.front_v2i[(i, h, k)],
@@ -127,7 +329,7 @@ class SinglePeakModel:
         # Only for a "adjacent" coalitions
         for B in self.coalitions:
             N_minus_B = {crit
-                         for crit in range(self.gen.num_criteria)} - set(B)
+                         for crit in range(self.num_criteria)} - set(B)
             for i in N_minus_B:  # Adds exactly one element to the coalition
                 Bp = set(B).union(set([i]))
                 clauses_2c.append(
@@ -135,28 +337,40 @@ class SinglePeakModel:
 
         return clauses_2c
 
-    def clauses_2d(self) -> list:
+    def clauses_2d(self, alternatives: set = None) -> list:
         """Computes alternatives outranked by boundary above them clauses (named 2d in Definition 4)
         (Ensures the correct representation of the assignment (labels))
         For all coalition B, for all frontier h and all datapoint u assigned to class h-1
         (AND_{i in B} x_{i, h, u_i}) => -y_B
         (if an alternative is predicted above the h frontier, then the coalition is not sufficient)
 
+        Args:
+            alternatives (set, optional): only builds the clauses of these alternatives.
+                Defaults to None (all of them).
+
         Returns:
             list: clauses according to the formula
         """
         clauses_2d = []
+        seen = set()
         for B in self.coalitions:
-            for h in range(1, self.gen.num_classes):
+            for h in range(1, self.num_classes):
                 for u in self.alternatives_per_class[h - 1]:
-                    clauses_2d.append([
+                    if alternatives is not None and u not in alternatives:
+                        continue
+                    clause = [
                         -self.front_v2i[(i, h, self.train_set[u, i])]
                         for i in B
-                    ] + [-self.coal_v2i[B]])
+                    ] + [-self.coal_v2i[B]]
+                    if self.compact:  # Alternatives with the same values on B give the same clause
+                        if tuple(clause) in seen:
+                            continue
+                        seen.add(tuple(clause))
+                    clauses_2d.append(clause)
 
         return clauses_2d
 
-    def clauses_2e(self) -> list:
+    def clauses_2e(self, alternatives: set = None) -> list:
         """Computes alternatives outranked by boundary bellow them clauses
         (named 2e in Definition 4)
         (Ensures the correct representation of the assignment (labels))
@@ -166,19 +380,88 @@ class SinglePeakModel:
         whereas all of its values are below the frontier for the considered coalition
         then the complementary coalition is sufficient)
 
+        Args:
+            alternatives (set, optional): only builds the clauses of these alternatives.
+                Defaults to None (all of them).
+
         Returns:
             list: clauses according to the formula
         """
         clauses_2e = []
-        N = set(list(range(self.gen.num_criteria)))
+        seen = set()
+        N = set(list(range(self.num_criteria)))
         for B in self.coalitions:
-            for h in range(1, self.gen.num_classes):
+            for h in range(1, self.num_classes):
                 for a in self.alternatives_per_class[h]:
-                    clauses_2e.append([
+                    if alternatives is not None and a not in alternatives:
+                        continue
+                    clause = [
                         self.front_v2i[(i, h, self.train_set[a, i])] for i in B
-                    ] + [self.coal_v2i[tuple(N - set(B))]])
+                    ] + [self.coal_v2i[tuple(N - set(B))]]
+                    if self.compact:  # Alternatives with the same values on B give the same clause
+                        if tuple(clause) in seen:
+                            continue
+                        seen.add(tuple(clause))
+                    clauses_2e.append(clause)
         return clauses_2e
 
+    def encode(self) -> str:
+        """Uses clauses defined above to encode the NCS problem
+        into a SAT problem (DIMACS string, ready to be written for gophersat)
+
+        Returns:
+            str: parsed clauses for gophersat
+        """
+        check_budget(self)  # Refuses the job (or switches to the compact encoding) if too large
+        self.stats = TrainStats()
+        self.clause_store = {
+            family: self.stats.build_family(family, self.family_builder(family))
+            for family in ("2a", "2b", "2c", "2d", "2e")
+        }
+        return self.serialize()
+
+    def highest_variable(self) -> int:
+        """Highest index of the variables of the encoding (new ones are appended by update)"""
+        return max(list(self.front_i2v) + list(self.coal_i2v) + list(self.ladder_v2i.values()))
+
+    def serialize(self) -> str:
+        """Parses the clauses built (clause_store) for gophersat
+
+        Returns:
+            str: parsed clauses for gophersat
+        """
+        self.stats.num_variables = self.highest_variable()
+        self.stats.num_clauses = sum(len(clauses) for clauses in self.clause_store.values())
+
+        begin = perf_counter()
+        my_clauses = preprocess_model(self, [clause for clauses in self.clause_store.values() for clause in clauses])
+        my_dimacs = clauses_to_dimacs(my_clauses, self.stats.num_variables)
+        self.stats.serialization_time = perf_counter() - begin
+        self.stats.cnf_bytes = len(my_dimacs)
+
+        return my_dimacs
+
+    def solve(self, dimacs: str) -> tuple:
+        """Writes the encoded problem to the working file and solves it with gophersat
+
+        Args:
+            dimacs (str): encoded problem (from encode)
+
+        Returns:
+            tuple: ("is it satisfiable", "model over index")
+        """
+        begin = perf_counter()
+        write_dimacs_file(dimacs, self.workingfile)
+        self.stats.write_time = perf_counter() - begin
+
+        begin = perf_counter()
+        res = exec_gophersat(self.workingfile, self.gopherpath)
+        self.stats.solver_time = perf_counter() - begin
+        self.stats.solver_status = "SATISFIABLE" if res[0] else "UNSATISFIABLE"
+        metrics.record_solve(type(self).__name__, self.stats.solver_status,
+                             self.stats.solver_time, success=res[0])
+        return res
+
     def run_solver(self) -> list:
         """Uses clasues defined above to encode the NCS problem
         into a SAT problem, solved by gophersat
@@ -186,17 +469,20 @@ class SinglePeakModel:
         Returns:
             list: resulting frontiers between classes
         """
-        my_clauses = self.clauses_2a() + self.clauses_2b() + self.clauses_2c(
-        ) + self.clauses_2d() + self.clauses_2e()
-        my_dimacs = clauses_to_dimacs(
-            my_clauses,
-            len(self.variables["frontier_var"]) +
-            len(self.variables["coalition_var"]))
+        return self.solve(self.encode())
 
-        write_dimacs_file(my_dimacs, "workingfile.cnf")
-        res = exec_gophersat("workingfile.cnf", self.gopherpath)
+    def prepare_training(self) -> list:
+        """Start of every training (train, atrain and tools.pipeline): the budget fallbacks of the previous
+        training are restored (see tools.planner.check_budget), then the result cache is looked up
 
-        return res
+        Returns:
+            list: labels (classes) predicted on the train_set if the result is cached, None otherwise
+        """
+        restore_budget_fallback(self)
+        if self.result_cache is None:
+            return None
+        result = self.result_cache.get(model_key(self))
+        return None if result is None else self.load_result(result)
 
     def train(self):
         """Trains model to find the best coalition and frontier that matches the train_set
@@ -204,10 +490,50 @@ class SinglePeakModel:
         Returns:
             tuple: frontier and possible coalitions
         """
-        res = self.run_solver()
+        cached = self.prepare_training()
+        if cached is not None:  # Same training set and options: no encoding nor solver call
+            return cached
+        return self.decode(self.run_solver())
+
+    async def atrain(self, pool, timeout: float = None) -> list:
+        """Trains the model, gophersat being run asynchronously by a solver pool
+        (several models can then be trained concurrently, see tools.solver_pool),
+        going through the result cache as train does
+
+        Args:
+            pool (SolverPool): pool running the gophersat processes
+            timeout (float, optional): deadline of the solver (in seconds). Defaults to the pool timeout.
+
+        Returns:
+            list: labels (classes) predicted on the train_set
+        """
+        cached = self.prepare_training()
+        if cached is not None:  # Same training set and options: no encoding nor solver call
+            return cached
+        dimacs = self.encode()
+        with pool.working_file(".cnf") as filename:
+            begin = perf_counter()
+            write_dimacs_file(dimacs, filename)
+            self.stats.write_time = perf_counter() - begin
+            output = await pool.solve(filename, timeout=timeout, name=type(self).__name__)
+        self.stats.solver_time = output.wall_time
+        self.stats.solver_status = output.status
+        return self.decode(output.result())
+
+    def decode(self, res: tuple) -> list:
+        """Decodes the solver output into frontiers and the best sufficient coalition
+
+        Args:
+            res (tuple): output of the solver (see run_solver)
+
+        Returns:
+            list: labels (classes) predicted on the train_set
+        """
+        begin = perf_counter()
 
         # Results
         is_sat, model = res
+        model = reconstruct(model, self.fixed)
         if not is_sat:
             print("--------------------------------------- SAT WARNING! ---------------------------------------")
             print("-              Unsatisfiable model, alternatives might be assigned to class 0              -")
@@ -221,6 +547,7 @@ class SinglePeakModel:
             self.i2v[abs(int(v))]: int(v) > 0
             for v in model if int(v) != 0
         }
+        self.assignment = {abs(int(v)): int(v) > 0 for v in model if int(v) != 0} if is_sat else None
         front_results = [
             x for x in self.variables["frontier_var"] if x in var_model and var_model[x]
         ]
@@ -234,10 +561,11 @@ class SinglePeakModel:
 
         # print(f"Resulted sufficient coalitions: {coal_results}")
 
-        # frontier = {i: [0]*self.gen.num_criteria for i in range(1, self.gen.num_classes)}
-        for h in range(1, self.gen.num_classes):
-            class_front = [(0, 0)]*self.gen.num_criteria
-            for i in range(self.gen.num_criteria):
+        # frontier = {i: [0]*self.num_criteria for i in range(1, self.num_classes)}
+        mismatches = 0  # Values whose decoded approval differs from the solver assignment
+        for h in range(1, self.num_classes):
+            class_front = [(0, 0)]*self.num_criteria
+            for i in range(self.num_criteria):
                 criterion_val = [
                     x[2] for x in front_results if x[0] == i and x[1] == h
                 ]
@@ -248,17 +576,22 @@ class SinglePeakModel:
                     ]
                     crit = (None, None)
                 else:
-                    min_crit = min(criterion_val)  # (i, h, k)
-                    max_crit = max(criterion_val)
-                    class_front[i] = (min_crit, max_crit)
+                    class_front[i] = scale_frontier(self.shapes[self.criteria[i]], criterion_val,
+                                                    self.values_support[i])
+                    mismatches += frontier_mismatches(self.shapes[self.criteria[i]], class_front[i],
+                                                      criterion_val, self.values_support[i])
 
             self.frontier[h] = class_front
+        if is_sat and mismatches > 0:
+            print("--------------------------------------- SAT WARNING! ---------------------------------------")
+            print(f"-   {mismatches} values approved differently by the frontiers and the solver assignment   -")
+            print("--------------------------------------------------------------------------------------------")
         # print("\nFrontier")
         # for el in frontier:
         #     print(el)
 
         # Find the best coalition for the considered frontier
-        best_pred = [0] * self.gen.size
+        best_pred = [0] * len(self.train_set)  # Extended by update (see tools.incremental)
         best_accuracy = 0
         best_coal = tuple()
         for coal in coal_results:
@@ -268,8 +601,8 @@ class SinglePeakModel:
                 for i in coal:
                     alt_pred.append(
                         sum([
-                            (alt[i] >= self.frontier[h][i][0]) and (alt[i] <= self.frontier[h][i][1])
-                            for h in range(1, self.gen.num_classes)
+                            approves(self.shapes[self.criteria[i]], self.frontier[h][i], alt[i])
+                            for h in range(1, self.num_classes)
                         ]))  # Vote for each criterion of the coalition
                 coal_pred.append(
                     min(alt_pred)
@@ -282,27 +615,86 @@ class SinglePeakModel:
                 best_accuracy = coal_accuracy
                 best_pred = coal_pred
                 best_coal = coal
-                self.suff_coal = best_coal
+                self.suff_coal = tuple(self.criteria[i] for i in best_coal)
+        # Restored on every criterion (pruned ones have no frontier, see prune_criteria)
+        self.frontier = {h: full_width(front, self.criteria, self.gen.num_criteria, (0, 0))
+                         for h, front in self.frontier.items()}
+
+        self.stats.decode_time = perf_counter() - begin
+        self.stats.record_memory()
+        metrics.record_train(type(self).__name__, self.stats.total_time)
+        if self.result_cache is not None and self.stats.solver_status in CACHED_STATUSES:
+            self.result_cache.put(model_key(self), self.dump_result(best_pred))
         return best_pred
 
-    def predict(self):
+    def update(self, new_grades, new_labels) -> list:
+        """Adds students to the train set and retrains the model incrementally:
+        only the clauses and variables of the new students (and of their new grades) are built,
+        the previous solution is kept if it still holds (see tools.incremental)
+
+        Args:
+            new_grades (np.ndarray): grades of the new students
+            new_labels (np.ndarray): labels (classes) of the new students
+
+        Returns:
+            list: labels (classes) predicted on the extended train_set
+        """
+        return update_model(self, new_grades, new_labels)
+
+    def dump_result(self, train_pred: list) -> dict:
+        """Trained model as a json compatible dictionnary (see tools.result_cache)
+
+        Args:
+            train_pred (list): labels (classes) predicted on the train_set
+
+        Returns:
+            dict: frontier, sufficient coalition, train predictions and solver status
+        """
+        return json_compatible({
+            "frontier": list(self.frontier.items()),
+            "suff_coal": self.suff_coal,
+            "train_pred": train_pred,
+            "solver_status": self.stats.solver_status,
+        })
+
+    def load_result(self, result: dict) -> list:
+        """Restores a trained model (see dump_result)
+
+        Args:
+            result (dict): trained model
+
+        Returns:
+            list: labels (classes) predicted on the train_set
+        """
+        self.frontier = {int(h): front for h, front in result["frontier"]}
+        self.suff_coal = tuple(result["suff_coal"])
+        self.stats = TrainStats()
+        self.stats.solver_status = result["solver_status"]
+        return list(result["train_pred"])
+
+    def predict(self, grades: np.ndarray = None):
         """Predicts labels (classes) from a test_set of students
         The test_set has to have the same .shape[1] than the train_set used to train the model
 
+        Args:
+            grades (np.ndarray, optional): grades of the students. Defaults to None (test set of the generator).
+
         Returns:
             list: labels (classes) of the train_set (len(pred) == test_set.shape[0])
         """
-        pred = [0]*len(self.gen.grades_test)
-        for i_alt, alt in enumerate(self.gen.grades_test):
-            try :
-                pred[i_alt] = min([  # Takes the min class found (assuming ordered classes)
-                        sum([  # Classifies values for each criteria
-                            (alt[i] >= self.frontier[h][i][0]) and (alt[i] <= self.frontier[h][i][1])
-                            for h in range(1, self.gen.num_classes) if h in self.frontier
-                        ]) for i in self.suff_coal
-                    ])
-            except ValueError:
-                pass
-
-
+        begin = perf_counter()
+        test_set = self.gen.grades_test if grades is None else np.asarray(grades, dtype=float)
+        if self.quantizer is not None:
+            test_set = self.quantizer.transform(test_set)
+        pred = np.zeros(len(test_set), dtype=int)
+        if len(self.suff_coal) > 0:  # Vectorized over the students
+            pred += np.min([  # Takes the min class found (assuming ordered classes)
+                sum(  # Classifies values for each criteria
+                    approves(self.shapes[i], self.frontier[h][i], test_set[:, i])
+                    for h in range(1, self.num_classes) if h in self.frontier
+                ) for i in self.suff_coal
+            ], axis=0)
+        pred = pred.tolist()
+
+        metrics.record_prediction(type(self).__name__, len(pred), perf_counter() - begin)
         return pred
@@ -0,0 +1,140 @@
+"""Cache of the structural clauses (2a, 2b and 2c) of the encodings
+
+These clauses only depend on the values of each criterion and on the number of classes,
+not on the labels: they are shared by every train on the same grades (eg. sweeps over
+the noise or several label sets). The label dependent clauses 2d/2e are always rebuilt.
+
+Example:
+    from tools import clause_cache
+    clause_cache.DEFAULT_CACHE.directory = "clause_cache"  # Also kept between runs
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Clause families which do not depend on the labels
+STRUCTURAL_FAMILIES = ("2a", "2b", "2c")
+
+# Changes when the numbering of the variables or the clauses change (invalidates the disk cache)
+FORMAT_VERSION = 3
+
+
+def fingerprint(values_support: list, num_classes: int, peak: bool = False, shapes: list = None) -> str:
+    """Fingerprint of the structure of a problem (computed once per model)
+
+    Args:
+        values_support (list): sorted unique values of each criterion
+        num_classes (int): number of classes
+        peak (bool, optional): single peak scales (different clauses 2a). Defaults to False.
+        shapes (list, optional): shape of each criterion (see tools.shapes) if they differ. Defaults to None.
+
+    Returns:
+        str: hash of the values and dimensions
+    """
+    description = {
+        "version": FORMAT_VERSION,
+        "peak": peak,
+        "num_classes": int(num_classes),
+        "values_support": [[float(value) for value in values] for values in values_support],
+    }
+    if shapes is not None and set(shapes) != {"peak" if peak else "monotone"}:
+        description["shapes"] = list(shapes)
+    description = json.dumps(description)
+    return hashlib.sha256(description.encode("utf8")).hexdigest()
+
+
+def structural_key(family: str, structure: str) -> str:
+    """Key of a structural clause family in the cache
+
+    Args:
+        family (str): name of the family ("2a", "2b" or "2c")
+        structure (str): fingerprint of the problem (see fingerprint)
+    """
+    return f"{family}-{structure}"
+
+
+class ClauseCache:
+    """Clauses kept in memory (least recently used ones evicted first), optionally on disk
+
+    The cached lists are shared between the models and must not be modified.
+    """
+
+    def __init__(self, maxsize: int = 64, directory: str = None) -> None:
+        """
+        Args:
+            maxsize (int, optional): maximum number of families kept in memory. Defaults to 64.
+            directory (str, optional): directory where families are also stored as json files.
+                Defaults to None (memory only).
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> list:
+        """Clauses stored under a key (None if not cached)"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        if self.directory is not None and os.path.exists(self._path(key)):
+            with open(self._path(key), "r", encoding="utf8") as cache_file:
+                clauses = json.load(cache_file)
+            self._remember(key, clauses)
+            with self.lock:
+                self.hits += 1
+            return clauses
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, clauses: list) -> None:
+        """Stores clauses in memory (and on disk if a directory is set)"""
+        self._remember(key, clauses)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_filename = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_filename, "w", encoding="utf8") as cache_file:
+                json.dump(clauses, cache_file)
+            os.replace(tmp_filename, self._path(key))
+
+    def _remember(self, key: str, clauses: list) -> None:
+        with self.lock:
+            self.entries[key] = clauses
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_build(self, key: str, builder) -> list:
+        """Cached clauses, built (and cached) on a miss
+
+        Args:
+            key (str): key of the family (see structural_key)
+            builder (callable): method building the clauses
+
+        Returns:
+            list: clauses of the family
+        """
+        clauses = self.get(key)
+        if clauses is None:
+            clauses = builder()
+            self.put(key, clauses)
+        return clauses
+
+    def clear(self) -> None:
+        """Empties the memory cache (the disk cache is kept)"""
+        with self.lock:
+            self.entries.clear()
+
+
+# Cache shared by the models (set their clause_cache to None to disable it)
+DEFAULT_CACHE = ClauseCache()
@@ -0,0 +1,80 @@
+"""Fast check of the monotone consistency of a training set, before any encoding
+
+If a student is at least as good as another on every criterion but has a lower label,
+no monotone sorting model (MR-Sort, U-NCS) classifies both of them correctly: the SAT
+encoding is unsatisfiable. Finding these pairs avoids a useless SAT call, the relaxed
+MaxSAT encoding being used instead (see NcsSatModel.on_inconsistent).
+
+Example:
+    report = check_consistency(gen.grades, gen.admission)
+    if not report["consistent"]:
+        print(f"At least {report['lower_bound']} students misclassified")
+"""
+
+from time import perf_counter
+
+import numpy as np
+
+
+def dominance_conflicts(grades: np.ndarray, labels: np.ndarray, block_size: int = 256) -> np.ndarray:
+    """Pairs of students (a, b) where a is at least as good as b on every criterion
+    but has a lower label (compared by blocks of students to bound the memory used)
+
+    Args:
+        grades (np.ndarray): grades (one row per student)
+        labels (np.ndarray): labels (classes) of the students
+        block_size (int, optional): number of students compared at once. Defaults to 256.
+
+    Returns:
+        np.ndarray: conflicting pairs (one row (a, b) per pair)
+    """
+    grades = np.asarray(grades, dtype=float)
+    labels = np.asarray(labels)
+    pairs = [np.empty((0, 2), dtype=int)]
+    for start in range(0, len(grades), block_size):
+        block = slice(start, start + block_size)
+        conflicting = labels[block, None] < labels[None, :]
+        for i in range(grades.shape[1]):  # One criterion at a time (no block x students x criteria array)
+            conflicting &= grades[block, None, i] >= grades[None, :, i]
+        a, b = np.nonzero(conflicting)
+        pairs.append(np.column_stack([a + start, b]))
+    return np.vstack(pairs)
+
+
+def misclassification_lower_bound(conflicts: np.ndarray) -> int:
+    """Lower bound on the number of students misclassified by any monotone model:
+    one student of each conflicting pair is misclassified, so at least one per pair
+    of a set of pairs without common students (greedy matching of the conflict graph)
+
+    Args:
+        conflicts (np.ndarray): conflicting pairs (see dominance_conflicts)
+
+    Returns:
+        int: number of pairs of the matching
+    """
+    matched = set()
+    for a, b in conflicts.tolist():
+        if a not in matched and b not in matched:
+            matched.update((a, b))
+    return len(matched) // 2
+
+
+def check_consistency(grades: np.ndarray, labels: np.ndarray) -> dict:
+    """Checks that a training set can be classified without errors by a monotone model
+
+    Args:
+        grades (np.ndarray): grades (one row per student)
+        labels (np.ndarray): labels (classes) of the students
+
+    Returns:
+        dict: "consistent", "conflicts" (pairs, see dominance_conflicts),
+            "lower_bound" (see misclassification_lower_bound) and "time"
+    """
+    begin = perf_counter()
+    conflicts = dominance_conflicts(grades, labels)
+    return {
+        "consistent": len(conflicts) == 0,
+        "conflicts": conflicts,
+        "lower_bound": misclassification_lower_bound(conflicts),
+        "time": perf_counter() - begin,
+    }
@@ -0,0 +1,249 @@
+"""Automatic choice of the learner from a cost model fitted on sweep results (generate_csv.py)
+
+For each learner, the cost model predicts from the features of a dataset (number of students,
+criteria and classes, distinct values, dominance conflicts):
+    - the training time: linear regression of log(time) on the features
+    - the feasibility (solution found): logistic regression on the same features
+The "auto" mode runs the learner with the lowest predicted time among the ones likely to find
+a solution, and logs the choice with the predicted and actual times.
+
+Example:
+    cost_model = CostModel.from_csv("results.csv")
+    record = run_auto(gen, cost_model, gopherpath="./gophersat.exe")
+"""
+
+import json
+import tempfile
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from tools.consistency import check_consistency
+from tools.portfolio import LEARNERS, train_learner
+
+FEATURES = ("num_students", "num_criteria", "num_classes", "num_values", "inconsistent")
+
+# Name of the learners in results.csv -> learner (key of tools.portfolio.LEARNERS)
+RESULT_NAMES = {"MR-Sort": "mrsort", "NCS": "ncs"}
+
+
+def dataset_features(grades: np.ndarray, labels: np.ndarray, num_classes: int) -> dict:
+    """Features of a train set used by the cost model
+
+    Args:
+        grades (np.ndarray): grades of the train set (one column per criterion)
+        labels (np.ndarray): labels (classes) of the train set
+        num_classes (int): number of classes
+
+    Returns:
+        dict: value of each feature (see FEATURES)
+    """
+    grades = np.asarray(grades, dtype=float)
+    labels = np.asarray(labels)
+    encoded = labels < num_classes  # Only these students are encoded
+    return {
+        "num_students": len(grades),
+        "num_criteria": grades.shape[1],
+        "num_classes": num_classes,
+        "num_values": sum(len(np.unique(grades[:, i])) for i in range(grades.shape[1])),
+        "inconsistent": int(not check_consistency(grades[encoded], labels[encoded])["consistent"]),
+    }
+
+
+def _design(features: pd.DataFrame) -> np.ndarray:
+    """Regressors of the cost model: the time of the SAT encodings grows with the number of students
+    and of values, and exponentially with the number of criteria (coalitions)"""
+    return np.column_stack([
+        np.ones(len(features)),
+        np.log1p(features["num_students"].to_numpy(dtype=float)),
+        features["num_criteria"].to_numpy(dtype=float),
+        features["num_classes"].to_numpy(dtype=float),
+        np.log1p(features["num_values"].to_numpy(dtype=float)),
+        features["inconsistent"].to_numpy(dtype=float),
+    ])
+
+
+def _fit_linear(design: np.ndarray, target: np.ndarray, l2: float = 1e-3) -> np.ndarray:
+    """Ridge regression (the intercept is not penalized)"""
+    penalty = l2 * np.eye(design.shape[1])
+    penalty[0, 0] = 0
+    return np.linalg.solve(design.T @ design + penalty, design.T @ target)
+
+
+def _fit_logistic(design: np.ndarray, target: np.ndarray, l2: float = 1., iterations: int = 25) -> np.ndarray:
+    """Logistic regression (Newton iterations, the intercept is not penalized)"""
+    penalty = l2 * np.eye(design.shape[1])
+    penalty[0, 0] = 0
+    coefficients = np.zeros(design.shape[1])
+    for _ in range(iterations):
+        probability = 1 / (1 + np.exp(-design @ coefficients))
+        gradient = design.T @ (probability - target) + penalty @ coefficients
+        hessian = design.T @ (design * (probability * (1 - probability))[:, None]) + penalty
+        coefficients -= np.linalg.solve(hessian + 1e-9 * np.eye(design.shape[1]), gradient)
+    return coefficients
+
+
+def result_features(results: pd.DataFrame) -> pd.DataFrame:
+    """Features of the rows of sweep results, estimated for results stored before they were recorded:
+    num_students from size (train share of the generator), num_values from the number of grades
+    (the generated grades are real numbers) and inconsistent from the noise
+
+    Args:
+        results (pd.DataFrame): rows of results.csv (name, size, noise, num_classes, num_criteria, time, ...)
+
+    Returns:
+        pd.DataFrame: results with every feature (see FEATURES) and "feasible"
+    """
+    results = results.copy()
+    if "num_students" not in results:
+        results["num_students"] = np.round(results["size"] * 0.8)
+    if "num_values" not in results:
+        results["num_values"] = results["num_students"] * results["num_criteria"]
+    if "inconsistent" not in results:
+        results["inconsistent"] = (results["noise"] > 0).astype(int)
+    if "feasible" not in results:
+        results["feasible"] = 1
+    results["feasible"] = results["feasible"].fillna(0)
+    return results
+
+
+class CostModel:
+    """Training time and feasibility of each learner predicted from the features of a dataset"""
+
+    def __init__(self) -> None:
+        self.time_coefficients = {}  # Learner -> coefficients of log(time)
+        # Learner -> coefficients of the feasibility (None if it always found a solution, -inf if never)
+        self.feasibility_coefficients = {}
+
+    @classmethod
+    def from_csv(cls, path: str = "results.csv") -> "CostModel":
+        """Cost model fitted on the results of generate_csv.py
+
+        Args:
+            path (str, optional): results file. Defaults to "results.csv".
+
+        Returns:
+            CostModel: fitted cost model
+        """
+        return cls().fit(pd.read_csv(path))
+
+    @classmethod
+    def from_arguments(cls, args) -> "CostModel":
+        """Cost model fitted on the results file set on the command line"""
+        return cls.from_csv(args.cost_results)
+
+    def fit(self, results: pd.DataFrame) -> "CostModel":
+        """Fits the time and feasibility models of every learner of the results
+
+        Args:
+            results (pd.DataFrame): sweep results (see result_features)
+
+        Returns:
+            CostModel: the fitted cost model
+        """
+        results = result_features(results)
+        for name, rows in results.groupby("name"):
+            learner = RESULT_NAMES.get(name, name)
+            design = _design(rows)
+            feasible = rows["feasible"].to_numpy(dtype=float)
+            timed = feasible > 0  # Time of the trainings which found a solution
+            if timed.any():
+                self.time_coefficients[learner] = _fit_linear(
+                    design[timed], np.log(rows["time"].to_numpy(dtype=float)[timed] + 1e-6))
+            else:
+                self.time_coefficients[learner] = None
+            if feasible.min() == feasible.max():  # Constant: always (None) or never (-inf) feasible
+                self.feasibility_coefficients[learner] = None if feasible.min() > 0 else -np.inf
+            else:
+                self.feasibility_coefficients[learner] = _fit_logistic(design, feasible)
+        return self
+
+    @property
+    def learners(self) -> list:
+        """Learners of the cost model"""
+        return list(self.time_coefficients)
+
+    def predict(self, features: dict) -> dict:
+        """Predicted time and feasibility of each learner
+
+        Args:
+            features (dict): features of the dataset (see dataset_features)
+
+        Returns:
+            dict: learner -> {"time" (seconds, inf if it never found a solution), "feasibility" (probability)}
+        """
+        design = _design(pd.DataFrame([features]))[0]
+        predictions = {}
+        for learner, coefficients in self.time_coefficients.items():
+            feasibility = self.feasibility_coefficients[learner]
+            predictions[learner] = {
+                "time": float(np.exp(design @ coefficients)) if coefficients is not None else np.inf,
+                "feasibility": (1. if feasibility is None else 0. if np.isscalar(feasibility)
+                                else float(1 / (1 + np.exp(-design @ feasibility)))),
+            }
+        return predictions
+
+    def select(self, features: dict, learners: list = None, min_feasibility: float = 0.5) -> tuple:
+        """Learner with the lowest predicted time among the ones likely to find a solution
+        (the most likely one if none is)
+
+        Args:
+            features (dict): features of the dataset (see dataset_features)
+            learners (list, optional): candidate learners. Defaults to None (every learner of the cost model).
+            min_feasibility (float, optional): probability of finding a solution of an adequate learner.
+                Defaults to 0.5.
+
+        Raises:
+            ValueError: no candidate learner in the cost model
+
+        Returns:
+            tuple: (selected learner, predictions of the candidates (see predict))
+        """
+        predictions = {learner: prediction for learner, prediction in self.predict(features).items()
+                       if (learners is None or learner in learners) and learner in LEARNERS}
+        if not predictions:
+            raise ValueError(f"No candidate learner in the cost model (learners: {self.learners})")
+        adequate = [learner for learner, prediction in predictions.items()
+                    if prediction["feasibility"] >= min_feasibility]
+        if adequate:
+            return min(adequate, key=lambda learner: predictions[learner]["time"]), predictions
+        return max(predictions, key=lambda learner: predictions[learner]["feasibility"]), predictions
+
+
+def run_auto(gen, cost_model: CostModel, gopherpath: str = "./gophersat.exe", learners: list = None,
+             min_feasibility: float = 0.5, log_file: str = None) -> dict:
+    """Trains the learner selected by the cost model on a dataset and logs the choice
+
+    Args:
+        gen (Generator): dataset
+        cost_model (CostModel): fitted cost model
+        gopherpath (str, optional): path to gophersat executable. Defaults to "./gophersat.exe".
+        learners (list, optional): candidate learners. Defaults to None (every learner of the cost model).
+        min_feasibility (float, optional): see CostModel.select. Defaults to 0.5.
+        log_file (str, optional): json lines file where the choice is appended. Defaults to None.
+
+    Returns:
+        dict: features, predictions, selected learner, predicted and actual time, and the result
+            of the training (see tools.portfolio.train_learner)
+    """
+    begin = perf_counter()
+    features = dataset_features(gen.grades, gen.admission, gen.num_classes)
+    learner, predictions = cost_model.select(features, learners, min_feasibility)
+    selection_time = perf_counter() - begin
+    with tempfile.TemporaryDirectory() as working_dir:
+        result = train_learner(learner, gen, gopherpath, working_dir)
+    record = {
+        "features": features,
+        "predictions": predictions,
+        "learner": learner,
+        "selection_time": selection_time,
+        "predicted_time": predictions[learner]["time"],
+        "actual_time": result.get("time"),
+        "error": result.get("error"),
+    }
+    if log_file is not None:
+        with open(log_file, "a") as log:
+            log.write(json.dumps(record) + "\n")
+    record["result"] = result
+    return record
@@ -0,0 +1,221 @@
+"""K-fold cross-validation of a learner (MR-Sort, U-NCS, single peak SAT or MaxSAT),
+the folds being trained in parallel worker processes
+
+The values of each criterion and the rank of every grade among them (value tables) are computed
+once for the whole dataset: the values_support of a fold (frontier variables of its encoding)
+is read from the ranks of its train set instead of going through its grades again.
+The learners are trained and evaluated with fit / predict, without Generator (see tools.dataset).
+
+Example:
+    results = cross_validate(grades, labels, "ncs", folds=5, gopherpath="./gophersat")
+    print(summarize(results))
+"""
+
+import multiprocessing
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from tools.portfolio import LEARNERS
+from tools.utils import accuracy
+
+# Dataset and value tables of the worker processes (set once per process, see _init_worker)
+_shared = {}
+
+
+def value_tables(grades: np.ndarray) -> tuple:
+    """Sorted values of each criterion and rank of each grade among them
+
+    Args:
+        grades (np.ndarray): grades of the whole dataset (one column per criterion)
+
+    Returns:
+        tuple: (values of each criterion (sorted np.ndarray), ranks (same shape as grades))
+    """
+    grades = np.asarray(grades, dtype=float)
+    values_support = []
+    ranks = np.empty(grades.shape, dtype=int)
+    for i in range(grades.shape[1]):
+        values, inverse = np.unique(grades[:, i], return_inverse=True)
+        values_support.append(values)
+        ranks[:, i] = inverse.ravel()
+    return values_support, ranks
+
+
+def fold_support(values_support: list, ranks: np.ndarray, rows: np.ndarray) -> list:
+    """Sorted values of each criterion taken by a subset of the students (see value_tables)
+
+    Args:
+        values_support (list): values of each criterion in the whole dataset
+        ranks (np.ndarray): ranks of the grades of the whole dataset
+        rows (np.ndarray): indexes of the students of the subset
+
+    Returns:
+        list: sorted values of each criterion in the subset
+    """
+    return [values[np.bincount(ranks[rows, i], minlength=len(values)) > 0]
+            for i, values in enumerate(values_support)]
+
+
+def fold_indexes(labels: np.ndarray, folds: int = 5, seed: int = 0) -> list:
+    """Test students of each fold, stratified by class (the students of a class are dealt over the folds)
+
+    Args:
+        labels (np.ndarray): labels (classes) of the students
+        folds (int, optional): number of folds. Defaults to 5.
+        seed (int, optional): seed of the shuffle. Defaults to 0.
+
+    Raises:
+        ValueError: less than 2 folds or more folds than students
+
+    Returns:
+        list: sorted indexes of the test students of each fold
+    """
+    labels = np.asarray(labels)
+    if not 2 <= folds <= len(labels):
+        raise ValueError(f"Expected 2 to {len(labels)} folds, got {folds}")
+    rng = np.random.default_rng(seed)
+    assigned = np.empty(len(labels), dtype=int)
+    offset = 0
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        assigned[members] = (np.arange(len(members)) + offset) % folds
+        offset += len(members)
+    return [np.flatnonzero(assigned == fold) for fold in range(folds)]
+
+
+def _init_worker(grades: np.ndarray, labels: np.ndarray, num_classes: int, values_support: list,
+                 ranks: np.ndarray) -> None:
+    """Keeps the dataset and its value tables in the worker process (sent once, not once per fold)"""
+    _shared.update(grades=grades, labels=labels, num_classes=num_classes,
+                   values_support=values_support, ranks=ranks)
+
+
+def run_fold(learner: str, fold: int, test_rows: np.ndarray, gopherpath: str, working_dir: str,
+             options: dict = None) -> dict:
+    """Trains a learner on every fold but one and evaluates it on that fold
+    (dataset and value tables of the process, see _init_worker)
+
+    Args:
+        learner (str): name of the learner (key of tools.portfolio.LEARNERS)
+        fold (int): index of the fold
+        test_rows (np.ndarray): indexes of the test students
+        gopherpath (str): path to gophersat executable
+        working_dir (str): directory of the working file of the solver
+        options (dict, optional): attributes set on the model before the training. Defaults to None.
+
+    Returns:
+        dict: fold, sizes, test and train accuracy, fit and predict times, solver status
+            and size of the encoding (num_variables, num_clauses, cnf_bytes)
+    """
+    grades, labels = _shared["grades"], _shared["labels"]
+    train_rows = np.setdiff1d(np.arange(len(labels)), test_rows)
+    module_name, class_name, learner_options = LEARNERS[learner]
+    # Imported here so that the parent process does not need every solver (eg. gurobipy)
+    model = getattr(__import__(module_name), class_name)()
+    for option, value in {**learner_options, **(options or {})}.items():
+        setattr(model, option, value)
+    result = {"fold": fold, "train_size": len(train_rows), "test_size": len(test_rows)}
+
+    begin = perf_counter()
+    if class_name == "MRSort":
+        model.fit(grades[train_rows], labels[train_rows], _shared["num_classes"])
+        if model.params is None:
+            return {**result, "error": "MR-Sort optimum not found", "fit_time": perf_counter() - begin}
+    else:
+        model.set_gophersat_path(gopherpath)
+        model.workingfile = os.path.join(working_dir, f"workingfile_{fold}" + os.path.splitext(model.workingfile)[1])
+        model.fit(grades[train_rows], labels[train_rows], _shared["num_classes"],
+                  values_support=fold_support(_shared["values_support"], _shared["ranks"], train_rows))
+    result["fit_time"] = perf_counter() - begin
+
+    begin = perf_counter()
+    test_pred = model.predict(grades[test_rows])
+    result["predict_time"] = perf_counter() - begin
+    result["accuracy"] = float(accuracy(test_pred, labels[test_rows]))
+    result["train_accuracy"] = float(accuracy(model.predict(grades[train_rows]), labels[train_rows]))
+    result["solver_status"] = model.stats.solver_status
+    for size in ("num_variables", "num_clauses", "cnf_bytes"):
+        result[size] = getattr(model.stats, size)
+    return result
+
+
+def _run_fold(task: tuple) -> dict:
+    try:
+        return run_fold(*task)
+    except Exception as error:  # pylint: disable=broad-except
+        return {"fold": task[1], "error": repr(error)}
+
+
+def cross_validate(grades: np.ndarray, labels: np.ndarray, learner: str = "ncs", folds: int = 5,
+                   gopherpath: str = "./gophersat.exe", jobs: int = None, num_classes: int = None,
+                   options: dict = None, seed: int = 0) -> list:
+    """K-fold cross-validation of a learner, one worker process per fold (at most jobs at once)
+
+    Args:
+        grades (np.ndarray): grades of the students (one column per criterion)
+        labels (np.ndarray): labels (classes) of the students
+        learner (str, optional): name of the learner (key of tools.portfolio.LEARNERS). Defaults to "ncs".
+        folds (int, optional): number of folds. Defaults to 5.
+        gopherpath (str, optional): path to gophersat executable. Defaults to "./gophersat.exe".
+        jobs (int, optional): number of worker processes, 1 to train the folds in this process.
+            Defaults to None (one per CPU, at most one per fold).
+        num_classes (int, optional): number of classes. Defaults to None (highest label + 1).
+        options (dict, optional): attributes set on the models before the training
+            (eg. {"preprocessing": True}). Defaults to None.
+        seed (int, optional): seed of the split into folds. Defaults to 0.
+
+    Raises:
+        ValueError: unknown learner or invalid number of folds
+
+    Returns:
+        list: result of each fold (see run_fold), with an "error" instead of the accuracy if it failed
+    """
+    if learner not in LEARNERS:
+        raise ValueError(f"Unknown learner {learner}, expected one of {list(LEARNERS)}")
+    grades = np.asarray(grades, dtype=float)
+    labels = np.asarray(labels)
+    num_classes = int(labels.max()) + 1 if num_classes is None else num_classes
+    values_support, ranks = value_tables(grades)  # Once for every fold
+    shared = (grades, labels, num_classes, values_support, ranks)
+    jobs = min(jobs or os.cpu_count() or 1, folds)
+
+    with tempfile.TemporaryDirectory() as working_dir:
+        tasks = [(learner, fold, test_rows, gopherpath, working_dir, options)
+                 for fold, test_rows in enumerate(fold_indexes(labels, folds, seed))]
+        if jobs == 1:
+            _init_worker(*shared)
+            results = [_run_fold(task) for task in tasks]
+        else:
+            with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=shared) as pool:
+                results = pool.map(_run_fold, tasks, chunksize=1)
+    return sorted(results, key=lambda result: result["fold"])
+
+
+def summarize(results: list) -> dict:
+    """Mean and standard deviation of the test accuracy over the folds, mean train accuracy,
+    total fit time and mean size of the encodings (folds in error are left out)
+
+    Args:
+        results (list): results of the folds (see cross_validate)
+
+    Returns:
+        dict: summary of the cross-validation
+    """
+    valid = [result for result in results if "error" not in result]
+    summary = {"folds": len(results), "errors": len(results) - len(valid)}
+    if not valid:
+        return summary
+    accuracies = np.array([result["accuracy"] for result in valid], dtype=float)
+    summary.update(
+        accuracy=float(accuracies.mean()),
+        accuracy_std=float(accuracies.std()),
+        train_accuracy=float(np.mean([result["train_accuracy"] for result in valid])),
+        fit_time=float(sum(result["fit_time"] for result in valid)),
+    )
+    for size in ("num_variables", "num_clauses", "cnf_bytes"):
+        sizes = [result[size] for result in valid if result[size] is not None]
+        summary[size] = float(np.mean(sizes)) if sizes else None
+    return summary
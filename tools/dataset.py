@@ -0,0 +1,39 @@
+"""Students given directly as arrays, without a Generator
+
+A Dataset has the attributes of a Generator read by the models (grades, admission,
+grades_test, admission_test, num_classes, num_criteria and size), so that the models
+can be trained on any grades and labels (see the fit method of the models).
+
+Example:
+    u_ncs = NcsSatModel()
+    u_ncs.fit(grades, labels).predict(grades_test)
+"""
+
+import numpy as np
+
+
+class Dataset:
+    """Grades and labels of the students (train set, and optionally test set)"""
+
+    def __init__(self, grades: np.ndarray, labels: np.ndarray, num_classes: int = None,
+                 grades_test: np.ndarray = None, labels_test: np.ndarray = None,
+                 values_support: list = None) -> None:
+        """
+        Args:
+            grades (np.ndarray): grades of the train set (one column per criterion)
+            labels (np.ndarray): labels (classes) of the train set
+            num_classes (int, optional): number of classes. Defaults to None (highest label + 1).
+            grades_test (np.ndarray, optional): grades of the test set. Defaults to None (empty).
+            labels_test (np.ndarray, optional): labels of the test set. Defaults to None (empty).
+            values_support (list, optional): sorted values of each criterion in the train set,
+                when computed beforehand (see tools.cross_validation). Defaults to None (computed by the models).
+        """
+        self.grades = np.asarray(grades, dtype=float)
+        self.admission = np.asarray(labels)
+        self.num_criteria = self.grades.shape[1]
+        self.num_classes = int(self.admission.max()) + 1 if num_classes is None else num_classes
+        self.size = len(self.grades)
+        self.grades_test = (np.empty((0, self.num_criteria)) if grades_test is None
+                            else np.asarray(grades_test, dtype=float))
+        self.admission_test = np.empty(0) if labels_test is None else np.asarray(labels_test)
+        self.values_support = values_support
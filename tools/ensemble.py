@@ -0,0 +1,303 @@
+"""Bagging ensemble of SAT/MaxSAT models trained on shards of a dataset too large for a single encoding
+
+Each model (U-NCS, single peak SAT or MaxSAT) is trained on a shard of the students in a worker
+process, with its own working file for the solver: the encodings are smaller (clauses 2d/2e grow
+with the number of students, the frontier variables with the number of values) and solved in parallel.
+The class of a student is the majority (or median) vote of the models, computed on the array of
+their predictions.
+
+Example:
+    ensemble = ShardedEnsemble("ncs", shards=8, gopherpath="./gophersat.exe")
+    test_pred = ensemble.fit(grades, labels).predict(grades_test)
+"""
+
+import multiprocessing
+import os
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from tools.cross_validation import fold_indexes, fold_support, value_tables
+from tools.portfolio import LEARNERS, SOLVED_STATUSES
+from tools.utils import accuracy
+
+VOTES = ("majority", "median")
+SAMPLINGS = ("stratified", "random")
+
+# Attributes of a trained model needed by predict (sent back by the worker processes)
+PREDICT_STATE = ("num_classes", "frontier", "suff_coal", "quantizer", "shapes")
+
+# Dataset and value tables of the worker processes (set once per process, see _init_worker)
+_shared = {}
+
+
+def shard_indexes(labels: np.ndarray, shards: int, shard_size: int = None, sampling: str = "stratified",
+                  seed: int = 0) -> list:
+    """Students of each shard
+
+    Without shard_size, the students are split into disjoint shards (of about the same size).
+    With shard_size, each shard is drawn independently (without replacement within a shard).
+
+    Args:
+        labels (np.ndarray): labels (classes) of the students
+        shards (int): number of shards
+        shard_size (int, optional): number of students of each shard. Defaults to None (disjoint shards).
+        sampling (str, optional): "stratified" (same class proportions in every shard) or "random".
+            Defaults to "stratified".
+        seed (int, optional): seed of the draw. Defaults to 0.
+
+    Raises:
+        ValueError: unknown sampling or invalid number of shards
+
+    Returns:
+        list: sorted indexes of the students of each shard
+    """
+    if sampling not in SAMPLINGS:
+        raise ValueError(f"Unknown sampling {sampling}, expected one of {SAMPLINGS}")
+    labels = np.asarray(labels)
+    if not 1 <= shards <= len(labels):
+        raise ValueError(f"Expected 1 to {len(labels)} shards, got {shards}")
+    rng = np.random.default_rng(seed)
+    if shard_size is None:
+        if shards == 1:
+            return [np.arange(len(labels))]
+        if sampling == "stratified":
+            return fold_indexes(labels, shards, seed)
+        return [np.sort(rows) for rows in np.array_split(rng.permutation(len(labels)), shards)]
+
+    shard_size = min(shard_size, len(labels))
+    if sampling == "random":
+        return [np.sort(rng.choice(len(labels), shard_size, replace=False)) for _ in range(shards)]
+    classes, counts = np.unique(labels, return_counts=True)
+    # Students of each class in a shard: proportional, at least one per class
+    per_class = np.maximum(np.round(counts * shard_size / len(labels)).astype(int), 1)
+    members = [np.flatnonzero(labels == label) for label in classes]
+    return [np.sort(np.concatenate([rng.choice(rows, min(size, len(rows)), replace=False)
+                                    for rows, size in zip(members, per_class)]))
+            for _ in range(shards)]
+
+
+def vote(predictions: np.ndarray, num_classes: int, method: str = "majority") -> np.ndarray:
+    """Class of each student from the predictions of several models
+
+    Args:
+        predictions (np.ndarray): class predicted by each model (one row per model)
+        num_classes (int): number of classes
+        method (str, optional): "majority" (most predicted class, the lowest one on ties)
+            or "median" (lower median of the ordered classes). Defaults to "majority".
+
+    Raises:
+        ValueError: unknown method
+
+    Returns:
+        np.ndarray: class of each student
+    """
+    predictions = np.asarray(predictions, dtype=int)
+    if method == "majority":
+        counts = (predictions[:, :, None] == np.arange(num_classes)).sum(axis=0)
+        tied = counts == counts.max(axis=1, keepdims=True)
+        distance = np.abs(np.arange(num_classes) - np.median(predictions, axis=0)[:, None])
+        return np.where(tied, distance, np.inf).argmin(axis=1)
+    if method == "median":
+        return np.sort(predictions, axis=0)[(len(predictions) - 1) // 2]
+    raise ValueError(f"Unknown vote {method}, expected one of {VOTES}")
+
+
+def _init_worker(grades: np.ndarray, labels: np.ndarray, num_classes: int, values_support: list,
+                 ranks: np.ndarray) -> None:
+    """Keeps the dataset and its value tables in the worker process (sent once, not once per shard)"""
+    _shared.update(grades=grades, labels=labels, num_classes=num_classes,
+                   values_support=values_support, ranks=ranks)
+
+
+def train_shard(learner: str, shard: int, rows: np.ndarray, gopherpath: str, working_dir: str,
+                options: dict = None) -> dict:
+    """Trains a model on a shard (dataset and value tables of the process, see _init_worker)
+
+    Args:
+        learner (str): name of the learner (key of tools.portfolio.LEARNERS)
+        shard (int): index of the shard
+        rows (np.ndarray): indexes of the students of the shard
+        gopherpath (str): path to gophersat executable
+        working_dir (str): directory of the working file of the solver
+        options (dict, optional): attributes set on the model before the training. Defaults to None.
+
+    Returns:
+        dict: shard, size, fit time, solver status, size of the encoding
+            and state of the trained model (see PREDICT_STATE)
+    """
+    module_name, class_name, learner_options = LEARNERS[learner]
+    model = getattr(__import__(module_name), class_name)()
+    for option, value in {**learner_options, **(options or {})}.items():
+        setattr(model, option, value)
+    model.set_gophersat_path(gopherpath)
+    model.workingfile = os.path.join(working_dir, f"workingfile_{shard}" + os.path.splitext(model.workingfile)[1])
+    begin = perf_counter()
+    model.fit(_shared["grades"][rows], _shared["labels"][rows], _shared["num_classes"],
+              values_support=fold_support(_shared["values_support"], _shared["ranks"], rows))
+    return {
+        "shard": shard,
+        "size": len(rows),
+        "fit_time": perf_counter() - begin,
+        "solver_status": model.stats.solver_status,
+        "num_variables": model.stats.num_variables,
+        "num_clauses": model.stats.num_clauses,
+        "cnf_bytes": model.stats.cnf_bytes,
+        "state": {name: getattr(model, name) for name in PREDICT_STATE if hasattr(model, name)},
+    }
+
+
+def _train_shard(task: tuple) -> dict:
+    try:
+        return train_shard(*task)
+    except Exception as error:  # pylint: disable=broad-except
+        return {"shard": task[1], "error": repr(error)}
+
+
+class ShardedEnsemble:
+    """Models of the same learner trained on shards of the students, combined by vote"""
+
+    def __init__(self, learner: str = "ncs", shards: int = 4, shard_size: int = None,
+                 sampling: str = "stratified", vote: str = "majority", gopherpath: str = "./gophersat.exe",
+                 jobs: int = None, options: dict = None, seed: int = 0) -> None:
+        """
+        Args:
+            learner (str, optional): name of the learner (key of tools.portfolio.LEARNERS, but "mrsort").
+                Defaults to "ncs".
+            shards (int, optional): number of models. Defaults to 4.
+            shard_size (int, optional): students of each shard. Defaults to None (disjoint shards).
+            sampling (str, optional): "stratified" or "random" (see shard_indexes). Defaults to "stratified".
+            vote (str, optional): "majority" or "median" (see vote). Defaults to "majority".
+            gopherpath (str, optional): path to gophersat executable. Defaults to "./gophersat.exe".
+            jobs (int, optional): number of worker processes, 1 to train the shards in this process.
+                Defaults to None (one per CPU, at most one per shard).
+            options (dict, optional): attributes set on the models before the training. Defaults to None.
+            seed (int, optional): seed of the draw of the shards. Defaults to 0.
+
+        Raises:
+            ValueError: unknown learner (or MR-Sort) or vote
+        """
+        if learner not in LEARNERS or LEARNERS[learner][1] == "MRSort":
+            raise ValueError(f"Expected a SAT/MaxSAT learner of {list(LEARNERS)}, got {learner}")
+        if vote not in VOTES:
+            raise ValueError(f"Unknown vote {vote}, expected one of {VOTES}")
+        self.learner = learner
+        self.shards = shards
+        self.shard_size = shard_size
+        self.sampling = sampling
+        self.vote = vote
+        self.gopherpath = gopherpath
+        self.jobs = jobs
+        self.options = options
+        self.seed = seed
+        self.num_classes = None
+        self.models = []  # Trained models (frontiers and sufficient coalitions only)
+        self.shard_results = []  # Result of each shard (see train_shard), with an "error" if it failed
+        self.fit_time = None  # Wall time of the training of every shard
+
+    def fit(self, grades: np.ndarray, labels: np.ndarray, num_classes: int = None) -> "ShardedEnsemble":
+        """Trains one model per shard in parallel worker processes. Shards whose solver found
+        no solution (or which failed) are left out of the vote
+
+        Args:
+            grades (np.ndarray): grades of the students (one column per criterion)
+            labels (np.ndarray): labels (classes) of the students
+            num_classes (int, optional): number of classes. Defaults to None (highest label + 1).
+
+        Raises:
+            RuntimeError: no shard was trained
+
+        Returns:
+            ShardedEnsemble: the trained ensemble
+        """
+        begin = perf_counter()
+        grades = np.asarray(grades, dtype=float)
+        labels = np.asarray(labels)
+        self.num_classes = int(labels.max()) + 1 if num_classes is None else num_classes
+        values_support, ranks = value_tables(grades)  # Once for every shard
+        shared = (grades, labels, self.num_classes, values_support, ranks)
+        jobs = min(self.jobs or os.cpu_count() or 1, self.shards)
+
+        with tempfile.TemporaryDirectory() as working_dir:
+            tasks = [(self.learner, shard, rows, self.gopherpath, working_dir, self.options)
+                     for shard, rows in enumerate(shard_indexes(labels, self.shards, self.shard_size,
+                                                                self.sampling, self.seed))]
+            if jobs == 1:
+                _init_worker(*shared)
+                self.shard_results = [_train_shard(task) for task in tasks]
+            else:
+                with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=shared) as pool:
+                    self.shard_results = pool.map(_train_shard, tasks, chunksize=1)
+
+        module_name, class_name, _ = LEARNERS[self.learner]
+        model_class = getattr(__import__(module_name), class_name)
+        self.models = []
+        for result in self.shard_results:
+            if "error" in result or result["solver_status"] not in SOLVED_STATUSES:
+                continue
+            model = model_class()
+            for name, value in result["state"].items():
+                setattr(model, name, value)
+            self.models.append(model)
+        self.fit_time = perf_counter() - begin
+        if not self.models:
+            errors = [result.get("error", result.get("solver_status")) for result in self.shard_results]
+            raise RuntimeError(f"No shard was trained: {errors}")
+        return self
+
+    def predict(self, grades: np.ndarray) -> list:
+        """Predicts labels (classes) by vote of the models of the shards
+
+        Args:
+            grades (np.ndarray): grades of the students
+
+        Returns:
+            list: labels (classes) of the students
+        """
+        predictions = np.array([model.predict(grades) for model in self.models], dtype=int)
+        return vote(predictions, self.num_classes, self.vote).tolist()
+
+
+def compare_sharding(grades: np.ndarray, labels: np.ndarray, grades_test: np.ndarray, labels_test: np.ndarray,
+                     learner: str = "ncs", shard_counts: tuple = (3, 5, 9), shard_sizes: tuple = (None,),
+                     num_classes: int = None, **ensemble_options) -> list:
+    """Trains a single model on every student, then ensembles of every number of shards and shard size,
+    and reports how the test accuracy and the wall time scale
+
+    Args:
+        grades (np.ndarray): grades of the train set
+        labels (np.ndarray): labels of the train set
+        grades_test (np.ndarray): grades of the test set
+        labels_test (np.ndarray): labels of the test set
+        learner (str, optional): name of the learner. Defaults to "ncs".
+        shard_counts (tuple, optional): numbers of shards, odd to avoid ties of the vote between
+            two classes. Defaults to (3, 5, 9).
+        shard_sizes (tuple, optional): sizes of the shards (None for disjoint shards). Defaults to (None,).
+        num_classes (int, optional): number of classes. Defaults to None (highest label + 1).
+        **ensemble_options: other arguments of ShardedEnsemble (gopherpath, vote, sampling, jobs, ...)
+
+    Returns:
+        list: one row per configuration (the single model first): shards, shard size, trained shards,
+            train and test accuracy, wall time, largest encoding (clauses, bytes), or error
+    """
+    rows = []
+    for shards, shard_size in [(1, None)] + [(count, size) for count in shard_counts for size in shard_sizes]:
+        row = {"shards": shards, "shard_size": shard_size or -(-len(labels) // shards)}
+        ensemble = ShardedEnsemble(learner, shards, shard_size, **ensemble_options)
+        try:
+            ensemble.fit(grades, labels, num_classes)
+        except RuntimeError as error:
+            rows.append({**row, "error": str(error)})
+            continue
+        valid = [result for result in ensemble.shard_results if "error" not in result]
+        row.update(
+            trained=len(ensemble.models),
+            train_accuracy=float(accuracy(ensemble.predict(grades), labels)),
+            test_accuracy=float(accuracy(ensemble.predict(grades_test), labels_test)),
+            wall_time=ensemble.fit_time,
+            max_clauses=max(result["num_clauses"] for result in valid),
+            max_cnf_bytes=max(result["cnf_bytes"] for result in valid),
+        )
+        rows.append(row)
+    return rows
@@ -0,0 +1,194 @@
+"""Incremental retraining of the SAT/MaxSAT models when new alternatives are added
+
+Adding alternatives only adds clauses 2d/2e (and triggers z_x for the relaxed encoding),
+plus frontier variables and clauses 2a/2b for the values not seen before (and ladder variables
+of the single peak models, whose clauses between the previous neighbours stay valid). The variable
+registry and the clauses of the last encoding (clause_store) are extended in place.
+
+gophersat cannot be warm started: the previous model is extended to the new variables and
+kept as is when it satisfies every new clause (still optimal, as adding clauses cannot lower
+the optimum). Otherwise the whole problem is solved again, without rebuilding the old clauses.
+"""
+
+from bisect import bisect_left
+from time import perf_counter
+
+import numpy as np
+
+from tools.shapes import ladder_size, scale_ladder
+from tools.stats import TrainStats
+
+
+def extend_registry(model, new_grades: np.ndarray, new_labels: np.ndarray) -> list:
+    """Adds alternatives to the train set of a model and indexes the new variables
+    (appended after the existing ones, which keep their index)
+
+    Args:
+        model: NcsSatModel, SinglePeakModel or MaxSatSinglePeakModel
+        new_grades (np.ndarray): grades of the new alternatives
+        new_labels (np.ndarray): labels (classes) of the new alternatives
+
+    Returns:
+        list: new frontier variables (i, h, k)
+    """
+    new_grades = np.asarray(new_grades).reshape(-1, model.train_set.shape[1])
+    first = len(model.train_set)
+    model.train_set = np.vstack([model.train_set, new_grades])
+    model.labels = np.concatenate([model.labels, np.asarray(new_labels)])
+    for u in range(first, len(model.train_set)):
+        for h in range(model.num_classes):
+            if model.labels[u] == h:
+                model.alternatives_per_class[h].append(u)
+
+    next_index = max(model.i2v) + 1
+    new_frontier = []
+    for i in range(model.num_criteria):
+        new_values = sorted(set(new_grades[:, i]) - set(model.values_support[i]))
+        model.values_support[i] = sorted(list(model.values_support[i]) + new_values)
+        new_frontier += [(i, h, k) for h in range(1, model.num_classes) for k in new_values]
+    for var in new_frontier:
+        model.variables["frontier_var"].append(var)
+        model.front_v2i[var] = next_index
+        model.front_i2v[next_index] = var
+        model.i2v[next_index] = var
+        next_index += 1
+
+    for var in _ladder_variables(model):
+        if var not in model.ladder_v2i:
+            model.ladder_v2i[var] = next_index
+            model.i2v[next_index] = ("d",) + var
+            next_index += 1
+
+    if hasattr(model, "alt_v2i"):  # Triggers of the relaxed encoding
+        for alternatives in model.alternatives_per_class:
+            for u in alternatives:
+                if u >= first:
+                    model.alt_v2i[u] = next_index
+                    model.i2v[next_index] = ("z", u)
+                    next_index += 1
+
+    # The numbering no longer follows the sorted values: the shared structural clauses do not apply
+    model.clause_cache = None
+    model.structure = None
+    return new_frontier
+
+
+def _ladder_variables(model) -> list:
+    """Ladder variables (i, h, k) of the single peaked (or valley) criteria (see tools.shapes),
+    none for the models without ladder"""
+    if not hasattr(model, "ladder_v2i"):
+        return []
+    return [(i, h, k) for i in range(model.num_criteria)
+            if ladder_size(model.shapes[model.criteria[i]], len(model.values_support[i]))
+            for h in range(1, model.num_classes) for k in model.values_support[i][1:-1]]
+
+
+def extend_clauses(model, new_alternatives: set) -> dict:
+    """Builds the clauses added by new alternatives and appends them to model.clause_store
+
+    Args:
+        model: model whose registry was extended (see extend_registry)
+        new_alternatives (set): indexes of the new alternatives
+
+    Returns:
+        dict: family -> new clauses
+    """
+    added = {}
+    for family in model.clause_store:
+        begin = perf_counter()
+        if family in ("2a", "2b"):
+            # Clauses of the previous values stay valid, only the ones of the new values are added
+            known = {tuple(clause) for clause in model.clause_store[family]}
+            clauses = [clause for clause in getattr(model, f"clauses_{family}")() if tuple(clause) not in known]
+        elif family in ("2d", "2e"):
+            clauses = getattr(model, f"clauses_{family}")(new_alternatives)
+        elif family == "z":
+            clauses = [[model.alt_v2i[u]] for u in sorted(new_alternatives) if u in model.alt_v2i]
+        else:  # 2c only depends on the criteria
+            clauses = []
+        # The stored lists may be shared (eg. with the clause cache): they are not modified
+        model.clause_store[family] = model.clause_store[family] + clauses
+        model.stats.families[family] = {"clauses": len(clauses), "time": perf_counter() - begin}
+        added[family] = clauses
+    return added
+
+
+def extend_assignment(model, new_frontier: list, new_alternatives: set) -> dict:
+    """Extends the last model of the solver to the new variables
+    (a new value takes the value of both of its neighbours, triggers are true, ladders are recomputed)
+
+    Returns:
+        dict: variable index -> value (None if there is no previous model)
+    """
+    if model.assignment is None:
+        return None
+    assignment = dict(model.assignment)
+    new_variables = set(new_frontier)
+    for i, h, k in new_frontier:
+        old_values = [value for value in model.values_support[i] if (i, h, value) not in new_variables]
+        position = bisect_left(old_values, k)
+        neighbours = old_values[max(position - 1, 0):position + 1]
+        assignment[model.front_v2i[(i, h, k)]] = bool(neighbours) and all(
+            assignment.get(model.front_v2i[(i, h, value)], False) for value in neighbours)
+    for u in new_alternatives:
+        if hasattr(model, "alt_v2i") and u in model.alt_v2i:
+            assignment[model.alt_v2i[u]] = True
+    ladders = {}
+    for i, h, k in _ladder_variables(model):
+        ladders.setdefault((i, h), []).append(k)
+    for (i, h), ladder_values in ladders.items():
+        approved = [assignment.get(model.front_v2i[(i, h, k)], False) for k in model.values_support[i]]
+        for k, value in zip(ladder_values, scale_ladder(model.shapes[model.criteria[i]], approved)):
+            assignment[model.ladder_v2i[(i, h, k)]] = value
+    return assignment
+
+
+def satisfies(assignment: dict, clauses: list) -> bool:
+    """Checks that an assignment (variable index -> value) satisfies every clause"""
+    return all(any(assignment.get(abs(lit), False) == (lit > 0) for lit in clause) for clause in clauses)
+
+
+def update_model(model, new_grades: np.ndarray, new_labels: np.ndarray) -> list:
+    """Adds alternatives to the train set of a model and retrains it incrementally
+    (see the module documentation). The consistency of the NcsSatModel train set is checked again:
+    if the new alternatives change its encoding (see NcsSatModel.select_encoding), it is trained again
+
+    Args:
+        model: NcsSatModel, SinglePeakModel or MaxSatSinglePeakModel
+        new_grades (np.ndarray): grades of the new alternatives
+        new_labels (np.ndarray): labels (classes) of the new alternatives
+
+    Returns:
+        list: labels (classes) predicted on the extended train_set
+    """
+    first = len(model.train_set)
+    new_grades = np.asarray(new_grades).reshape(-1, model.gen.num_criteria)
+    if model.quantizer is not None:  # New grades are mapped onto the grid of the train grades
+        new_grades = model.quantizer.transform(new_grades)
+    new_grades = new_grades[:, model.criteria]  # Pruned criteria are not encoded
+    new_frontier = extend_registry(model, new_grades, new_labels)
+    if model.clause_store is None:  # Never encoded: nothing to extend
+        return model.train()
+    if hasattr(model, "select_encoding"):
+        # New alternatives may conflict with the previous ones (see NcsSatModel.check_consistency)
+        previous_encoding = model.effective_encoding
+        model.select_encoding()
+        if model.effective_encoding != previous_encoding:  # Other encoding: nothing to extend
+            return model.train()
+
+    new_alternatives = set(range(first, len(model.train_set)))
+    previous_status = model.stats.solver_status
+    model.stats = TrainStats()
+    if getattr(model, "consistency", None) is not None:
+        model.stats.record_consistency(model.consistency)
+    added = extend_clauses(model, new_alternatives)
+    model.stats.num_clauses = sum(len(clauses) for clauses in model.clause_store.values())
+    model.stats.num_variables = model.highest_variable()
+
+    assignment = extend_assignment(model, new_frontier, new_alternatives)
+    new_clauses = [clause for clauses in added.values() for clause in clauses]
+    if assignment is not None and satisfies(assignment, new_clauses):
+        # The previous model is still a solution (and still optimal for MaxSAT)
+        model.stats.solver_status = previous_status
+        return model.decode((True, [index if value else -index for index, value in sorted(assignment.items())]))
+    return model.decode(model.solve(model.serialize()))
@@ -0,0 +1,248 @@
+"""Optional metrics (counters and latency histograms) of the trainings, solves and predictions,
+exported in the Prometheus text format to a file or a local HTTP endpoint
+
+Metrics are disabled by default: every record_* function returns immediately
+until enable() is called.
+
+Example (long-running worker):
+    from tools import metrics
+    metrics.enable()
+    metrics.start_http_server(9100)  # or metrics.start_file_exporter("metrics.prom")
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets (in seconds), from small predictions to long solver runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1., 5., 10., 30., 60., 300.)
+
+# Registry in use, None when metrics are disabled
+REGISTRY = None
+
+
+def _escape(value) -> str:
+    """Escapes a label value for the Prometheus text format (backslash, double quote and line feed)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    """Formats sorted (name, value) pairs as Prometheus labels"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter, one value per set of labels"""
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+
+    def inc(self, labels: tuple, value: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(labels)} {value}"
+                  for labels, value in sorted(self.values.items())]
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram of observed values, one per set of labels"""
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, labels: tuple, value: float) -> None:
+        if labels not in self.values:
+            self.values[labels] = [[0] * len(self.buckets), 0., 0]
+        counts, _, _ = entry = self.values[labels]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                bucket_labels = _format_labels(labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+            bucket_labels = _format_labels(labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of the learners (thread-safe)"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.lock = threading.Lock()
+        self.trains = Counter("ncs_trains_total", "Number of trainings.")
+        self.train_seconds = Histogram("ncs_train_seconds", "Duration of the trainings.", buckets)
+        self.solves = Counter("ncs_solves_total", "Number of solver runs, by outcome.")
+        self.solve_seconds = Histogram("ncs_solve_seconds", "Wall time of the solver runs.", buckets)
+        self.timeouts = Counter("ncs_solver_timeouts_total", "Number of solver runs stopped at their deadline.")
+        self.failures = Counter("ncs_solver_failures_total", "Number of unsatisfiable or non optimal solver runs.")
+        self.predictions = Counter("ncs_predictions_total", "Number of alternatives scored.")
+        self.predict_seconds = Histogram("ncs_predict_seconds", "Duration of the predict calls.", buckets)
+        self.metrics = [self.trains, self.train_seconds, self.solves, self.solve_seconds,
+                        self.timeouts, self.failures, self.predictions, self.predict_seconds]
+
+    def render(self) -> str:
+        """Prometheus text exposition of all the metrics"""
+        with self.lock:
+            lines = []
+            for metric in self.metrics:
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename: str) -> None:
+        """Writes the metrics to a file (atomically, for the node exporter textfile collector)"""
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w", encoding="utf8") as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(tmp_filename, filename)
+
+
+def enable(registry: MetricsRegistry = None) -> MetricsRegistry:
+    """Enables the metrics
+
+    Args:
+        registry (MetricsRegistry, optional): registry to record to. Defaults to a new one.
+
+    Returns:
+        MetricsRegistry: registry in use
+    """
+    global REGISTRY  # pylint: disable=global-statement
+    REGISTRY = registry or MetricsRegistry()
+    return REGISTRY
+
+
+def disable() -> None:
+    global REGISTRY  # pylint: disable=global-statement
+    REGISTRY = None
+
+
+def record_train(model: str, seconds: float) -> None:
+    registry = REGISTRY
+    if registry is None:
+        return
+    with registry.lock:
+        registry.trains.inc((("model", model),))
+        registry.train_seconds.observe((("model", model),), seconds)
+
+
+def record_solve(model: str, status: str, seconds: float, success: bool = True, timeout: bool = False) -> None:
+    """Records a solver run
+
+    Args:
+        model (str): name of the model
+        status (str): status returned by the solver (eg. "SATISFIABLE")
+        seconds (float): wall time of the run
+        success (bool, optional): False for unsatisfiable or non optimal runs. Defaults to True.
+        timeout (bool, optional): True if the run was stopped at its deadline. Defaults to False.
+    """
+    registry = REGISTRY
+    if registry is None:
+        return
+    labels = (("model", model),)
+    with registry.lock:
+        registry.solves.inc(labels + (("status", status),))
+        registry.solve_seconds.observe(labels, seconds)
+        if timeout:
+            registry.timeouts.inc(labels)
+        if not success:
+            registry.failures.inc(labels)
+
+
+def record_prediction(model: str, count: int, seconds: float) -> None:
+    registry = REGISTRY
+    if registry is None:
+        return
+    with registry.lock:
+        registry.predictions.inc((("model", model),), count)
+        registry.predict_seconds.observe((("model", model),), seconds)
+
+
+def start_file_exporter(filename: str, interval: float = 15.) -> threading.Event:
+    """Writes the metrics to a file every interval seconds (in a daemon thread)
+
+    Args:
+        filename (str): file to write the metrics to
+        interval (float, optional): seconds between two writes. Defaults to 15.
+
+    Returns:
+        threading.Event: set it to stop the exporter
+    """
+    stop = threading.Event()
+
+    def export():
+        while not stop.wait(interval):
+            if REGISTRY is not None:
+                REGISTRY.write(filename)
+
+    threading.Thread(target=export, daemon=True).start()
+    return stop
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = (REGISTRY.render() if REGISTRY is not None else "").encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # Keeps the worker output clean
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves the metrics on http://host:port/metrics (in a daemon thread)
+
+    Returns:
+        ThreadingHTTPServer: the server (call shutdown() to stop it)
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def from_arguments(args) -> callable:
+    """Enables the metrics when asked on the command line (see parseArg)
+
+    Args:
+        args (Namespace): parsed arguments, with metrics_file and metrics_port
+
+    Returns:
+        callable: to be called at the end of the run (writes the last metrics file)
+    """
+    if args.metrics_file is None and args.metrics_port is None:
+        return lambda: None
+    enable()
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port)
+    if args.metrics_file is None:
+        return lambda: None
+    exporter = start_file_exporter(args.metrics_file)
+
+    def stop():
+        exporter.set()
+        REGISTRY.write(args.metrics_file)
+    return stop
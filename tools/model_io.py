@@ -0,0 +1,193 @@
+"""Trained models saved to a json file, and streaming batch scoring of large applicant files
+
+Only the state read by predict is saved (frontiers, sufficient coalition, shapes and quantizer,
+or the MR-Sort parameters), so a saved model does not depend on its train set.
+score_file reads the applicants (csvReader format) chunk by chunk and writes the label of each one
+as soon as its chunk is scored: the memory used does not grow with the size of the file.
+
+Example:
+    save_model(u_ncs, "u_ncs.json")
+    report = score_file("u_ncs.json", "applicants.csv", "labels.csv", chunk_size=50000, jobs=4)
+"""
+
+import json
+import multiprocessing
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from tools.ensemble import PREDICT_STATE
+from tools.portfolio import LEARNERS
+from tools.quantize import Quantizer
+from tools.result_cache import json_compatible
+
+# Model of the worker processes (loaded once per process, see _init_worker)
+_shared = {}
+
+# (module, class) of the models which can be loaded: a file cannot import anything else
+LOADABLE = {(module, name) for module, name, _ in LEARNERS.values()}
+
+
+def model_state(model) -> dict:
+    """State of a trained model read by predict (see PREDICT_STATE)
+
+    Args:
+        model: trained model (MRSort, NcsSatModel, SinglePeakModel, MaxSatSinglePeakModel, ...)
+
+    Raises:
+        ValueError: the model is not trained
+
+    Returns:
+        dict: module and class of the model, number of criteria and json compatible state
+    """
+    description = {"module": type(model).__module__, "class": type(model).__name__}
+    if type(model).__name__ == "MRSort":
+        if model.params is None:
+            raise ValueError("MR-Sort model not trained (no optimum found)")
+        return json_compatible({**description, "num_criteria": len(model.params["weights"]),
+                                "state": {"nb_split": model.nb_split, "params": model.params}})
+    if not model.frontier:
+        raise ValueError(f"{type(model).__name__} model not trained (no frontier)")
+    state = {name: getattr(model, name) for name in PREDICT_STATE if hasattr(model, name)}
+    state["frontier"] = list(state["frontier"].items())
+    if state.get("quantizer") is not None:
+        state["quantizer"] = state["quantizer"].as_dict()
+    num_criteria = len(next(iter(model.frontier.values())))
+    return json_compatible({**description, "num_criteria": num_criteria, "state": state})
+
+
+def save_model(model, path: str) -> None:
+    """Saves the state of a trained model read by predict to a json file (see model_state)
+
+    Args:
+        model: trained model
+        path (str): json file
+    """
+    with open(path, "w") as file:
+        json.dump(model_state(model), file)
+
+
+def load_model(path: str):
+    """Model restored from a json file (see save_model), ready to predict
+
+    Args:
+        path (str): json file
+
+    Raises:
+        ValueError: the class of the file is not one of the models (see LOADABLE)
+
+    Returns:
+        model of the saved class (its num_criteria attribute is the number of criteria of the grades)
+    """
+    with open(path) as file:
+        description = json.load(file)
+    if (description.get("module"), description.get("class")) not in LOADABLE:
+        raise ValueError(f"Unknown model {description.get('module')}.{description.get('class')} in {path}")
+    # Imported here so that only the solver of the saved model is needed (eg. gurobipy for MR-Sort)
+    model = getattr(__import__(description["module"]), description["class"])()
+    state = description["state"]
+    if description["class"] == "MRSort":
+        model.nb_split = state["nb_split"]
+        model.params = {name: np.array(value) for name, value in state["params"].items()}
+    else:
+        model.num_classes = state["num_classes"]
+        model.frontier = {int(h): front for h, front in state["frontier"]}
+        model.suff_coal = tuple(state["suff_coal"])
+        if "shapes" in state:
+            model.shapes = state["shapes"]
+        if state.get("quantizer") is not None:
+            model.quantizer = Quantizer.from_dict(state["quantizer"])
+    model.num_criteria = description["num_criteria"]
+    return model
+
+
+def read_chunks(path: str, chunk_size: int = 10000):
+    """Applicants of a file in the csvReader format (3 header lines, then one "id;grades...[;label]"
+    line per applicant), read chunk by chunk
+
+    Args:
+        path (str): csv file
+        chunk_size (int, optional): applicants per chunk. Defaults to 10000.
+
+    Yields:
+        tuple: (ids of the applicants (np.ndarray), grades (np.ndarray, one column per criterion))
+    """
+    with open(path) as file:
+        header = [file.readline() for _ in range(3)]
+    num_criteria = int(header[2].split(";")[0])
+    for chunk in pd.read_csv(path, sep=";", header=None, skiprows=3, chunksize=chunk_size,
+                             usecols=range(num_criteria + 1)):
+        yield chunk.iloc[:, 0].to_numpy(), chunk.iloc[:, 1:].to_numpy(dtype=float)
+
+
+def predict_labels(model, grades: np.ndarray) -> np.ndarray:
+    """Labels of the applicants predicted by a loaded model (integers, whatever the model)"""
+    return np.asarray(model.predict(grades), dtype=int)
+
+
+def _init_worker(model_path: str) -> None:
+    """Loads the model once in the worker process (not sent with every chunk)"""
+    _shared["model"] = load_model(model_path)
+
+
+def _score_chunk(grades: np.ndarray) -> np.ndarray:
+    return predict_labels(_shared["model"], grades)
+
+
+def score_file(model_path: str, input_path: str, output_path: str, chunk_size: int = 10000,
+               jobs: int = 1) -> dict:
+    """Scores the applicants of a file with a saved model, chunk by chunk
+
+    With several jobs, the chunks are scored by worker processes, at most two chunks per worker
+    being read ahead (the memory used stays bounded). The labels are written in the order of the file.
+
+    Args:
+        model_path (str): json file of the model (see save_model)
+        input_path (str): applicants (see read_chunks)
+        output_path (str): csv file of the labels ("id;label" lines)
+        chunk_size (int, optional): applicants per chunk. Defaults to 10000.
+        jobs (int, optional): number of worker processes, 1 to score in this process. Defaults to 1.
+
+    Raises:
+        ValueError: the applicants do not have the number of criteria of the model
+
+    Returns:
+        dict: rows and chunks scored, time to load the model, scoring time and throughput (rows_per_second)
+    """
+    begin = perf_counter()
+    model = load_model(model_path)
+    load_time = perf_counter() - begin
+    begin = perf_counter()  # Throughput of the scoring only (the model and its modules are loaded once)
+    rows, chunks = 0, 0
+    pool = multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(model_path,)) if jobs > 1 else None
+    pending = deque()  # (ids, asynchronous labels) of the chunks being scored, in the order of the file
+
+    def write(output, ids, labels) -> int:
+        pd.DataFrame({"id": ids, "label": labels}).to_csv(output, sep=";", header=False, index=False)
+        return len(ids)
+
+    try:
+        with open(output_path, "w") as output:
+            output.write("id;label\n")
+            for ids, grades in read_chunks(input_path, chunk_size):
+                if grades.shape[1] != model.num_criteria:
+                    raise ValueError(f"Expected {model.num_criteria} criteria, got {grades.shape[1]}")
+                chunks += 1
+                if pool is None:
+                    rows += write(output, ids, predict_labels(model, grades))
+                    continue
+                pending.append((ids, pool.apply_async(_score_chunk, (grades,))))
+                if len(pending) >= 2 * jobs:
+                    ids, labels = pending.popleft()
+                    rows += write(output, ids, labels.get())
+            while pending:
+                ids, labels = pending.popleft()
+                rows += write(output, ids, labels.get())
+    finally:
+        if pool is not None:
+            pool.terminate()
+    elapsed = perf_counter() - begin
+    return {"rows": rows, "chunks": chunks, "load_time": load_time, "time": elapsed,
+            "rows_per_second": rows / elapsed if elapsed > 0 else 0.}
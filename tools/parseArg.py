@@ -14,6 +14,49 @@ def parseArguments():
     parser.add_argument("-g", "--gopher-path", help="Path to gophersat solver.", type=str, default="./gophersat.exe")
     parser.add_argument("-npct", "--noise_percent", help="Percentage of noisy (false) label, if noisy activated", default=0.05)
     parser.add_argument('-f', "--file", help="path to file", default=None)
+    parser.add_argument("--pipeline", help="Overlaps encoding, solving and decoding of successive SAT trainings", action="store_true")
+    parser.add_argument("--max-variables", help="Refuses SAT encodings with more variables", type=int, default=None)
+    parser.add_argument("--max-clauses", help="Refuses SAT encodings with more clauses", type=int, default=None)
+    parser.add_argument("--max-bytes", help="Refuses SAT encodings with a larger DIMACS file", type=int, default=None)
+    parser.add_argument("--on-budget", help="Behaviour when an encoding exceeds the budget", choices=["raise", "compact", "quantize"], default="raise")
+    parser.add_argument("--quantize", help="Maps the grades onto a grid before encoding", choices=["step", "bins", "quantiles"], default=None)
+    parser.add_argument("--quantize-param", help="Step of the grid, or number of bins", type=float, default=16)
+    parser.add_argument("--learners", help="Learners of the portfolio (portfolio_main)", nargs="+", default=None)
+    parser.add_argument("--folds", help="Number of folds of the cross-validation (cross_validation_main)", type=int, default=5)
+    parser.add_argument("--jobs", help="Worker processes of the cross-validation, ensembles or scoring (default: one per CPU)", type=int, default=None)
+    parser.add_argument("--shards", help="Numbers of shards of the ensemble compared (ensemble_main)", type=int, nargs="+", default=[3, 5, 9])
+    parser.add_argument("--shard-size", help="Students of each shard (default: disjoint shards)", type=int, nargs="+", default=None)
+    parser.add_argument("--sampling", help="Draw of the shards of the ensemble", choices=["stratified", "random"], default="stratified")
+    parser.add_argument("--vote", help="Combination of the predictions of the shards", choices=["majority", "median"], default="majority")
+    parser.add_argument("--auto", help="Trains the learner with the lowest time predicted by the cost model (instead of the default ones)", action="store_true")
+    parser.add_argument("--cost-results", help="Sweep results (generate_csv) the cost model of the auto mode is fitted on", default="results.csv")
+    parser.add_argument("--auto-log", help="Json lines file where the choices of the auto mode are appended", default=None)
+    parser.add_argument("--min-accuracy", help="Train accuracy of an acceptable portfolio result", type=float, default=1.)
+    parser.add_argument("--deadline", help="Maximum time of the portfolio or of the anytime MaxSAT solver (in seconds)", type=float, default=None)
+    parser.add_argument("--lazy", help="Trains U-NCS on a growing subset of the students (counterexample-guided)", action="store_true")
+    parser.add_argument("--prune-criteria", help="Leaves constant (exact) or also duplicated and uninformative (heuristic) criteria out of the encoding", choices=["exact", "heuristic"], default=None)
+    parser.add_argument("--prune-threshold", help="Correlation with the labels under which a criterion is uninformative", type=float, default=0.1)
+    parser.add_argument("--shapes", help="Shape of each criterion of the single peak models (monotone, peak or valley), or infer", nargs="+", default=None)
+    parser.add_argument("--preprocess", help="Simplifies the SAT/MaxSAT clauses before writing them for gophersat", action="store_true")
+    parser.add_argument("--on-inconsistent", help="U-NCS behaviour when the train set has dominance conflicts", choices=["relaxed", "sat"], default="relaxed")
+    parser.add_argument("--relaxed", help="Relaxed MaxSAT encoding (one trigger per alternative) for noisy data", action="store_true")
+    parser.add_argument("--local-search", help="Learns U-NCS by local search only, or as a bound and fallback of the solver (bound)", choices=["only", "bound"], default=None)
+    parser.add_argument("--cost-threshold", help="Stops the anytime MaxSAT solver once its cost is lower or equal", type=int, default=None)
+    parser.add_argument("--clause-cache", help="Directory where the structural clauses (2a-2c) are also cached between runs", default=None)
+    parser.add_argument("--result-cache", help="Directory of the cached trained models (same training set: no solver call)", default=None)
+    parser.add_argument("--metrics-file", help="Exports Prometheus metrics to this file", default=None)
+    parser.add_argument("--metrics-port", help="Serves Prometheus metrics on http://127.0.0.1:<port>/metrics", type=int, default=None)
+    parser.add_argument("--save-model", help="Json file where the trained U-NCS (main) or single peak model is saved for scoring", default=None)
+    parser.add_argument("--model", help="Json file of the saved model scoring the applicants (score_main)", default=None)
+    parser.add_argument("--output", help="Csv file of the predicted labels (score_main)", default="labels.csv")
+    parser.add_argument("--chunk-size", help="Applicants read and scored at once (score_main)", type=int, default=10000)
+    parser.add_argument("--port", help="Local TCP port of the scoring service (service_main)", type=int, default=8000)
+    parser.add_argument("--socket", help="Unix socket served by the scoring service instead of the TCP port", default=None)
+    parser.add_argument("--max-batch", help="Applicants scored at once by the scoring service", type=int, default=64)
+    parser.add_argument("--max-wait", help="Time a request waits for others to join its batch (in seconds)", type=float, default=0.002)
+    parser.add_argument("--watch", help="Period of the check of the model file, reloaded when modified (in seconds)", type=float, default=None)
+    parser.add_argument("--benchmark", help="Load test of the scoring service with this number of requests instead of serving", type=int, default=None)
+    parser.add_argument("--clients", help="Concurrent clients of the load test of the scoring service", type=int, default=16)
     parser.add_argument('-p', "--possible_frontier", help="generate different types of frontiers : peak,valley or random", default=None)
 
 
@@ -0,0 +1,118 @@
+"""Pipelined training of several SAT/MaxSAT models (encode / solve / decode overlap)"""
+
+import queue
+import threading
+from time import time
+
+# Marks the end of the stream of jobs between two stages
+_DONE = object()
+
+
+class _Cached:
+    """Train predictions of a model found in its result cache (neither solved nor decoded)"""
+
+    def __init__(self, predictions: list) -> None:
+        self.predictions = predictions
+
+
+class _StageError:
+    """Wraps an exception raised in a stage so that it reaches the caller"""
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def _encode_stage(models: list, out_queue: queue.Queue) -> None:
+    """Encodes each model in turn (blocks when the solver is behind), after the start of its training
+    (consistency check and result cache, see prepare_training)"""
+    try:
+        for k, model in enumerate(models):
+            begin = time()
+            cached = model.prepare_training()
+            if cached is not None:
+                model.pipeline_times = {"encode": 0.}
+                out_queue.put((k, model, _Cached(cached)))
+                continue
+            dimacs = model.encode()
+            model.pipeline_times = {"encode": time() - begin}
+            out_queue.put((k, model, dimacs))
+    except BaseException as error:  # pylint: disable=broad-except
+        out_queue.put(_StageError(error))
+    out_queue.put(_DONE)
+
+
+def _solve_stage(in_queue: queue.Queue, out_queue: queue.Queue) -> None:
+    """Runs gophersat on each encoded problem as soon as it is available"""
+    while True:
+        job = in_queue.get()
+        if job is _DONE or isinstance(job, _StageError):
+            out_queue.put(job)
+            if job is _DONE:
+                return
+            continue
+        k, model, dimacs = job
+        if isinstance(dimacs, _Cached):
+            out_queue.put(job)
+            continue
+        try:
+            begin = time()
+            res = model.solve(dimacs)
+            model.pipeline_times["solve"] = time() - begin
+        except BaseException as error:  # pylint: disable=broad-except
+            out_queue.put(_StageError(error))
+            continue
+        out_queue.put((k, model, res))
+
+
+def run_pipeline(models: list, maxsize: int = 2) -> list:
+    """Trains several models, overlapping the encoding of problem k+1,
+    the resolution of problem k and the decoding of problem k-1
+
+    Each model must provide prepare_training(), encode(), solve(dimacs) and decode(res)
+    (NcsSatModel, SinglePeakModel, MaxSatSinglePeakModel): as train does, the cached results
+    are neither solved nor decoded. The stage timings of each model are stored in its pipeline_times attribute.
+
+    Args:
+        models (list): models to train
+        maxsize (int, optional): size of the queues between stages
+            (number of problems waiting for the next stage). Defaults to 2.
+
+    Returns:
+        list: train predictions of each model (same order as models)
+    """
+    encoded = queue.Queue(maxsize=maxsize)
+    solved = queue.Queue(maxsize=maxsize)
+    encoder = threading.Thread(target=_encode_stage, args=(models, encoded), daemon=True)
+    solver = threading.Thread(target=_solve_stage, args=(encoded, solved), daemon=True)
+    encoder.start()
+    solver.start()
+
+    # Decoding is done in the calling thread
+    results = [None] * len(models)
+    error = None
+    while True:
+        job = solved.get()
+        if job is _DONE:
+            break
+        if isinstance(job, _StageError):
+            error = error or job.error
+            continue
+        if error is not None:
+            continue  # Drains the queue so that the other stages can stop
+        k, model, res = job
+        if isinstance(res, _Cached):
+            results[k] = res.predictions
+            continue
+        begin = time()
+        try:
+            results[k] = model.decode(res)
+        except BaseException as decode_error:  # pylint: disable=broad-except
+            error = decode_error
+            continue
+        model.pipeline_times["decode"] = time() - begin
+
+    encoder.join()
+    solver.join()
+    if error is not None:
+        raise error
+    return results
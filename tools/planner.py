@@ -0,0 +1,300 @@
+"""Predicts the size of the SAT/MaxSAT encodings (variables, clauses, literals, bytes)
+from the dimensions of the problem, without building the clauses"""
+
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from tools.quantize import Quantizer
+from tools.shapes import ladder_size, scale_clause_count, scale_literal_count
+
+# Numbers of bins tried (finest grid first) when the grades are quantized to fit the budget
+QUANTIZATION_BINS = (256, 128, 64, 32, 16, 8, 4, 2)
+
+
+class EncodingBudgetExceeded(Exception):
+    """Raised when the encoding of a problem would exceed the configured budget"""
+
+
+def _digits_sum(low: int, high: int) -> int:
+    """Total number of decimal digits of the integers in [low, high]"""
+    total = 0
+    start, digits = 1, 1
+    while start <= high:
+        end = start * 10 - 1
+        lo, hi = max(start, low), min(end, high)
+        if lo <= hi:
+            total += (hi - lo + 1) * digits
+        start, digits = start * 10, digits + 1
+    return total
+
+
+def _mean_digits(low: int, high: int) -> float:
+    """Mean number of decimal digits of the integers in [low, high]"""
+    if high < low:
+        return 0.
+    return _digits_sum(low, high) / (high - low + 1)
+
+
+class EncodingPlan:
+    """Size of an encoding, family by family"""
+
+    def __init__(self, num_variables: int) -> None:
+        self.num_variables = num_variables
+        self.families = {}  # family -> {"clauses": count, "literals": count, "bytes": estimate}
+        self.header_bytes = 0
+
+    def add_family(self, name: str, clauses: int, literals: int, literal_bytes: float) -> None:
+        """Records a clause family
+
+        Args:
+            name (str): name of the family (eg. "2a")
+            clauses (int): number of clauses
+            literals (int): number of literals over all the clauses
+            literal_bytes (float): estimated bytes of the literals (signs, digits and spaces)
+        """
+        self.families[name] = {
+            "clauses": clauses,
+            "literals": literals,
+            "bytes": int(round(literal_bytes)) + 2 * clauses,  # "0\n" ending each clause
+        }
+
+    @property
+    def num_clauses(self) -> int:
+        return sum(family["clauses"] for family in self.families.values())
+
+    @property
+    def num_literals(self) -> int:
+        return sum(family["literals"] for family in self.families.values())
+
+    @property
+    def cnf_bytes(self) -> int:
+        return self.header_bytes + sum(family["bytes"] for family in self.families.values())
+
+    def as_dict(self) -> dict:
+        return {
+            "num_variables": self.num_variables,
+            "num_clauses": self.num_clauses,
+            "num_literals": self.num_literals,
+            "cnf_bytes": self.cnf_bytes,
+            "families": dict(self.families),
+        }
+
+
+class Budget:
+    """Maximum size accepted for an encoding (None for no limit)"""
+
+    def __init__(self, max_variables: int = None, max_clauses: int = None,
+                 max_literals: int = None, max_bytes: int = None) -> None:
+        self.max_variables = max_variables
+        self.max_clauses = max_clauses
+        self.max_literals = max_literals
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_arguments(cls, args):
+        """Budget set on the command line (None if no limit was given)"""
+        budget = cls(args.max_variables, args.max_clauses, None, args.max_bytes)
+        if budget.max_variables is None and budget.max_clauses is None and budget.max_bytes is None:
+            return None
+        return budget
+
+    def exceeded_by(self, plan: EncodingPlan) -> list:
+        """Lists the limits exceeded by an encoding
+
+        Returns:
+            list: human readable exceeded limits (empty if the plan fits)
+        """
+        exceeded = []
+        for name, value, limit in (("variables", plan.num_variables, self.max_variables),
+                                   ("clauses", plan.num_clauses, self.max_clauses),
+                                   ("literals", plan.num_literals, self.max_literals),
+                                   ("bytes", plan.cnf_bytes, self.max_bytes)):
+            if limit is not None and value > limit:
+                exceeded.append(f"{value} {name} > {limit}")
+        return exceeded
+
+
+def _distinct_projections(ranks: np.ndarray, alternatives: list, coalition: tuple) -> int:
+    """Number of distinct grade vectors of the alternatives restricted to a coalition"""
+    if len(alternatives) == 0:
+        return 0
+    if len(coalition) == 0:
+        return 1
+    return len(np.unique(ranks[np.ix_(alternatives, list(coalition))], axis=0))
+
+
+def plan_encoding(values_support: list, num_classes: int, alternatives_per_class: list,
+                  peak: bool = False, weighted: bool = False, compact: bool = False,
+                  train_set: np.ndarray = None, relaxed: bool = False, shapes: list = None) -> EncodingPlan:
+    """Computes the exact number of variables, clauses and literals of the U-NCS encoding
+    (Definition 4 of Belahcène et al 2018) and estimates the size of its DIMACS file
+
+    Args:
+        values_support (list): sorted unique values of each criterion
+        num_classes (int): number of classes
+        alternatives_per_class (list): indexes of the alternatives of each class
+        peak (bool, optional): single peak scales (clauses 2a with 3 literals). Defaults to False.
+        weighted (bool, optional): MaxSAT encoding (a weight before each clause). Defaults to False.
+        compact (bool, optional): duplicated clauses 2d/2e are removed (or merged if weighted).
+            Defaults to False.
+        train_set (np.ndarray, optional): grades, needed to count the duplicates if compact
+        relaxed (bool, optional): relaxed MaxSAT encoding (Tlili et al. 2022): a trigger z_x
+            per alternative in its clauses 2d/2e and a soft unit clause per trigger. Defaults to False.
+        shapes (list, optional): shape of each criterion (see tools.shapes), overrides peak.
+            Defaults to None.
+
+    Returns:
+        EncodingPlan: size of the encoding
+    """
+    num_criteria = len(values_support)
+    num_coalitions = 2 ** num_criteria
+    sizes = [len(values) for values in values_support]
+    num_frontier = sum(sizes) * (num_classes - 1)
+    num_alternatives = sum(len(alternatives) for alternatives in alternatives_per_class)
+    num_triggers = num_alternatives if relaxed else 0
+    shapes = shapes or [("peak" if peak else "monotone")] * num_criteria
+    num_ladder = sum(ladder_size(shape, size) for size, shape in zip(sizes, shapes)) * (num_classes - 1)
+    plan = EncodingPlan(num_frontier + num_coalitions + num_ladder + num_triggers)
+
+    # Mean size of a literal (digits + space) depending on the kind of variable
+    frontier_lit = _mean_digits(1, num_frontier) + 1
+    coalition_lit = _mean_digits(num_frontier + 1, num_frontier + num_coalitions) + 1
+    ladder_lit = _mean_digits(num_frontier + num_coalitions + 1, num_frontier + num_coalitions + num_ladder) + 1
+    trigger_lit = _mean_digits(num_frontier + num_coalitions + num_ladder + 1, plan.num_variables) + 1
+
+    families = {}
+    # 2a: ascending scales (depending on the shape of each criterion, see tools.shapes)
+    clauses, literals, literal_bytes = 0, 0, 0
+    for size, shape in zip(sizes, shapes):
+        frontier_literals, ladder_literals, negative = scale_literal_count(shape, size)
+        clauses += scale_clause_count(shape, size) * (num_classes - 1)
+        literals += (frontier_literals + ladder_literals) * (num_classes - 1)
+        literal_bytes += (frontier_literals * frontier_lit + ladder_literals * ladder_lit
+                          + negative) * (num_classes - 1)
+    families["2a"] = (clauses, literals, literal_bytes)
+    # 2b: hierarchy of profiles (adjacent classes)
+    count = sum(sizes) * max(num_classes - 2, 0)
+    families["2b"] = (count, 2 * count, count * (2 * frontier_lit + 1))
+    # 2c: coalitions strength ("adjacent" coalitions)
+    count = num_criteria * num_coalitions // 2
+    families["2c"] = (count, 2 * count, count * (2 * coalition_lit + 1))
+
+    # 2d / 2e: one clause per coalition, frontier and alternative of the class below / above
+    # The triggers make every clause 2d/2e distinct, there is nothing to remove
+    compact = compact and not relaxed
+    if compact:
+        ranks = np.stack([np.searchsorted(values, train_set[:, i])
+                          for i, values in enumerate(values_support)], axis=1)
+    for name, offset, negative in (("2d", -1, True), ("2e", 0, False)):
+        clauses, literals, literal_bytes = 0, 0, 0.
+        for size in range(num_criteria + 1):
+            if compact and size == 0:
+                # Same unit clause on the empty coalition for every frontier
+                count = int(any(len(alternatives_per_class[h + offset]) > 0
+                                for h in range(1, num_classes)))
+            elif compact:
+                # Duplicates depend on the criteria of the coalition, each one is counted
+                count = sum(_distinct_projections(ranks, alternatives_per_class[h + offset], coal)
+                            for coal in combinations(range(num_criteria), size)
+                            for h in range(1, num_classes))
+            else:
+                count = comb(num_criteria, size) * sum(
+                    len(alternatives_per_class[h + offset]) for h in range(1, num_classes))
+            clauses += count
+            literals += count * (size + 1 + relaxed)
+            literal_bytes += count * (size * (frontier_lit + negative) + coalition_lit + negative
+                                      + relaxed * (trigger_lit + 1))  # -z_x
+        families[name] = (clauses, literals, literal_bytes)
+
+    if relaxed:
+        # Soft unit clause z_x of each alternative, every other clause is hard
+        families["z"] = (num_alternatives, num_alternatives, num_alternatives * trigger_lit)
+        soft_families = ("z",)
+        soft = num_alternatives
+    else:
+        # Total weight of the soft clauses (duplicates merged in the MaxSAT encoding keep their count)
+        soft_families = ("2d", "2e")
+        soft = num_coalitions * sum(len(alternatives_per_class[h - 1]) + len(alternatives_per_class[h])
+                                    for h in range(1, num_classes))
+    weight_bytes = 0
+    for name, (clauses, literals, literal_bytes) in families.items():
+        if weighted:
+            # Weight before each clause: 1 for the soft clauses, hard weight for the others
+            weight = 1 if name in soft_families else soft + 1
+            weight_bytes = clauses * (len(str(weight)) + 1)
+        plan.add_family(name, clauses, literals, literal_bytes + weight_bytes)
+
+    if weighted:
+        plan.header_bytes = len(f"c MaxSAT encoded NCS problem \np wcnf {plan.num_variables} "
+                                f"{plan.num_clauses} {soft + 1}\n")
+    else:
+        plan.header_bytes = len(f"c SAT encoded NCS problem \np cnf {plan.num_variables} "
+                                f"{plan.num_clauses}\n")
+    return plan
+
+
+def check_budget(model) -> EncodingPlan:
+    """Checks the planned encoding of a model against its budget before it is built
+
+    If the budget is exceeded, the training is refused (EncodingBudgetExceeded)
+    or, when model.on_budget_exceeded is "compact", the compact encoding is used if it fits.
+    When it is "quantize", the grades are mapped onto the finest grid that fits (tools.quantize).
+    These fallbacks only apply to the current training: the options changed are saved
+    in model.budget_fallback and restored by the next one (see restore_budget_fallback).
+
+    Args:
+        model: NcsSatModel, SinglePeakModel or MaxSatSinglePeakModel
+
+    Raises:
+        EncodingBudgetExceeded: no encoding fits in the budget
+
+    Returns:
+        EncodingPlan: plan of the encoding that will be built (None without budget, nothing is planned)
+    """
+    if model.budget is None:
+        return None
+    plan = model.plan()
+    exceeded = model.budget.exceeded_by(plan)
+    if exceeded and model.on_budget_exceeded == "compact" and not model.compact:
+        compact_plan = model.plan(compact=True)
+        if not model.budget.exceeded_by(compact_plan):
+            model.budget_fallback["compact"] = model.compact
+            model.compact = True
+            return compact_plan
+        exceeded = model.budget.exceeded_by(compact_plan)
+    if exceeded and model.on_budget_exceeded == "quantize" and model.quantizer is None:
+        for bins in QUANTIZATION_BINS:
+            _quantize(model, Quantizer("bins", bins))
+            quantized_plan = model.plan()
+            if not model.budget.exceeded_by(quantized_plan):
+                model.budget_fallback["quantizer"] = None
+                return quantized_plan
+        exceeded = model.budget.exceeded_by(quantized_plan)
+        _quantize(model, None)
+    if exceeded:
+        raise EncodingBudgetExceeded(
+            f"{type(model).__name__} encoding exceeds the budget: {', '.join(exceeded)}")
+    return plan
+
+
+def _quantize(model, quantizer) -> None:
+    """Sets the quantization of a model, then checks the consistency of its new grades
+    (see NcsSatModel.select_encoding), which may change the encoding of the training"""
+    model.set_quantization(quantizer)
+    if hasattr(model, "select_encoding"):
+        model.select_encoding()
+
+
+def restore_budget_fallback(model) -> None:
+    """Restores the options changed by the fallbacks of the last check_budget (see model.budget_fallback)
+
+    Args:
+        model: NcsSatModel, SinglePeakModel or MaxSatSinglePeakModel
+    """
+    fallback, model.budget_fallback = model.budget_fallback, {}
+    if "compact" in fallback:
+        model.compact = fallback["compact"]
+    if "quantizer" in fallback:
+        model.set_quantization(fallback["quantizer"])
@@ -0,0 +1,152 @@
+"""Portfolio of learners racing on the same dataset (one worker process per learner)"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+from time import perf_counter
+
+from tools import metrics
+from tools.utils import accuracy
+
+# Learner name -> (module, class, options of the model)
+LEARNERS = {
+    "mrsort": ("mrsort", "MRSort", {}),
+    "ncs": ("ncs", "NcsSatModel", {}),
+    "ncs_compact": ("ncs", "NcsSatModel", {"compact": True}),
+    "ncs_relaxed": ("ncs", "NcsSatModel", {"encoding": "relaxed"}),
+    "single_peak": ("single_peak_sat", "SinglePeakModel", {}),
+    "maxsat": ("single_peak_maxsat", "MaxSatSinglePeakModel", {}),
+    "maxsat_relaxed": ("single_peak_maxsat", "MaxSatSinglePeakModel", {"encoding": "relaxed"}),
+    "ncs_local_search": ("ncs_local_search", "LocalSearchNcsModel", {}),
+}
+
+# Solver statuses of a trained SAT/MaxSAT model (or of a model found by local search)
+SOLVED_STATUSES = ("SATISFIABLE", "OPTIMUM FOUND", "LOCAL SEARCH")
+
+
+def train_learner(name: str, gen, gopherpath: str, working_dir: str) -> dict:
+    """Trains one learner of the portfolio
+
+    Args:
+        name (str): name of the learner (key of LEARNERS)
+        gen (Generator): dataset
+        gopherpath (str): path to gophersat executable
+        working_dir (str): directory of the working file of the solver
+
+    Returns:
+        dict: name, time, train/test predictions, train accuracy and parameters of the model
+    """
+    module_name, class_name, options = LEARNERS[name]
+    # Imported here so that the parent process does not need every solver (eg. gurobipy)
+    model_class = getattr(__import__(module_name), class_name)
+    begin = perf_counter()
+    model = model_class(gen)
+    if class_name == "MRSort":
+        model.set_constraint()
+        train_pred = model.solve()
+        if train_pred[0] is None:
+            return {"name": name, "error": "MR-Sort optimum not found", "time": perf_counter() - begin}
+        test_pred = model.test()
+        params = {name: model.params[name] for name in ("weights", "frontier", "lmbda")}
+    else:
+        for option, value in options.items():
+            setattr(model, option, value)
+        model.set_gophersat_path(gopherpath)
+        model.workingfile = os.path.join(working_dir, f"workingfile_{name}" + os.path.splitext(model.workingfile)[1])
+        train_pred = model.train()
+        if model.stats.solver_status not in SOLVED_STATUSES:
+            return {"name": name, "error": model.stats.solver_status, "time": perf_counter() - begin}
+        test_pred = model.predict()
+        params = {"frontier": model.frontier, "suff_coal": model.suff_coal}
+    return {
+        "name": name,
+        "time": perf_counter() - begin,
+        "train_pred": train_pred,
+        "test_pred": test_pred,
+        "accuracy": accuracy(train_pred, gen.admission),
+        "params": params,
+    }
+
+
+def _worker(name: str, gen, gopherpath: str, working_dir: str, results: multiprocessing.Queue) -> None:
+    if hasattr(os, "setsid"):
+        os.setsid()  # Own process group, so that its solver processes are killed with it
+    try:
+        results.put(train_learner(name, gen, gopherpath, working_dir))
+    except Exception as error:  # pylint: disable=broad-except
+        results.put({"name": name, "error": repr(error)})
+
+
+def _kill(process: multiprocessing.Process) -> None:
+    """Kills a worker and its solver processes"""
+    if not process.is_alive():
+        return
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+    else:
+        process.kill()
+    process.join()
+
+
+def run_portfolio(gen, learners: list = None, gopherpath: str = "./gophersat.exe",
+                  min_accuracy: float = 1., deadline: float = None) -> tuple:
+    """Starts the learners in parallel on the same dataset and keeps the first acceptable result
+
+    A result is acceptable as soon as its train accuracy reaches min_accuracy.
+    If none is by the deadline (or once every learner is done), the most accurate result
+    received so far is returned. The learners still running are then killed (those stopped
+    by the deadline are recorded as solver timeouts, see tools.metrics).
+
+    Args:
+        gen (Generator): dataset
+        learners (list, optional): names of the learners (keys of LEARNERS). Defaults to all.
+        gopherpath (str, optional): path to gophersat executable. Defaults to "./gophersat.exe".
+        min_accuracy (float, optional): train accuracy of an acceptable result. Defaults to 1.
+        deadline (float, optional): maximum time to wait (in seconds). Defaults to None.
+
+    Returns:
+        tuple: (selected result or None, list of all the results received)
+    """
+    learners = learners or list(LEARNERS)
+    results_queue = multiprocessing.Queue()
+    received = []
+    with tempfile.TemporaryDirectory() as working_dir:
+        processes = [multiprocessing.Process(target=_worker, daemon=True,
+                                             args=(name, gen, gopherpath, working_dir, results_queue))
+                     for name in learners]
+        begin = perf_counter()
+        for process in processes:
+            process.start()
+        timed_out = False
+        try:
+            while len(received) < len(processes):
+                timeout = None if deadline is None else deadline - (perf_counter() - begin)
+                if timeout is not None and timeout <= 0:
+                    timed_out = True
+                    break
+                try:
+                    result = results_queue.get(timeout=timeout)
+                except queue.Empty:
+                    timed_out = True
+                    break
+                received.append(result)
+                if "error" not in result and result["accuracy"] >= min_accuracy:
+                    break
+        finally:
+            for process in processes:
+                _kill(process)
+        if timed_out:
+            finished = {result["name"] for result in received}
+            for name in learners:
+                if name not in finished:
+                    metrics.record_solve(LEARNERS[name][1], "TIMEOUT", perf_counter() - begin,
+                                         success=False, timeout=True)
+
+    valid = [result for result in received if "error" not in result]
+    best = max(valid, key=lambda result: result["accuracy"], default=None)
+    return best, received
@@ -0,0 +1,198 @@
+"""Preprocessing of the (hard) clauses before they are written for gophersat
+
+The encodings contain easy redundancy: the empty coalition gives unit clauses in 2d/2e,
+students with the same values give duplicated clauses and many clauses are subsumed by
+shorter ones. Removing it shrinks the file written and parsed by the solver.
+
+Steps (in this order):
+    - duplicates: tautologies and duplicated clauses are removed
+    - units: literals of the unit clauses are fixed and propagated
+    - subsumption: clauses containing every literal of another clause are removed
+    - pure: variables appearing with a single polarity are fixed to satisfy their clauses
+
+The variables fixed are returned (fixed map) and restored in the model of the solver by
+reconstruct. Frozen variables (eg. the ones of the soft clauses of a MaxSAT problem) are
+never eliminated: their unit clauses are kept and they are not fixed as pure literals,
+so that the cost of the soft clauses is unchanged.
+
+Example:
+    u_ncs.preprocessing = True
+"""
+
+from time import perf_counter
+
+STEPS = ("duplicates", "units", "subsumption", "pure")
+
+
+def _normalize(clauses: list) -> list:
+    """Sorted unique literals of each clause, without tautologies nor duplicated clauses"""
+    unique = {}
+    for clause in clauses:
+        literals = tuple(sorted(set(clause)))
+        if any(-lit in literals for lit in literals if lit > 0):
+            continue
+        unique[literals] = None
+    return list(unique)
+
+
+def _propagate_units(clauses: list, fixed: dict, frozen: set) -> tuple:
+    """Fixes the literals of the unit clauses until no unit clause is left
+
+    Returns:
+        tuple: (simplified clauses, True if a clause is falsified)
+    """
+    kept_units = set()
+    while True:
+        units = [clause[0] for clause in clauses if len(clause) == 1 and clause not in kept_units]
+        if not units:
+            return clauses, False
+        for lit in units:
+            if fixed.get(abs(lit), lit > 0) != (lit > 0):
+                return clauses, True
+            fixed[abs(lit)] = lit > 0
+            if abs(lit) in frozen:
+                kept_units.add((lit,))
+        simplified = []
+        for clause in clauses:
+            if clause in kept_units:
+                simplified.append(clause)
+                continue
+            if any(fixed.get(abs(lit)) == (lit > 0) for lit in clause):
+                continue
+            reduced = tuple(lit for lit in clause if abs(lit) not in fixed)
+            if not reduced:
+                return clauses, True
+            simplified.append(reduced)
+        clauses = _normalize(simplified)
+
+
+def _remove_subsumed(clauses: list) -> list:
+    """Removes the clauses which contain every literal of another (shorter or equal) clause"""
+    clauses = sorted(clauses, key=len)
+    by_first = {}  # smallest literal -> kept clauses (a subsuming clause has its smallest literal in the clause)
+    kept = []
+    for clause in clauses:
+        literals = set(clause)
+        if any(literals.issuperset(other) for lit in clause for other in by_first.get(lit, ())):
+            continue
+        by_first.setdefault(clause[0], []).append(clause)
+        kept.append(clause)
+    return kept
+
+
+def _eliminate_pure(clauses: list, fixed: dict, frozen: set) -> list:
+    """Fixes the variables appearing with a single polarity, removing their clauses
+    (which may make other variables pure)"""
+    occurrences = {}  # literal -> indexes of the clauses containing it
+    for index, clause in enumerate(clauses):
+        for lit in clause:
+            occurrences.setdefault(lit, []).append(index)
+    remaining = {lit: len(indexes) for lit, indexes in occurrences.items()}  # Clauses not removed yet
+    removed = [False] * len(clauses)
+    pending = [lit for lit in occurrences if abs(lit) not in frozen and not remaining.get(-lit)]
+    while pending:
+        lit = pending.pop()
+        if abs(lit) in fixed or not remaining[lit] or remaining.get(-lit):
+            continue
+        fixed[abs(lit)] = lit > 0
+        for index in occurrences[lit]:
+            if removed[index]:
+                continue
+            removed[index] = True
+            for other in clauses[index]:
+                remaining[other] -= 1
+                # The opposite literal of a variable left in a single polarity becomes pure
+                if not remaining[other] and remaining.get(-other) and abs(other) not in frozen:
+                    pending.append(-other)
+    return [clause for index, clause in enumerate(clauses) if not removed[index]]
+
+
+def preprocess(clauses: list, frozen: set = frozenset(), steps: tuple = STEPS) -> tuple:
+    """Simplifies hard clauses (see the module documentation)
+
+    Args:
+        clauses (list): clauses to be simplified
+        frozen (set, optional): variables which must not be eliminated. Defaults to none.
+        steps (tuple, optional): steps applied (subset of STEPS). Defaults to all of them.
+
+    Returns:
+        tuple: (simplified clauses (lists of literals), fixed map (variable -> value),
+            report: number of clauses removed by each step, clauses before/after and time)
+    """
+    begin = perf_counter()
+    report = {"clauses_before": len(clauses)}
+    fixed = {}
+    count = len(clauses)
+    clauses = _normalize(clauses) if "duplicates" in steps else [tuple(clause) for clause in clauses]
+    report["duplicates"] = count - len(clauses)
+
+    count = len(clauses)
+    conflict = False
+    if "units" in steps:
+        clauses, conflict = _propagate_units(clauses, fixed, set(frozen))
+    report["units"] = count - len(clauses)
+    if conflict:  # Unsatisfiable: the solver is given a trivial contradiction
+        var = next(iter(fixed), 1)
+        clauses = [(var,), (-var,)]
+        fixed = {}
+        report["subsumption"] = report["pure"] = 0
+    else:
+        count = len(clauses)
+        if "subsumption" in steps:
+            clauses = _remove_subsumed(clauses)
+        report["subsumption"] = count - len(clauses)
+
+        count = len(clauses)
+        if "pure" in steps:
+            clauses = _eliminate_pure(clauses, fixed, set(frozen))
+        report["pure"] = count - len(clauses)
+
+    report["fixed"] = len(fixed)
+    report["clauses_after"] = len(clauses)
+    report["time"] = perf_counter() - begin
+    return [list(clause) for clause in clauses], fixed, report
+
+
+def reconstruct(model: list, fixed: dict) -> list:
+    """Restores the variables fixed by the preprocessing in a model of the solver
+
+    Args:
+        model (list): model over index returned by the solver
+        fixed (dict): variable -> value (see preprocess)
+
+    Returns:
+        list: model over index of the original problem
+    """
+    if not fixed:
+        return model
+    restored = []
+    for v in model:
+        index = abs(int(v))
+        if index in fixed:
+            restored.append(index if fixed[index] else -index)
+        elif int(v) != 0:
+            restored.append(int(v))
+    seen = {abs(v) for v in restored}
+    restored += [index if value else -index for index, value in sorted(fixed.items()) if index not in seen]
+    return restored
+
+
+def preprocess_model(model, hard_clauses: list, soft_clauses: list = ()) -> list:
+    """Preprocesses the hard clauses of a model if asked (model.preprocessing), the variables
+    of the soft clauses being frozen. The fixed map is kept in model.fixed (restored by decode)
+    and the report in model.stats.preprocessing.
+
+    Args:
+        model: NcsSatModel, SinglePeakModel or MaxSatSinglePeakModel
+        hard_clauses (list): hard clauses (every clause of a SAT problem)
+        soft_clauses (list, optional): soft clauses of a MaxSAT problem. Defaults to none.
+
+    Returns:
+        list: hard clauses to be written
+    """
+    model.fixed = {}
+    if not model.preprocessing:
+        return hard_clauses
+    frozen = {abs(lit) for clause in soft_clauses for lit in clause}
+    clauses, model.fixed, model.stats.preprocessing = preprocess(hard_clauses, frozen)
+    return clauses
@@ -0,0 +1,122 @@
+"""Pruning of the criteria left out of the encoding
+
+Each criterion doubles the number of coalitions, hence of clauses 2c, 2d and 2e.
+A constant criterion can always be pruned: it is approved by every student or by none,
+so any sufficient coalition containing it is equivalent to one without it (exact).
+Optionally (heuristic), criteria ranking the students exactly as another one, or whose
+ranks are not correlated with the labels, are pruned too.
+
+The models are trained on the remaining criteria and restored on every criterion
+(see full_width): a pruned criterion is never in the sufficient coalition.
+
+Example:
+    u_ncs = NcsSatModel(gen)
+    u_ncs.prune_criteria(heuristic=True)
+"""
+
+import numpy as np
+
+
+def dense_ranks(grades: np.ndarray) -> np.ndarray:
+    """Rank of each grade among the distinct values of its criterion (0 for the lowest)
+
+    Args:
+        grades (np.ndarray): grades (one column per criterion)
+
+    Returns:
+        np.ndarray: ranks, same shape as grades
+    """
+    grades = np.asarray(grades, dtype=float)
+    ranks = np.empty(grades.shape, dtype=int)
+    for i in range(grades.shape[1]):
+        ranks[:, i] = np.unique(grades[:, i], return_inverse=True)[1].ravel()
+    return ranks
+
+
+def constant_criteria(ranks: np.ndarray) -> list:
+    """Criteria taking a single value"""
+    return np.flatnonzero(ranks.max(axis=0) == 0).tolist()
+
+
+def duplicated_criteria(ranks: np.ndarray) -> dict:
+    """Criteria ranking the students exactly as a previous criterion
+
+    Returns:
+        dict: duplicated criterion -> first criterion with the same ranks
+    """
+    _, first, inverse = np.unique(ranks.T, axis=0, return_index=True, return_inverse=True)
+    original = first[inverse.ravel()]
+    return {i: int(original[i]) for i in range(ranks.shape[1]) if original[i] != i}
+
+
+def label_correlation(ranks: np.ndarray, labels: np.ndarray, peak: bool = False) -> np.ndarray:
+    """Correlation between the ranks of each criterion and the labels (Spearman like, on dense ranks)
+
+    Args:
+        ranks (np.ndarray): ranks of the grades (see dense_ranks)
+        labels (np.ndarray): labels (classes) of the students
+        peak (bool, optional): single peak criteria, the ranks are replaced by their distance
+            to the median rank of the best class (closer is better). Defaults to False.
+
+    Returns:
+        np.ndarray: correlation of each criterion (0 for constant criteria)
+    """
+    ranks = ranks.astype(float)
+    labels = np.asarray(labels, dtype=float)
+    if peak:
+        best = labels == labels.max()
+        ranks = -np.abs(ranks - np.median(ranks[best], axis=0))
+    centered = ranks - ranks.mean(axis=0)
+    centered_labels = labels - labels.mean()
+    norms = np.sqrt((centered ** 2).sum(axis=0) * (centered_labels ** 2).sum())
+    covariance = centered_labels @ centered
+    return np.divide(covariance, norms, out=np.zeros_like(covariance), where=norms > 0)
+
+
+def find_prunable(grades: np.ndarray, labels: np.ndarray, heuristic: bool = False,
+                  threshold: float = 0.1, peak: bool = False) -> dict:
+    """Criteria which can be left out of the encoding (at least one criterion is kept)
+
+    Args:
+        grades (np.ndarray): grades of the train set (one column per criterion)
+        labels (np.ndarray): labels (classes) of the train set
+        heuristic (bool, optional): also prunes duplicated and uninformative criteria,
+            which may lower the accuracy. Defaults to False (constant criteria only).
+        threshold (float, optional): absolute correlation with the labels under which
+            a criterion is uninformative. Defaults to 0.1.
+        peak (bool, optional): single peak criteria (see label_correlation). Defaults to False.
+
+    Returns:
+        dict: pruned criterion -> reason
+    """
+    ranks = dense_ranks(grades)
+    pruned = {i: "constant" for i in constant_criteria(ranks)}
+    if heuristic:
+        for i, original in duplicated_criteria(ranks).items():
+            pruned.setdefault(i, f"same ranks as criterion {original}")
+        correlation = label_correlation(ranks, labels, peak)
+        for i in np.flatnonzero(np.abs(correlation) < threshold).tolist():
+            pruned.setdefault(i, f"uninformative (correlation {correlation[i]:.3f})")
+        if len(pruned) == ranks.shape[1]:  # Keeps the criterion the most correlated with the labels
+            pruned.pop(int(np.argmax(np.abs(correlation))))
+    elif len(pruned) == ranks.shape[1]:
+        pruned.pop(0)
+    return pruned
+
+
+def full_width(front: list, criteria: list, num_criteria: int, default) -> list:
+    """Frontier of the encoded criteria restored on every criterion
+
+    Args:
+        front (list): value for each encoded criterion
+        criteria (list): encoded criteria (index in the full list of criteria)
+        num_criteria (int): total number of criteria
+        default: value of the pruned criteria
+
+    Returns:
+        list: value for each criterion
+    """
+    full = [default] * num_criteria
+    for position, i in enumerate(criteria):
+        full[i] = front[position]
+    return full
@@ -0,0 +1,138 @@
+"""Quantization of the grades onto a bounded grid before encoding
+
+Generated grades are continuous: every student adds a value, hence frontier variables
+and clauses 2a/2b, on each criterion. Mapping the grades onto a grid bounds the size of
+the encoding whatever the number of students, at the cost of some accuracy
+(see compare_quantization).
+
+Example:
+    u_ncs = NcsSatModel(gen)
+    u_ncs.set_quantization(Quantizer("bins", 16))
+"""
+
+import numpy as np
+
+from tools.utils import accuracy
+
+METHODS = ("step", "bins", "quantiles")
+
+
+class Quantizer:
+    """Maps each grade onto the highest point of its criterion grid below it
+
+    The grid of each criterion starts at the lowest train grade: a frontier on the grid
+    splits the grades exactly as the same frontier on the quantized grades.
+    Grades below the grid (eg. in the test set) are mapped to -inf.
+    """
+
+    def __init__(self, method: str = "bins", param: float = 16) -> None:
+        """
+        Args:
+            method (str, optional): "step" (grid of fixed step), "bins" (param equal width bins)
+                or "quantiles" (param bins of the same number of grades). Defaults to "bins".
+            param (float, optional): step, or number of bins. Defaults to 16.
+
+        Raises:
+            ValueError: unknown method or parameter not positive
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown quantization method {method!r} (expected one of {METHODS})")
+        if param <= 0:
+            raise ValueError(f"Quantization parameter must be positive, got {param}")
+        self.method = method
+        self.param = param
+        self.grid = None  # Sorted points of each criterion, set by fit
+
+    def fit(self, grades: np.ndarray):
+        """Computes the grid of each criterion from the train grades
+
+        Args:
+            grades (np.ndarray): train grades (one column per criterion)
+
+        Returns:
+            Quantizer: self
+        """
+        grades = np.asarray(grades, dtype=float)
+        self.grid = []
+        for column in grades.T:
+            low, high = column.min(), column.max()
+            if self.method == "quantiles":
+                points = np.quantile(column, np.linspace(0, 1, int(self.param) + 1)[:-1])
+            elif self.method == "bins":
+                points = low + (high - low) / int(self.param) * np.arange(int(self.param))
+            else:
+                points = low + self.param * np.arange(int((high - low) // self.param) + 1)
+            self.grid.append(np.unique(points))
+        return self
+
+    def transform(self, grades: np.ndarray) -> np.ndarray:
+        """Quantized grades
+
+        Args:
+            grades (np.ndarray): grades (one column per criterion)
+
+        Returns:
+            np.ndarray: grades mapped onto the grid
+        """
+        grades = np.asarray(grades, dtype=float)
+        quantized = np.empty_like(grades)
+        for i, points in enumerate(self.grid):
+            index = np.searchsorted(points, grades[:, i], side="right") - 1
+            quantized[:, i] = np.where(index >= 0, points[np.maximum(index, 0)], -np.inf)
+        return quantized
+
+    def fit_transform(self, grades: np.ndarray) -> np.ndarray:
+        return self.fit(grades).transform(grades)
+
+    def as_dict(self) -> dict:
+        """Description of the quantizer (eg. for the result cache key)"""
+        return {
+            "method": self.method,
+            "param": self.param,
+            "grid": None if self.grid is None else [points.tolist() for points in self.grid],
+        }
+
+    @classmethod
+    def from_dict(cls, description: dict) -> "Quantizer":
+        """Quantizer restored from its description (see as_dict)"""
+        quantizer = cls(description["method"], description["param"])
+        if description["grid"] is not None:
+            quantizer.grid = [np.array(points, dtype=float) for points in description["grid"]]
+        return quantizer
+
+    def __repr__(self) -> str:
+        return f"Quantizer({self.method!r}, {self.param})"
+
+
+def compare_quantization(model_class, gen, quantizer: Quantizer, gopherpath: str) -> dict:
+    """Trains a model with the exact and the quantized grades and reports the size
+    of both encodings and the accuracy lost by the quantization
+
+    Args:
+        model_class (type): NcsSatModel, SinglePeakModel or MaxSatSinglePeakModel
+        gen (Generator): dataset
+        quantizer (Quantizer): quantization of the grades
+        gopherpath (str): path to gophersat executable
+
+    Returns:
+        dict: "exact" and "quantized" sizes and accuracies, "train_cost" and "test_cost"
+            (accuracy lost on the train and test sets)
+    """
+    report = {}
+    for name, model_quantizer in (("exact", None), ("quantized", quantizer)):
+        model = model_class(gen)
+        model.set_gophersat_path(gopherpath)
+        if model_quantizer is not None:
+            model.set_quantization(model_quantizer)
+        train_pred = model.train()
+        report[name] = {
+            "num_values": sum(len(values) for values in model.values_support),
+            "num_variables": model.stats.num_variables,
+            "num_clauses": model.stats.num_clauses,
+            "cnf_bytes": model.stats.cnf_bytes,
+            "train_accuracy": accuracy(train_pred, gen.admission),
+            "test_accuracy": accuracy(model.predict(), gen.admission_test),
+        }
+    report["train_cost"] = report["exact"]["train_accuracy"] - report["quantized"]["train_accuracy"]
+    report["test_cost"] = report["exact"]["test_accuracy"] - report["quantized"]["test_accuracy"]
+    return report
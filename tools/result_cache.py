@@ -0,0 +1,136 @@
+"""Opt-in cache of the trained models (decoded frontiers and sufficient coalitions,
+or MR-Sort parameters), keyed by a fingerprint of the training set
+
+A train on exactly the same grades and labels, with the same model and encoding options,
+returns the cached result without encoding nor calling the solver.
+
+Example:
+    u_ncs.result_cache = ResultCache(directory="result_cache")  # Also kept between runs
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from tools.clause_cache import ClauseCache
+
+# Model attributes changing the result of a train (absent ones are ignored)
+OPTIONS = ("num_classes", "encoding", "on_inconsistent", "compact", "deadline", "cost_threshold", "quantizer",
+           "criteria", "shapes")
+
+# Solver statuses of the results worth caching (proven results only)
+CACHED_STATUSES = ("SATISFIABLE", "OPTIMUM FOUND", "OPTIMAL")
+
+
+def json_compatible(value):
+    """Converts numpy scalars and tuples (recursively) to be stored as json"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [json_compatible(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): json_compatible(item) for key, item in value.items()}
+    return value
+
+
+def training_key(name: str, grades: np.ndarray, labels: np.ndarray, options: dict = None) -> str:
+    """Fingerprint of a training
+
+    Args:
+        name (str): name of the model (eg. "NcsSatModel")
+        grades (np.ndarray): grades of the train set
+        labels (np.ndarray): labels of the train set
+        options (dict, optional): options of the model changing its result. Defaults to None.
+
+    Returns:
+        str: key of the result in the cache
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"model": name, "options": options or {}}, sort_keys=True).encode("utf8"))
+    grades = np.ascontiguousarray(grades, dtype=np.float64)
+    digest.update(str(grades.shape).encode("utf8"))
+    digest.update(grades.tobytes())
+    digest.update(np.ascontiguousarray(labels, dtype=np.float64).tobytes())
+    return f"{name}-{digest.hexdigest()}"
+
+
+def model_key(model) -> str:
+    """Fingerprint of the training of a SAT/MaxSAT model (see training_key)"""
+    options = {option: getattr(model, option) for option in OPTIONS if hasattr(model, option)}
+    if hasattr(model, "effective_encoding"):  # Relaxed encoding of inconsistent data (see NcsSatModel)
+        options["encoding"] = model.effective_encoding
+    if options.get("quantizer") is not None:
+        options["quantizer"] = options["quantizer"].as_dict()
+    return training_key(type(model).__name__, model.train_set, model.labels, options)
+
+
+class ResultCache(ClauseCache):
+    """Trained models kept in memory (least recently used ones evicted first), optionally on disk
+
+    Results are json compatible dictionnaries (see the dump_result / load_result methods of the models).
+    The disk store is bounded too: the least recently used files (oldest modification time,
+    updated on every hit) are removed once it holds more than max_entries results or max_bytes.
+    """
+
+    def __init__(self, maxsize: int = 128, directory: str = None, max_entries: int = 1024,
+                 max_bytes: int = None) -> None:
+        """
+        Args:
+            maxsize (int, optional): maximum number of results kept in memory. Defaults to 128.
+            directory (str, optional): directory where results are also stored as json files.
+                Defaults to None (memory only).
+            max_entries (int, optional): maximum number of results kept on disk. Defaults to 1024.
+            max_bytes (int, optional): maximum size of the results kept on disk. Defaults to None (no limit).
+        """
+        super().__init__(maxsize, directory)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> dict:
+        """Result stored under a key (None if not cached), marked as recently used on disk"""
+        result = super().get(key)
+        if result is not None and self.directory is not None:
+            try:
+                os.utime(self._path(key))
+            except OSError:  # Only in memory, or removed by another process
+                pass
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        """Stores a result in memory (and on disk if a directory is set, see evict)"""
+        super().put(key, result)
+        if self.directory is not None:
+            self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used results from the disk until it fits max_entries and max_bytes"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except OSError:  # Removed by another process
+                continue
+            files.append((info.st_mtime, info.st_size, name))
+        files.sort()
+        total_bytes = sum(size for _, size, _ in files)
+        while files and ((self.max_entries is not None and len(files) > self.max_entries)
+                         or (self.max_bytes is not None and total_bytes > self.max_bytes)):
+            _, size, name = files.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total_bytes -= size
+
+    @classmethod
+    def from_arguments(cls, args):
+        """Cache stored in the directory set on the command line (None if not asked)"""
+        if args.result_cache is None:
+            return None
+        return cls(directory=args.result_cache)
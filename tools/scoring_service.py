@@ -0,0 +1,419 @@
+"""Local scoring service: admission decisions one applicant at a time, from a saved model
+
+The model (see tools.model_io) is loaded once. Concurrent requests are queued and merged into
+micro-batches (at most max_batch applicants, waiting at most max_wait seconds after the first one),
+each batch being scored by a single vectorized predict. A new model file can be loaded while the
+service runs (POST /reload, or watching the file): it replaces the current model between two
+batches, so no request is dropped and every request is scored by one model. Clients can only
+reload the model file of the service, whose class must be one of the models (see tools.model_io.load_model).
+
+The service is a standard library HTTP server, on a local TCP port or a Unix socket:
+    POST /score   {"grades": [12.5, 8, 15, 11]}  ->  {"label": 1, "model_version": 1}
+    POST /reload                                  ->  {"model_version": 2}  (same model file)
+    GET  /health                                  ->  model, version, applicants and batches scored
+
+Example:
+    server = make_server(MicroBatcher("u_ncs.json"), port=8000)
+    server.serve_forever()
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+
+import numpy as np
+
+from tools.model_io import load_model, predict_labels
+
+
+class _Request:
+    """Grades of an applicant waiting to be scored, and its result"""
+
+    def __init__(self, grades: np.ndarray) -> None:
+        self.grades = grades
+        self.done = threading.Event()
+        self.label = None
+        self.version = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Scores the applicants of concurrent requests in micro-batches with the current model"""
+
+    def __init__(self, model_path: str, max_batch: int = 64, max_wait: float = 0.002,
+                 watch_interval: float = None) -> None:
+        """
+        Args:
+            model_path (str): json file of the model (see tools.model_io.save_model)
+            max_batch (int, optional): applicants scored at once. Defaults to 64.
+            max_wait (float, optional): time a request waits for others to join its batch (in seconds).
+                Defaults to 0.002.
+            watch_interval (float, optional): period of the check of the model file (reloaded when
+                modified, in seconds). Defaults to None (reloaded by reload only).
+        """
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.model_path = model_path
+        self._current = (load_model(model_path), 1)  # (model, version), replaced at once by reload
+        self._mtime = os.stat(model_path).st_mtime
+        self._reload_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self.scored = 0  # Applicants scored
+        self.batches = 0
+        threading.Thread(target=self._run, daemon=True).start()
+        if watch_interval is not None:
+            threading.Thread(target=self._watch, args=(watch_interval,), daemon=True).start()
+
+    @property
+    def version(self) -> int:
+        """Version of the current model (1 for the first one, incremented by each reload)"""
+        return self._current[1]
+
+    def score(self, grades, timeout: float = 10.) -> tuple:
+        """Label of an applicant, scored with the next batch
+
+        Args:
+            grades: grades of the applicant (one per criterion)
+            timeout (float, optional): maximum waiting time (in seconds). Defaults to 10.
+
+        Raises:
+            ValueError: the grades do not have the number of criteria of the model
+            TimeoutError: the applicant was not scored in time
+
+        Returns:
+            tuple: (label, version of the model which scored it)
+        """
+        request = _Request(np.asarray(grades, dtype=float).ravel())
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"Applicant not scored in {timeout}s")
+        if request.error is not None:
+            raise request.error
+        return request.label, request.version
+
+    def reload(self, path: str = None) -> int:
+        """Loads a model file and scores the next batches with it (the current model is kept
+        if the file cannot be loaded)
+
+        Args:
+            path (str, optional): json file of the new model. Defaults to None (same file).
+
+        Returns:
+            int: version of the new model
+        """
+        with self._reload_lock:
+            path = self.model_path if path is None else path
+            model = load_model(path)  # Loaded before the swap: the batches go on meanwhile
+            self._current = (model, self._current[1] + 1)
+            self.model_path = path
+            self._mtime = os.stat(path).st_mtime
+            return self._current[1]
+
+    def close(self) -> None:
+        """Stops the batching thread (the requests still queued are not scored)"""
+        self._stop.set()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                if os.stat(self.model_path).st_mtime != self._mtime:
+                    print(f"Model {self.model_path} reloaded (version {self.reload()})")
+            except (OSError, ValueError, KeyError) as error:  # Being written: retried at the next check
+                print(f"Model {self.model_path} not reloaded: {error!r}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            deadline = perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - perf_counter()
+                    # Once the wait is over, the requests already queued still join the batch
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._score_batch(batch)
+
+    def _score_batch(self, batch: list) -> None:
+        model, version = self._current
+        valid = [request for request in batch if len(request.grades) == model.num_criteria]
+        for request in batch:
+            if len(request.grades) != model.num_criteria:
+                request.error = ValueError(f"Expected {model.num_criteria} grades, got {len(request.grades)}")
+        try:
+            labels = predict_labels(model, np.vstack([request.grades for request in valid])) if valid else []
+            for request, label in zip(valid, labels):
+                request.label, request.version = int(label), version
+        except Exception as error:  # pylint: disable=broad-except
+            for request in valid:
+                request.error = error
+        self.scored += len(valid)
+        self.batches += 1
+        for request in batch:
+            request.done.set()
+
+
+class _ScoringHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive connections
+
+    def _reply(self, status: int, content: dict) -> None:
+        body = json.dumps(content).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        batcher = self.server.batcher
+        if self.path != "/health":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        self._reply(200, {"model": batcher.model_path, "model_version": batcher.version,
+                          "num_criteria": batcher._current[0].num_criteria,  # pylint: disable=protected-access
+                          "scored": batcher.scored, "batches": batcher.batches})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        batcher = self.server.batcher
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            content = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/score":
+                label, version = batcher.score(content["grades"])
+                self._reply(200, {"label": label, "model_version": version})
+            elif self.path == "/reload":
+                path = content.get("path")
+                if path is not None and os.path.abspath(path) != os.path.abspath(batcher.model_path):
+                    # Only the file of the service: a client cannot make it load any other file
+                    self._reply(403, {"error": f"Only {batcher.model_path} can be reloaded"})
+                else:
+                    self._reply(200, {"model_version": batcher.reload()})
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+        except TimeoutError as error:
+            self._reply(503, {"error": str(error)})
+        except (ValueError, KeyError, TypeError, OSError) as error:
+            self._reply(400, {"error": repr(error)})
+        except Exception as error:  # pylint: disable=broad-except
+            self._reply(500, {"error": repr(error)})
+
+    def log_message(self, *args):  # Keeps the service output clean
+        pass
+
+
+class _TcpScoringHandler(_ScoringHandler):
+    disable_nagle_algorithm = True  # Headers and body written separately: not delayed until acknowledged
+
+
+class _TcpHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # Pending connections of concurrent clients
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # Pending connections of concurrent clients
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)  # Address of the client expected by BaseHTTPRequestHandler
+
+
+def make_server(batcher: MicroBatcher, host: str = "127.0.0.1", port: int = 8000, socket_path: str = None):
+    """HTTP server of the scoring service (call serve_forever() to run it, shutdown() to stop it)
+
+    Args:
+        batcher (MicroBatcher): scorer of the requests
+        host (str, optional): address of the TCP server. Defaults to "127.0.0.1" (local only).
+        port (int, optional): port of the TCP server. Defaults to 8000.
+        socket_path (str, optional): Unix socket served instead of the TCP port. Defaults to None.
+
+    Returns:
+        socketserver.BaseServer: the server
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _ScoringHandler)
+    else:
+        server = _TcpHTTPServer((host, port), _TcpScoringHandler)
+    server.batcher = batcher
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = 10.) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ScoringClient:
+    """Keep-alive connection to the scoring service"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8000, socket_path: str = None,
+                 timeout: float = 10.) -> None:
+        self.connection = (_UnixHTTPConnection(socket_path, timeout) if socket_path is not None
+                           else http.client.HTTPConnection(host, port, timeout=timeout))
+
+    def request(self, method: str, path: str, content: dict = None) -> tuple:
+        """Sends a request (see the module docstring for the paths)
+
+        Returns:
+            tuple: (HTTP status, json content of the reply)
+        """
+        body = None if content is None else json.dumps(content)
+        try:
+            self.connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            reply = self.connection.getresponse()
+            return reply.status, json.loads(reply.read())
+        except (OSError, http.client.HTTPException):
+            self.connection.close()  # Reconnected by the next request
+            raise
+
+    def score(self, grades) -> int:
+        """Label of an applicant
+
+        Raises:
+            RuntimeError: the service did not score the applicant
+        """
+        status, content = self.request("POST", "/score", {"grades": [float(grade) for grade in grades]})
+        if status != 200:
+            raise RuntimeError(content["error"])
+        return content["label"]
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def serve(model_path: str, host: str = "127.0.0.1", port: int = 8000, socket_path: str = None,
+          max_batch: int = 64, max_wait: float = 0.002, watch_interval: float = None) -> None:
+    """Runs the scoring service until interrupted (see MicroBatcher and make_server)"""
+    server = make_server(MicroBatcher(model_path, max_batch, max_wait, watch_interval), host, port, socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def wait_ready(timeout: float = 30., **address) -> None:
+    """Waits until the service answers (address: host, port or socket_path of ScoringClient)
+
+    Raises:
+        TimeoutError: no answer in time
+    """
+    deadline = perf_counter() + timeout
+    while True:
+        client = ScoringClient(**address)
+        try:
+            client.request("GET", "/health")
+            return
+        except OSError:
+            if perf_counter() > deadline:
+                raise TimeoutError(f"Scoring service not ready in {timeout}s") from None
+            sleep(0.05)
+        finally:
+            client.close()
+
+
+def load_test(grades: np.ndarray, requests: int = 2000, clients: int = 16, **address) -> dict:
+    """Sends single-applicant requests from concurrent clients (one thread and connection each)
+
+    Args:
+        grades (np.ndarray): grades of the applicants sent (cycled over)
+        requests (int, optional): total number of requests. Defaults to 2000.
+        clients (int, optional): concurrent clients. Defaults to 16.
+        address: host, port or socket_path of the service (see ScoringClient)
+
+    Returns:
+        dict: requests, errors, time, throughput (requests per second), p50 and p99 latency (in seconds)
+            and mean batch size of the service
+    """
+    grades = np.asarray(grades, dtype=float)
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+
+    def run(client_index: int) -> None:
+        client = ScoringClient(**address)
+        try:
+            for request in range(client_index, requests, clients):
+                begin = perf_counter()
+                try:
+                    client.score(grades[request % len(grades)])
+                except (RuntimeError, OSError, http.client.HTTPException):
+                    errors[client_index] += 1
+                    continue
+                latencies[client_index].append(perf_counter() - begin)
+        finally:
+            client.close()
+
+    health = ScoringClient(**address)
+    _, before = health.request("GET", "/health")
+    begin = perf_counter()
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - begin
+    _, after = health.request("GET", "/health")
+    health.close()
+
+    times = np.concatenate([np.array(client_latencies) for client_latencies in latencies])
+    batches = after["batches"] - before["batches"]
+    return {
+        "requests": requests,
+        "errors": sum(errors),
+        "time": elapsed,
+        "throughput": len(times) / elapsed,
+        "p50": float(np.percentile(times, 50)) if len(times) else None,
+        "p99": float(np.percentile(times, 99)) if len(times) else None,
+        "mean_batch": (after["scored"] - before["scored"]) / batches if batches else None,
+    }
+
+
+def benchmark(model_path: str, grades: np.ndarray, max_batches: tuple = (1, 64), requests: int = 2000,
+              clients: int = 16, max_wait: float = 0.002, socket_path: str = None, port: int = 8000) -> list:
+    """Load test of the service for each batch size, the service running in its own process
+    (max_batch 1 scores every request on its own: the gain of the micro-batches)
+
+    Args:
+        model_path (str): json file of the model
+        grades (np.ndarray): grades of the applicants sent
+        max_batches (tuple, optional): batch sizes compared. Defaults to (1, 64).
+        requests (int, optional): requests of each load test. Defaults to 2000.
+        clients (int, optional): concurrent clients. Defaults to 16.
+        max_wait (float, optional): see MicroBatcher. Defaults to 0.002.
+        socket_path (str, optional): Unix socket of the service. Defaults to None (local TCP port).
+        port (int, optional): TCP port of the service. Defaults to 8000.
+
+    Returns:
+        list: result of each load test (see load_test) with its max_batch
+    """
+    address = {"socket_path": socket_path} if socket_path is not None else {"port": port}
+    results = []
+    for max_batch in max_batches:
+        service = multiprocessing.Process(target=serve, daemon=True, kwargs={
+            "model_path": model_path, "max_batch": max_batch, "max_wait": max_wait, **address})
+        service.start()
+        try:
+            wait_ready(**address)
+            results.append({"max_batch": max_batch, **load_test(grades, requests, clients, **address)})
+        finally:
+            service.terminate()
+            service.join()
+    return results
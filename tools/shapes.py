@@ -0,0 +1,221 @@
+"""Shape of the scale of each criterion in the single peak models
+
+The values approved on a criterion (for a class) form:
+    - "monotone": an upper set, the values above a frontier (clauses 2a with 2 literals)
+    - "peak": an interval (clauses 2a with 3 literals)
+    - "valley": the complement of an interval (clauses 2a with 3 literals)
+
+Adjacent windows k<k'<k" are enough for an upper set, not for an interval: the approved values
+could then form several runs. The interval is enforced with a ladder of auxiliary variables
+d_{i, h, k}, true once the approved run has dropped at a value k' <= k (some value before k' approved,
+k' not approved), each one forbidding the next value: 3n-7 clauses and n-2 variables for n values.
+
+A monotone criterion encoded as single peaked gives a looser problem than needed:
+infer_shapes finds the cheapest shape consistent with the train set from the number
+of pairs of students ranked in the opposite order by the criterion and by the labels.
+
+Example:
+    u_spm = SinglePeakModel(gen)
+    u_spm.set_shapes()  # Inferred, or eg. set_shapes(["monotone", "peak", "monotone", "valley"])
+"""
+
+import numpy as np
+
+from tools.pruning import dense_ranks
+
+SHAPES = ("monotone", "peak", "valley")
+
+
+def ladder_size(shape: str, size: int) -> int:
+    """Number of ladder variables d_{i, h, k} of a criterion and a class (values between the extreme ones)
+
+    Args:
+        shape (str): shape of the criterion (see SHAPES)
+        size (int): number of values of the criterion
+
+    Returns:
+        int: number of variables (none for monotone criteria)
+    """
+    return 0 if shape == "monotone" else max(size - 2, 0)
+
+
+def scale_clause_count(shape: str, size: int) -> int:
+    """Number of clauses 2a of a criterion and a class (see scale_clauses)
+
+    Args:
+        shape (str): shape of the criterion (see SHAPES)
+        size (int): number of values of the criterion
+
+    Returns:
+        int: number of clauses
+    """
+    if shape == "monotone":
+        return max(size - 1, 0)
+    ladder = ladder_size(shape, size)
+    return 3 * ladder - 1 if ladder else 0
+
+
+def scale_literal_count(shape: str, size: int) -> tuple:
+    """Literals of the clauses 2a of a criterion and a class (see scale_clauses)
+
+    Args:
+        shape (str): shape of the criterion (see SHAPES)
+        size (int): number of values of the criterion
+
+    Returns:
+        tuple: (frontier literals, ladder literals, negative literals)
+    """
+    if shape == "monotone":
+        return 2 * max(size - 1, 0), 0, max(size - 1, 0)
+    ladder = ladder_size(shape, size)
+    if not ladder:
+        return 0, 0, 0
+    return 3 * ladder, 4 * ladder - 2, (4 if shape == "peak" else 3) * ladder - 1
+
+
+def scale_clauses(shape: str, variables: list, ladder: list = None) -> list:
+    """Clauses 2a of a criterion and a class
+
+    Args:
+        shape (str): shape of the criterion (see SHAPES)
+        variables (list): indexes of the variables x_{i, h, k}, sorted by value k
+        ladder (list, optional): indexes of the variables d_{i, h, k} of the values between the extreme
+            ones (see ladder_size), needed unless the criterion is monotone. Defaults to None.
+
+    Returns:
+        list: clauses (adjacent values for monotone criteria, adjacent values and ladder otherwise)
+    """
+    if shape == "monotone":  # x_{i, h, k} => x_{i, h, k'}
+        return [[variables[ik + 1], -variables[ik]] for ik in range(len(variables) - 1)]
+    # Peak: x_{i, h, k-1} and not x_{i, h, k} => d_{i, h, k} => d_{i, h, k+1}, d_{i, h, k} => not x_{i, h, k+1}
+    # (valley: the same on the rejected values)
+    sign = 1 if shape == "peak" else -1
+    clauses = []
+    for ik, drop in enumerate(ladder or [], start=1):
+        clauses.append([-sign * variables[ik - 1], sign * variables[ik], drop])
+        if ik > 1:
+            clauses.append([-ladder[ik - 2], drop])
+        clauses.append([-drop, -sign * variables[ik + 1]])
+    return clauses
+
+
+def scale_ladder(shape: str, approved: list) -> list:
+    """Values of the ladder variables d_{i, h, k} satisfying the clauses 2a (see scale_clauses)
+
+    Args:
+        shape (str): shape of the criterion (see SHAPES)
+        approved (list): whether each value (sorted) is approved, an interval (or its complement)
+
+    Returns:
+        list: value of each ladder variable (values between the extreme ones)
+    """
+    inside = [bool(value) == (shape == "peak") for value in approved]
+    values, entered, dropped = [], False, False
+    for ik in range(1, len(inside) - 1):
+        entered = entered or inside[ik - 1]
+        dropped = dropped or (entered and not inside[ik])
+        values.append(dropped)
+    return values
+
+
+def scale_frontier(shape: str, approved: list, values: list) -> tuple:
+    """Frontier of a criterion decoded from its approved values
+
+    Args:
+        shape (str): shape of the criterion (see SHAPES)
+        approved (list): values k such that x_{i, h, k} is true (not empty)
+        values (list): sorted values of the criterion in the train set
+
+    Returns:
+        tuple: bounds of the approved interval ("monotone", "peak")
+            or of the rejected interval ("valley"), see approves
+    """
+    if shape == "monotone":
+        return (min(approved), np.inf)
+    if shape == "peak":
+        return (min(approved), max(approved))
+    rejected = sorted(set(values) - set(approved))
+    return (rejected[0], rejected[-1]) if rejected else (np.inf, -np.inf)
+
+
+def frontier_mismatches(shape: str, front: tuple, approved: list, values: list) -> int:
+    """Number of values whose approval by a decoded frontier differs from the solver assignment
+    (0 when the clauses 2a hold, see scale_clauses)
+
+    Args:
+        shape (str): shape of the criterion (see SHAPES)
+        front (tuple): decoded frontier (see scale_frontier)
+        approved (list): values k such that x_{i, h, k} is true
+        values (list): sorted values of the criterion in the train set
+
+    Returns:
+        int: number of values approved by one and not by the other
+    """
+    approved = set(approved)
+    return sum(bool(approves(shape, front, value)) != (value in approved) for value in values)
+
+
+def approves(shape: str, front: tuple, value):
+    """Whether a value (or each value of an array) is approved by a frontier (see scale_frontier)"""
+    if shape == "valley":
+        return (value < front[0]) | (value > front[1])
+    return (front[0] <= value) & (value <= front[1])
+
+
+def _discordance(ranks: np.ndarray, label_order: np.ndarray, inside: np.ndarray, increasing: bool) -> tuple:
+    """Number of discordant and comparable pairs of students, both inside a range of ranks"""
+    order = np.sign(ranks[:, None] - ranks[None, :])
+    comparable = (order != 0) & (label_order != 0) & inside[:, None] & inside[None, :]
+    discordant = comparable & ((order != label_order) if increasing else (order == label_order))
+    return discordant.sum(), comparable.sum()
+
+
+def inversion_rates(ranks: np.ndarray, labels: np.ndarray) -> dict:
+    """Share of pairs of students ranked in the opposite order by a criterion and by the labels,
+    for each shape (the peak, resp. valley, is the median rank of the best, resp. worst, class)
+
+    Args:
+        ranks (np.ndarray): ranks of the students on the criterion
+        labels (np.ndarray): labels (classes) of the students
+
+    Returns:
+        dict: shape -> inversion rate
+    """
+    label_order = np.sign(labels[:, None] - labels[None, :])
+    everyone = np.ones(len(ranks), dtype=bool)
+    discordant, comparable = _discordance(ranks, label_order, everyone, True)
+    rates = {"monotone": discordant / max(comparable, 1)}
+    for shape, turn, left_increasing in (("peak", np.median(ranks[labels == labels.max()]), True),
+                                         ("valley", np.median(ranks[labels == labels.min()]), False)):
+        left = _discordance(ranks, label_order, ranks <= turn, left_increasing)
+        right = _discordance(ranks, label_order, ranks >= turn, not left_increasing)
+        rates[shape] = (left[0] + right[0]) / max(left[1] + right[1], 1)
+    return rates
+
+
+def infer_shapes(grades: np.ndarray, labels: np.ndarray, margin: float = 0.05,
+                 max_students: int = 2000, seed: int = 0) -> list:
+    """Infers the shape of each criterion from the train set: monotone unless a single peak
+    (or valley) has fewer inversions (see inversion_rates) by more than margin
+
+    Args:
+        grades (np.ndarray): grades of the train set (one column per criterion)
+        labels (np.ndarray): labels (classes) of the train set
+        margin (float, optional): lower inversion rate needed to prefer a 3 literals shape. Defaults to 0.05.
+        max_students (int, optional): students drawn to bound the pairs compared. Defaults to 2000.
+        seed (int, optional): seed of the draw. Defaults to 0.
+
+    Returns:
+        list: shape of each criterion
+    """
+    ranks = dense_ranks(grades)
+    labels = np.asarray(labels, dtype=float)
+    if len(labels) > max_students:
+        drawn = np.random.default_rng(seed).choice(len(labels), max_students, replace=False)
+        ranks, labels = ranks[drawn], labels[drawn]
+    shapes = []
+    for i in range(ranks.shape[1]):
+        rates = inversion_rates(ranks[:, i], labels)
+        best = min(("peak", "valley"), key=rates.get)
+        shapes.append(best if rates[best] < rates["monotone"] - margin else "monotone")
+    return shapes
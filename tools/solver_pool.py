@@ -0,0 +1,132 @@
+"""Asyncio pool running several gophersat processes concurrently"""
+
+import asyncio
+import os
+import tempfile
+from contextlib import contextmanager
+from time import perf_counter
+
+from tools import metrics
+from tools.utils import GophersatOutput
+
+
+# Bytes read at once from the output of gophersat
+READ_SIZE = 1 << 16
+
+
+class SolverPool:
+    """Runs gophersat jobs with at most max_workers processes at the same time
+
+    Example:
+        pool = SolverPool(max_workers=4, gopherpath="./gophersat.exe")
+        train_labels = await model.atrain(pool, timeout=60)
+    """
+
+    def __init__(self, max_workers: int = None, gopherpath: str = "./gophersat.exe",
+                 timeout: float = None, working_dir: str = None) -> None:
+        """
+        Args:
+            max_workers (int, optional): maximum number of concurrent gophersat processes.
+                Defaults to the number of CPUs.
+            gopherpath (str, optional): path to gophersat executable. Defaults to "./gophersat.exe".
+            timeout (float, optional): default deadline of a job (in seconds). Defaults to None.
+            working_dir (str, optional): directory of the working files. Defaults to the temp dir.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.gopherpath = gopherpath
+        self.timeout = timeout
+        self.working_dir = working_dir
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created on first use, inside the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    @contextmanager
+    def working_file(self, suffix: str = ".cnf"):
+        """Unique working file for a job (removed afterwards)"""
+        handle, filename = tempfile.mkstemp(suffix=suffix, prefix="workingfile_", dir=self.working_dir)
+        os.close(handle)
+        try:
+            yield filename
+        finally:
+            os.remove(filename)
+
+    async def solve(self, filename: str, weighted: bool = False, timeout: float = None,
+                    name: str = "gophersat", on_line=None) -> GophersatOutput:
+        """Runs gophersat on a file once a worker is free, parsing its output as it is printed
+
+        Args:
+            filename (str): file to read clauses from
+            weighted (bool, optional): MaxSAT problem (wcnf). Defaults to False.
+            timeout (float, optional): deadline of the job in seconds, from its start
+                (the process is killed when reached). Defaults to the pool timeout.
+            name (str, optional): name of the model (for the metrics). Defaults to "gophersat".
+            on_line (callable, optional): called with the parser after each line
+                (returns True to stop the solver). Defaults to None.
+
+        Returns:
+            GophersatOutput: parsed output (status "TIMEOUT" if the deadline was reached)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        async with self.semaphore:
+            begin = perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                self.gopherpath, filename, stdout=asyncio.subprocess.PIPE)
+            output = GophersatOutput(weighted)
+            try:
+                await asyncio.wait_for(self._read(process, output, on_line), timeout)
+            except asyncio.TimeoutError:
+                output.timed_out = True
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+            output.wall_time = perf_counter() - begin
+
+        if output.timed_out:
+            output.status = "TIMEOUT"
+        metrics.record_solve(name, output.status, output.wall_time,
+                             success=output.success, timeout=output.timed_out)
+        return output
+
+    @staticmethod
+    async def _read(process, output: GophersatOutput, on_line) -> None:
+        """Feeds the parser with the lines of the process (stops early if on_line asks to)
+
+        The output is read by blocks and split into lines here: the model line ("v ...")
+        of a large problem is longer than the line limit of the asyncio streams.
+        """
+        pending = b""
+        while True:
+            block = await process.stdout.read(READ_SIZE)
+            lines = (pending + block).split(b"\n")
+            pending = lines.pop() if block else b""  # Last line not complete yet (unless at the end)
+            for line in lines:
+                if not line and not block:
+                    continue
+                output.feed(line.decode("utf8").rstrip("\r"))
+                if on_line is not None and on_line(output):
+                    return
+            if not block:
+                return
+
+
+async def train_all(models: list, max_workers: int = None, gopherpath: str = "./gophersat.exe",
+                    timeout: float = None) -> list:
+    """Trains several models concurrently (one gophersat process per model, at most max_workers)
+
+    Args:
+        models (list): models with an atrain method (NcsSatModel, SinglePeakModel, MaxSatSinglePeakModel)
+        max_workers (int, optional): maximum number of concurrent gophersat processes. Defaults to None.
+        gopherpath (str, optional): path to gophersat executable. Defaults to "./gophersat.exe".
+        timeout (float, optional): deadline of each job (in seconds). Defaults to None.
+
+    Returns:
+        list: train predictions of each model (same order as models)
+    """
+    pool = SolverPool(max_workers, gopherpath, timeout)
+    return await asyncio.gather(*[model.atrain(pool) for model in models])
@@ -0,0 +1,138 @@
+"""Statistics recorded during the training of the models (timings and problem sizes)"""
+
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_memory() -> tuple:
+    """Peak resident memory of the process and of its children (gophersat), since the process started
+    (not reset between trainings: a training only shows if it raised the peak)
+
+    Returns:
+        tuple: (process peak in KiB, largest children peak in KiB), None when not available
+    """
+    if resource is None:
+        return None, None
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+class TrainStats:
+    """Timings (in seconds) and sizes of the problem recorded on every train"""
+
+    def __init__(self) -> None:
+        # clause family (or model part) -> {"clauses": count, "time": build time},
+        # "variables" instead of "clauses" for a part only adding variables (see MRSort)
+        self.families = {}
+        self.num_variables = 0
+        self.num_clauses = 0
+        self.serialization_time = 0.
+        self.cnf_bytes = 0
+        self.write_time = 0.
+        self.solver_time = 0.
+        self.solver_status = None
+        self.decode_time = 0.
+        self.peak_memory = None  # Process peak (see peak_memory)
+        self.solver_peak_memory = None
+        self.iterations = []  # Size and outcome of each solver call of a lazy training
+        self.preprocessing = {}  # Clauses removed by each preprocessing step (tools.preprocess)
+        self.consistency = {}  # Dominance conflicts found before the encoding (tools.consistency)
+
+    def build_family(self, name: str, builder) -> list:
+        """Builds a clause family and records its size and build time
+
+        Args:
+            name (str): name of the family (eg. "2a")
+            builder (callable): method building the clauses
+
+        Returns:
+            list: clauses built
+        """
+        begin = perf_counter()
+        clauses = builder()
+        self.families[name] = {"clauses": len(clauses), "time": perf_counter() - begin}
+        self.num_clauses += len(clauses)
+        return clauses
+
+    def record_consistency(self, report: dict) -> None:
+        """Records the result of a consistency check (see tools.consistency.check_consistency)"""
+        self.consistency = {
+            "conflicts": len(report["conflicts"]),
+            "lower_bound": report["lower_bound"],
+            "time": report["time"],
+        }
+
+    def record_memory(self) -> None:
+        """Records the process peaks of resident memory (see peak_memory)"""
+        self.peak_memory, self.solver_peak_memory = peak_memory()
+
+    @property
+    def encode_time(self) -> float:
+        return (sum(family["time"] for family in self.families.values()) + self.serialization_time
+                + self.preprocessing.get("time", 0.))
+
+    @property
+    def total_time(self) -> float:
+        return (self.consistency.get("time", 0.) + self.encode_time + self.write_time + self.solver_time
+                + self.decode_time)
+
+    def as_dict(self) -> dict:
+        """Flat dictionnary of the statistics (eg. to be added to a results DataFrame)"""
+        stats = {
+            "num_variables": self.num_variables,
+            "num_clauses": self.num_clauses,
+            "encode_time": self.encode_time,
+            "serialization_time": self.serialization_time,
+            "cnf_bytes": self.cnf_bytes,
+            "write_time": self.write_time,
+            "solver_time": self.solver_time,
+            "solver_status": self.solver_status,
+            "decode_time": self.decode_time,
+            "process_peak_memory_kib": self.peak_memory,
+            "solver_process_peak_memory_kib": self.solver_peak_memory,
+        }
+        for name, family in self.families.items():
+            unit = "variables" if "variables" in family else "clauses"
+            stats[f"{unit}_{name}"] = family[unit]
+            stats[f"{unit}_{name}_time"] = family["time"]
+        if self.iterations:
+            stats["iterations"] = len(self.iterations)
+        if self.consistency:
+            stats["conflicts"] = self.consistency["conflicts"]
+            stats["misclassified_lower_bound"] = self.consistency["lower_bound"]
+        for name, value in self.preprocessing.items():
+            stats[f"preprocessing_{name}"] = value
+        return stats
+
+    def summary(self) -> list:
+        """Lines (label, value) to be displayed in the results tables"""
+        lines = [(f"Build {name}", f"{family['clauses']} ({family['time']:.4f}s)") if "clauses" in family
+                 else (f"Build {name}", f"{family['variables']} variables ({family['time']:.4f}s)")
+                 for name, family in self.families.items()]
+        if self.consistency:
+            lines.insert(0, ("Consistency check", f"{self.consistency['conflicts']} conflicting pairs, at least "
+                                                  f"{self.consistency['lower_bound']} misclassified "
+                                                  f"({self.consistency['time']:.4f}s)"))
+        lines.append(("Variables / clauses", f"{self.num_variables} / {self.num_clauses}"))
+        if self.preprocessing:
+            report = self.preprocessing
+            lines.append(("Preprocessing", f"{report['clauses_before']} -> {report['clauses_after']} hard clauses "
+                                           f"(duplicates -{report['duplicates']}, units -{report['units']}, "
+                                           f"subsumed -{report['subsumption']}, pure -{report['pure']}, "
+                                           f"{report['fixed']} fixed) ({report['time']:.4f}s)"))
+        lines += [
+            ("Encoding", f"{self.encode_time:.4f}s ({self.cnf_bytes} bytes)"),
+            ("File writing", f"{self.write_time:.4f}s"),
+            ("Solver", f"{self.solver_time:.4f}s ({self.solver_status})"),
+            ("Decoding", f"{self.decode_time:.4f}s"),
+            ("Process peak memory (self/solver)", f"{self.peak_memory} / {self.solver_peak_memory} KiB"),
+        ]
+        lines += [(f"Iteration {k}", f"{it['alternatives']} alternatives, {it['num_variables']} / "
+                                     f"{it['num_clauses']} ({it['cnf_bytes']} bytes), {it['solver_time']:.4f}s, "
+                                     f"{it['misclassified']} misclassified")
+                  for k, it in enumerate(self.iterations, start=1)]
+        return lines
@@ -1,7 +1,12 @@
 """Utils file with funtions used in the project"""
 
+import os
+import queue
+import signal
 import subprocess
+import threading
 from collections import Counter
+from time import perf_counter
 import numpy as np
 
 
@@ -36,6 +41,22 @@ def subsets(criteria: list) -> list:
     subset = subsets(criteria[1:])
     return subset + [[criteria[0]] + y for y in subset]
 
+def merge_clauses(clauses: list, weights: dict = None) -> dict:
+    """Merges duplicated clauses (same literals), summing their multiplicities
+
+    Args:
+        clauses (list): clauses to be merged
+        weights (dict, optional): merged clauses to add to. Defaults to None.
+
+    Returns:
+        dict: clause (sorted tuple of literals) -> number of occurrences
+    """
+    weights = {} if weights is None else weights
+    for clause in clauses:
+        key = tuple(sorted(clause))
+        weights[key] = weights.get(key, 0) + 1
+    return weights
+
 # Construction du DIMACS et Résolution
 def clauses_to_dimacs(clauses: list, numvar: int, max_weight: int=None) -> str:
     """Generates gophersat interpretable clauses (in cnf)
@@ -75,6 +96,128 @@ def write_dimacs_file(dimacs: str, filename: str):
         cnf.write(dimacs)
 
 
+class GophersatOutput:
+    """Incremental parser of the output of gophersat (fed line by line)"""
+
+    def __init__(self, weighted: bool = False) -> None:
+        self.weighted = weighted
+        self.status = None  # eg. "SATISFIABLE", "UNSATISFIABLE", "OPTIMUM FOUND"
+        self.model = []
+        self.costs = []  # "o <cost>" lines of MaxSAT problems (improving solutions)
+        self.trajectory = []  # (elapsed time, cost) of each improving solution, if timed
+        self.timed_out = False
+        self.wall_time = 0.
+
+    def feed(self, line: str) -> None:
+        """Parses one line of the output of gophersat"""
+        if line.startswith("s "):
+            self.status = line[2:].strip()
+        elif line.startswith("v "):
+            if self.model_complete:  # New model printed (eg. improved MaxSAT solution)
+                self.model = []
+            self.model += [el.replace('x', '') for el in line[2:].split(" ") if el != '']
+        elif line.startswith("o "):
+            self.costs.append(int(line[2:]))
+
+    @property
+    def model_complete(self) -> bool:
+        """The model printed is complete (SAT models end with 0, MaxSAT ones with the last variable)"""
+        return len(self.model) > 0 and (self.weighted or self.model[-1] == "0")
+
+    @property
+    def success(self) -> bool:
+        return self.status == ("OPTIMUM FOUND" if self.weighted else "SATISFIABLE")
+
+    def best_result(self) -> tuple:
+        """Result in the exec_gophersat format, with the best model printed even if not optimal
+
+        Returns:
+            tuple: ("is a model found", "model over index")
+        """
+        if self.success or (self.weighted and self.status == "INTERRUPTED"):
+            return True, self.model
+        return False, {}
+
+    def result(self) -> tuple:
+        """Result in the exec_gophersat format
+
+        Returns:
+            tuple: ("is it satisfiable" (or optimal), "model over index")
+        """
+        if not self.success:
+            return False, {}
+        return True, self.model
+
+
+def exec_gophersat_anytime(filename: str, cmd: str = "./gophersat.exe", deadline: float = None,
+                           cost_threshold: int = None, grace: float = 1.,
+                           encoding: str = "utf8") -> GophersatOutput:
+    """Executes gophersat on a MaxSAT problem (.wcnf), reading its output as it is printed
+    and stopping it at a deadline or once the cost of its solution is low enough
+
+    Gophersat prints a line "o <cost>" each time it improves its solution. When stopped,
+    the solver is first interrupted (SIGINT) and given grace seconds to print its best model,
+    then killed. The best model printed is kept (incumbent), even if not proven optimal.
+
+    Args:
+        filename (str): file to read clauses from
+        cmd (str, optional): path to gophersat executable. Defaults to "./gophersat.exe".
+        deadline (float, optional): maximum solving time (in seconds). Defaults to None.
+        cost_threshold (int, optional): stops as soon as the cost is lower or equal. Defaults to None.
+        grace (float, optional): time given to the solver to print its model when stopped. Defaults to 1.
+        encoding (str, optional): encoding of the output. Defaults to "utf8".
+
+    Returns:
+        GophersatOutput: parsed output, with trajectory (list of (elapsed time, cost))
+            and status "INTERRUPTED" (model found) or "TIMEOUT" (no model) if stopped
+    """
+    begin = perf_counter()
+    process = subprocess.Popen([cmd, filename], stdout=subprocess.PIPE, encoding=encoding)
+    lines = queue.Queue()
+
+    def read():
+        for line in process.stdout:
+            lines.put(line.rstrip("\r\n"))
+        lines.put(None)
+    threading.Thread(target=read, daemon=True).start()
+
+    output = GophersatOutput(weighted=True)
+    stop_at = None if deadline is None else begin + deadline
+    stopped = False
+    while True:
+        timeout = None if stop_at is None else max(stop_at - perf_counter(), 0)
+        try:
+            line = lines.get(timeout=timeout)
+        except queue.Empty:
+            line = ""  # Deadline reached
+        if line is None:
+            break
+        if line:
+            output.feed(line)
+            if line.startswith("o "):
+                output.trajectory.append((perf_counter() - begin, output.costs[-1]))
+        reached = cost_threshold is not None and output.costs and output.costs[-1] <= cost_threshold
+        if not stopped and (line == "" or reached):
+            stopped = True
+            output.timed_out = line == ""
+            # Asks the solver to stop, then leaves it grace seconds to print its model
+            if os.name == "nt":
+                process.terminate()
+            else:
+                process.send_signal(signal.SIGINT)
+            stop_at = perf_counter() + grace
+        elif stopped and line == "":
+            break  # Grace period over
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+    output.wall_time = perf_counter() - begin
+
+    if stopped and output.status != "OPTIMUM FOUND":
+        output.status = "INTERRUPTED" if output.model_complete else "TIMEOUT"
+    return output
+
+
 # Attention à utiliser la vesion du solveur compatible avec votre système d'exploitation,
 # mettre le solveur dans le même dossier que ce notebook
 def exec_gophersat(filename: str,
@@ -96,27 +239,11 @@ def exec_gophersat(filename: str,
                             stdout=subprocess.PIPE,
                             check=True,
                             encoding=encoding)
-    string = str(result.stdout)
-    lines = string.splitlines()
-        
-    if weighted:
-        s_index = 0
-        while s_index <= len(lines) and lines[s_index][0] != 's':
-            s_index += 1
-        if lines[s_index] != "s OPTIMUM FOUND":
-            return False, {}
-        
-        model = [el.replace('x', '') for el in lines[s_index+1][2:].split(" ") if el != '']
-        
-        return (True, model)
-    
-    else:
-        if lines[1] != "s SATISFIABLE":
-            return False, {}
+    output = GophersatOutput(weighted)
+    for line in str(result.stdout).splitlines():
+        output.feed(line)
 
-        model = lines[2][2:].split(" ")
-
-        return (True, model)
+    return output.result()
 
 
 # def print_res(compute_time, res_train, admission, res_test=None, admission_test=None):
@@ -141,6 +268,40 @@ def exec_gophersat(filename: str,
 #             f"  - precision: {sum([res_test[i]==admission_test[i] for i in range(len(res_test))])/len(res_test)}\n"
 #         )
 
+def grade_ranks(grades: np.ndarray, values_support: list) -> np.ndarray:
+    """Index of each grade in the sorted values of its criterion
+
+    Args:
+        grades (np.ndarray): grades of the alternatives (one column per criterion)
+        values_support (list): sorted unique values of each criterion
+
+    Returns:
+        np.ndarray: ranks, same shape as grades
+    """
+    return np.stack([np.searchsorted(values, grades[:, i]) for i, values in enumerate(values_support)], axis=1)
+
+
+def ncs_predict(ranks: np.ndarray, approved: dict, sufficient: np.ndarray) -> np.ndarray:
+    """Vectorized U-NCS assignment: an alternative is at least in class h if the criteria
+    on which it reaches the frontier h form a sufficient coalition
+
+    Args:
+        ranks (np.ndarray): ranks of the grades of the alternatives (see grade_ranks)
+        approved (dict): frontier h -> boolean array per criterion, True for the values reaching the frontier
+        sufficient (np.ndarray): True for the sufficient coalitions, indexed by the bitmask of the criteria
+
+    Returns:
+        np.ndarray: class of each alternative
+    """
+    pred = np.zeros(len(ranks), dtype=int)
+    for h in sorted(approved):
+        masks = np.zeros(len(ranks), dtype=np.int64)
+        for i, values in enumerate(approved[h]):
+            masks |= values[ranks[:, i]].astype(np.int64) << i
+        pred += sufficient[masks]  # Frontiers are nested: the alternative reached every frontier below
+    return pred
+
+
 def accuracy(pred, ref):
     return sum([pred[i]==ref[i] for i in range(len(ref))])/len(pred)
 
@@ -150,6 +311,7 @@ def print_comparison(mr_perf: dict, ncs_perf: dict, train_classes: list, test_cl
     Args:
         mr_perf (dict): Parsed performances of MRSort model
         ncs_perf (dict): Parsed performances of U-NCS model
+            (both with the optional "stats" key, TrainStats of the model, to display the details)
         train_classes (list): Ground truth on the train set classes
         test_classes (list, optional): Ground truth on the test set. Defaults to None.
     """
@@ -163,12 +325,20 @@ def print_comparison(mr_perf: dict, ncs_perf: dict, train_classes: list, test_cl
     if ("test_pred" in mr_perf) and ("test_pred" in ncs_perf) and test_classes is not None:
         print(f"{'Test predictions':<30} {str(dict(Counter(mr_perf['test_pred']))):<30} {str(dict(Counter(ncs_perf['test_pred']))):<30}")
         print(f"{'Test accuracy':<30} {accuracy(mr_perf['test_pred'], test_classes):<30} {accuracy(ncs_perf['test_pred'], test_classes):<30}")
+
+    if ("stats" in mr_perf) or ("stats" in ncs_perf):
+        print("------------------------------------------ DETAILS ------------------------------------------")
+        mr_stats = dict(mr_perf["stats"].summary()) if "stats" in mr_perf else {}
+        ncs_stats = dict(ncs_perf["stats"].summary()) if "stats" in ncs_perf else {}
+        for label in list(mr_stats) + [label for label in ncs_stats if label not in mr_stats]:
+            print(f"{label:<30} {mr_stats.get(label, '-'):<30} {ncs_stats.get(label, '-'):<30}")
         
 def print_peak(ncs_perf: dict, train_classes: list, test_classes: list=None) -> None:
     """Prints comparison table between models
 
     Args:
         ncs_perf (dict): Parsed performances of U-NCS model
+            (with the optional "stats" key, TrainStats of the model, to display the details)
         train_classes (list): Ground truth on the train set classes
         test_classes (list, optional): Ground truth on the test set. Defaults to None.
     """
@@ -182,4 +352,29 @@ def print_peak(ncs_perf: dict, train_classes: list, test_classes: list=None) ->
     if ("test_pred" in ncs_perf) and ("test_pred" in ncs_perf) and test_classes is not None:
         print(f"{'Test predictions':<30} {str(dict(Counter(ncs_perf['test_pred']))):<30}")
         print(f"{'Test accuracy':<30} {accuracy(ncs_perf['test_pred'], test_classes):<30}")
-   
\ No newline at end of file
+   
+
+    if "stats" in ncs_perf:
+        print("------------------------------------------ DETAILS ------------------------------------------")
+        for label, value in ncs_perf["stats"].summary():
+            print(f"{label:<30} {value:<30}")
+
+
+def print_auto(record: dict, train_classes: list, test_classes: list=None) -> None:
+    """Prints the choice of the auto mode and the performances of the learner selected
+
+    Args:
+        record (dict): choice and result of the auto mode (see tools.cost_model.run_auto)
+        train_classes (list): Ground truth on the train set classes
+        test_classes (list, optional): Ground truth on the test set. Defaults to None.
+    """
+    print("-------------------------------------------- AUTO --------------------------------------------")
+    print(f"{'Features':<30} {record['features']}")
+    for learner, prediction in record["predictions"].items():
+        print(f"{learner:<30} {'predicted ' + str(round(prediction['time'], 3)) + 's':<30} {'feasibility ' + str(round(prediction['feasibility'], 3)):<30}")
+    print(f"{'Selected learner':<30} {record['learner']}")
+    print(f"{'Predicted / actual time':<30} {str(round(record['predicted_time'], 3)) + 's'} / {str(round(record['actual_time'], 3)) + 's'}")
+    if record["error"] is not None:
+        print(f"{'Error':<30} {record['error']}")
+    else:
+        print_peak(record["result"], train_classes=train_classes, test_classes=test_classes)